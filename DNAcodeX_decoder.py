@@ -1,425 +1,828 @@
 import argparse
 import datetime
+import functools
+import gzip
 import os
+import re
+
+from dnacodex_core import (
+    CHECKSUM_BLOCK_BITS,
+    CODEBOOK_DIR,
+    CODEWORD_TAIL_BASES,
+    PIPELINE_WRITE_BUFFER,
+    utf8_bin_decode,
+    binary_to_image_bytes,
+    compression_codec,
+    decompress_payload,
+    decode_header,
+    load_codebook,
+    construct_huffman_dict,
+    huffman_decode,
+    build_correction_table,
+    UncorrectableCodeword,
+    check_codeword_layout,
+    correct_codewords,
+    remove_sync_markers,
+    verify_block_checksums,
+    split_checksum_tag,
+    open_csv_report,
+    run_pipeline,
+    start_profile,
+    profile_stage,
+    format_profile,
+    print_profile,
+)
+
+PARALLEL_CHUNK_BASES = 7 * 2 ** 20  # Largest chunk (in bases, a multiple of 7) corrected by a worker process
+CONSENSUS_BATCH_READS = 10000  # Number of reads whose votes are accumulated at once
+PIPELINE_CHUNK_BASES = 7 * 5160 * 28  # Bases per chunk of the pipelined mode: whole codewords, 5 checksum blocks (5160 codewords) and 80-bit text groups
 
 ######################################### General Functions #######################################
 
-def dna_to_binary(data):
-    data = data.replace('T', 'C')
-    data = data.replace('A', 'G')
+def build_base_tables():
+    """
+    Builds the 256-byte tables of the base validation. The class table maps every byte to b (A, C, G, T), l (a, c,
+    g, t), r (the IUPAC codes R and Y, which are ambiguous between two bases that map to the same bit), n (N and
+    the other IUPAC codes, whose bit is unknown), w (whitespace) or x (anything else). The normalization table maps
+    lowercase bases to uppercase, R to G, Y to C and the other ambiguous codes to N.
 
-    table = data.maketrans('GC', '10')
-    decoded_dna = data.translate(table)
+    Returns:
+    - The class table and the normalization table as a tuple.
+    """
+    classes = bytearray(b'x' * 256)
+    normalized = bytearray(range(256))
+    for base in b'ACGT':
+        classes[base] = ord('b')
+    for base in b'acgt':
+        classes[base] = ord('l')
+        normalized[base] = base - 32
+    for codes, resolved in [(b'Rr', 'G'), (b'Yy', 'C')]:  # R = A/G (bit 1), Y = C/T (bit 0)
+        for code in codes:
+            classes[code] = ord('r')
+            normalized[code] = ord(resolved)
+    for code in b'NKMSWBDHVnkmswbdhv':
+        classes[code] = ord('n')
+        normalized[code] = ord('N')
+    for space in b' \t\r\n':
+        classes[space] = ord('w')
+
+    return bytes(classes), bytes(normalized)
+
+BASE_CLASSES, BASE_NORMALIZED = build_base_tables()
+
+def validate_bases(data):
+    """
+    Classifies every base of the sequence with the class table and normalizes it in one pass (lowercase bases
+    are uppercased, R and Y are resolved to the bit they share, other ambiguous codes become the erasure N and
+    whitespace is removed), so that unexpected characters are reported before the correction starts instead of
+    failing late in hamming_correct or the binary conversions.
 
-    return decoded_dna
+    Arguments:
+    - data: The DNA sequence.
 
-def utf8_bin_decode(string):
-    decoded_string = ''
+    Returns:
+    - The normalized sequence, the counts of each class of bases (as a dictionary) and the position of the first
+      invalid character (-1 if there is none) as a tuple.
+    """
+    raw = data.encode('ascii', 'replace')  # Non-ASCII characters become '?', which is invalid
+    classes = raw.translate(BASE_CLASSES)
+    counts = {
+        'ACGT': classes.count(b'b'),
+        'lowercase': classes.count(b'l'),
+        'R/Y': classes.count(b'r'),
+        'N/ambiguous': classes.count(b'n'),
+        'whitespace': classes.count(b'w'),
+        'invalid': classes.count(b'x'),
+    }
+    normalized = raw.translate(BASE_NORMALIZED, b' \t\r\n')
+
+    return normalized.decode('ascii'), counts, classes.find(b'x')
 
-    for i in range(0, len(string), 80):
-        chunk = string[i: i + 80]
-        while len(chunk) != 0:
+#################################### Hamming Error Correction Functions ############################
 
-            if chunk.startswith('0'):
-                f = chunk[:8]
+def correct_and_strip(string, formatted_time, jobs=1):
+    """
+    Corrects the DNA sequence and removes the Hamming parity bits (see correct_codewords). With more than one job,
+    the sequence is split into chunks at codeword boundaries that are corrected by a pool of worker processes, and
+    the results are reassembled in order.
 
-            elif chunk.startswith('110'):
-                f = chunk[0:16]
+    Arguments:
+    - string: The DNA sequence.
+    - formatted_time: The ID (date and time) of the run.
+    - jobs: The number of worker processes (default: 1).
 
-            elif chunk.startswith('1110'):
-                f = chunk[0:24]
+    Returns:
+    - The corrected data bits, the number of corrected errors, the number of removed parity bits, the name of the CSV file of the corrected sequences and the number of codewords with erasures as a tuple.
+    """
+    if jobs > 1 and len(string) >= PARALLEL_CHUNK_BASES:
+        import multiprocessing
+
+        build_correction_table()  # Built before the workers are started so that forked workers inherit it
+        chunk_size = min(PARALLEL_CHUNK_BASES, -(-len(string) // jobs))
+        chunk_size += -chunk_size % 7  # Chunks must start at codeword boundaries
+        chunks = [(string[i:i+chunk_size], i) for i in range(0, len(string), chunk_size)]
+        with multiprocessing.Pool(jobs) as pool:
+            results = pool.starmap(correct_codewords, chunks)
+    else:
+        results = [correct_codewords(string)]
 
-            elif chunk.startswith('11110'):
-                f = chunk[0:32]
-                
-            else:
-                break
-            try:
-                chunk = chunk.removeprefix(f)
-                bit = int(f, 2)
-                bit = bit.to_bytes((bit.bit_length() + 7) // 8, 'big').decode('utf-8')
-                decoded_string += bit
-            except:
-                pass
-        
-    return decoded_string
+    sequences_file_name = 'DNAcodeX_corrected_seqs_{}.csv'.format(formatted_time)
+    with open(sequences_file_name, 'w') as f:
+        for result in results:
+            f.writelines(result[3])
+
+    data_bits = ''.join([result[0] for result in results])
+    errors_count = sum([result[1] for result in results])
+    parity_count = sum([result[2] for result in results])
+    erasures_count = sum([result[4] for result in results])
 
-#################################### Huffman Decoding Functions ####################################
+    return data_bits, errors_count, parity_count, sequences_file_name, erasures_count
 
-def decode_header(header):
+#################################### Consensus Functions ####################################
+
+BASE_CODES = {'A': 0, 'C': 1, 'G': 2, 'T': 3, 'a': 0, 'c': 1, 'g': 2, 't': 3}  # Other symbols (such as N) do not vote
+QUALITY_WEIGHTS = [1 - 10 ** (-max(i - 33, 0) / 10) for i in range(256)]  # Phred+33 quality character -> probability the base is correct
+
+def read_pool(file_name):
     """
-    Decodes the header using a specific decoding scheme.
+    Streams the reads of a FASTA or FASTQ file (optionally gzip compressed) one at a time.
 
     Arguments:
-    - header: The encoded header string.
+    - file_name: The name of the FASTA/FASTQ file.
 
     Returns:
-    - The decoded header as an integer.
+    - A generator of (read ID, sequence, quality string or None) tuples.
+    """
+    opener = gzip.open if file_name.endswith('.gz') else open
+    with opener(file_name, 'rt') as f:
+        line = f.readline()
+        if line.startswith('@'):  # FASTQ: header, sequence, separator and quality lines
+            while line:
+                sequence = f.readline().strip()
+                f.readline()
+                quality = f.readline().strip()
+                yield line[1:].strip(), sequence, quality
+                line = f.readline()
+        else:  # FASTA: the sequence of a read may span several lines
+            read_id = None
+            pieces = []
+            while line:
+                if line.startswith('>'):
+                    if read_id is not None:
+                        yield read_id, ''.join(pieces), None
+                    read_id = line[1:].strip()
+                    pieces = []
+                else:
+                    pieces.append(line.strip())
+                line = f.readline()
+            if read_id is not None:
+                yield read_id, ''.join(pieces), None
+
+def read_position(read_id):
     """
-    integers = ''
-    n = 8  # Number of bits in each segment
-    x = [header[i:i+n] for i in range(0, len(header), n)]  # Split the header into segments of n bits
-    for bit in x:
-        bit = int(bit, 2)  # Convert the binary segment to an integer
-        bit = bit.to_bytes((bit.bit_length() + 7) // 8, 'big').decode()  # Convert the integer to its corresponding ASCII character
-        integers += bit  # Concatenate the ASCII characters to form the decoded header string
-    integers = int(integers)  # Convert the decoded header string to an integer
+    Returns the position of a read in the encoded sequence, given as pos=N in its ID (reads without a position
+    are assumed to start at the beginning of the sequence).
+    """
+    match = re.search(r'\bpos=(\d+)', read_id)
 
-    return integers
+    return int(match.group(1)) if match else 0
 
-def construct_huffman_dict(instructions_string):
+def accumulate_votes(counts, batch, quality_weighted, numpy=None):
     """
-    Constructs a Huffman dictionary from the encoded instructions string.
+    Adds the votes of a batch of reads to the per-position vote counts. With NumPy, counts is a flat array where
+    the votes of position i for base b are at index 4 * i + b, and the whole batch is accumulated at once. Without
+    it, counts is a list of four lists (one per base) and the bases are accumulated one at a time.
 
     Arguments:
-    - instructions_string: The encoded instructions string.
+    - counts: The vote counts.
+    - batch: A list of (read ID, sequence, quality string or None) tuples.
+    - quality_weighted: Whether the votes are weighted by the base qualities.
+    - numpy: The NumPy module, or None if it is not installed (default: None).
 
     Returns:
-    - The Huffman dictionary containing the codes.
-    """
-    codes = []
-    codes_list = []
-    huffman_instructions_dict = {}
-
-    if instructions_string.find(',,') != -1:  # Check if multiple sets of codes are present
-        codes_list = instructions_string.split(',,')  # Split the instructions into separate code sets
-        codes_list1 = codes_list[0].split(',')  # Split the first set of codes
-        for code in codes_list1:
-            codes.append(code)
-
-        codes_list2 = codes_list[1].split(',')  # Split the second set of codes
-        codes_list2[0] = ',' + codes_list2[0]
-        for code in codes_list2:
-            codes.append(code)
+    - The vote counts (a new array if the NumPy array had to grow).
+    """
+    if len(batch) == 0:
+        return counts
+
+    if numpy is None:
+        for read_id, sequence, quality in batch:
+            start = read_position(read_id)
+            end = start + len(sequence)
+            for base_counts in counts:
+                if len(base_counts) < end:
+                    base_counts.extend([0.0] * (end - len(base_counts)))
+            for i, base in enumerate(sequence):
+                code = BASE_CODES.get(base)
+                if code is not None:
+                    counts[code][start + i] += QUALITY_WEIGHTS[ord(quality[i])] if quality_weighted and quality else 1.0
+        return counts
+
+    codes_table = numpy.full(256, 4, dtype=numpy.int64)
+    for base, code in BASE_CODES.items():
+        codes_table[ord(base)] = code
+
+    lengths = numpy.array([len(sequence) for read_id, sequence, quality in batch])
+    starts = numpy.array([read_position(read_id) for read_id, sequence, quality in batch])
+    offsets = numpy.cumsum(lengths) - lengths
+    positions = numpy.arange(lengths.sum()) + numpy.repeat(starts - offsets, lengths)  # Position of every base of the batch
+    codes = codes_table[numpy.frombuffer(''.join([sequence for read_id, sequence, quality in batch]).encode('ascii'), dtype=numpy.uint8)]
+    if quality_weighted and all(quality for read_id, sequence, quality in batch):
+        qualities = numpy.frombuffer(''.join([quality for read_id, sequence, quality in batch]).encode('ascii'), dtype=numpy.uint8)
+        weights = numpy.array(QUALITY_WEIGHTS)[qualities]
     else:
-        codes = instructions_string[1:].split(',')  # Split the codes if only one set is present
+        weights = numpy.ones(len(codes))
 
-    for code in codes:
-        if len(code) != 0:
-            huffman_instructions_dict[code[0]] = code[1:]  # Create key-value pairs in the dictionary with character as the key and code as the value
+    valid = codes != 4
+    indices = positions[valid] * 4 + codes[valid]
+    if len(indices) == 0:
+        return counts
+    low, high = int(indices.min()), int(indices.max())
+    if high >= len(counts):
+        counts = numpy.concatenate([counts, numpy.zeros(max(high + 4 - high % 4, 2 * len(counts)) - len(counts))])  # Whole positions only
+    counts[low:high + 1] += numpy.bincount(indices - low, weights=weights[valid], minlength=high - low + 1)  # Only the span covered by the batch is touched
 
-    return huffman_instructions_dict
+    return counts
 
-def huffman_decode(encoded_data, huffman_codes):
+def consensus_from_votes(counts, length, numpy=None):
     """
-    Decodes the encoded data using Huffman decoding.
+    Keeps the base with the most votes at each position. Positions without any vote are erased (N).
 
     Arguments:
-    - encoded_data: The encoded data to be decoded.
-    - huffman_codes: The Huffman codes used for decoding.
+    - counts: The vote counts built by accumulate_votes.
+    - length: The length of the consensus (the end of the furthest read).
+    - numpy: The NumPy module, or None if it is not installed (default: None).
 
     Returns:
-    - The decoded data as a string.
+    - The consensus sequence and the number of positions without votes as a tuple.
     """
-    inverse_codes = {value: key for key, value in huffman_codes.items()}  # Create a dictionary of inverse codes (codes as keys and characters as values)
-    current_code = ''  # Initialize an empty string to store the current code being processed
-    decoded_data = ''  # Initialize an empty string to store the decoded data
+    if numpy is None:
+        sequence = []
+        uncovered = 0
+        for votes in zip(*[base_counts[:length] for base_counts in counts]):
+            best = max(range(4), key=votes.__getitem__)
+            if votes[best] == 0:
+                uncovered += 1
+                sequence.append('N')
+            else:
+                sequence.append('ACGT'[best])
+        return ''.join(sequence), uncovered
 
-    for bit in encoded_data:
-        current_code += bit
-        if current_code in inverse_codes:
-            decoded_data += inverse_codes[current_code]  # Append the decoded character to the decoded data
-            current_code = ''  # Reset the current code
-        else:
-            continue
+    counts = counts.reshape(-1, 4)[:length]  # The array grows by doubling, so it may hold positions beyond the reads
+    if len(counts) < length:
+        counts = numpy.concatenate([counts, numpy.zeros((length - len(counts), 4))])  # Reads ending with bases that do not vote
+    coverage = counts.sum(axis=1)
 
-    return decoded_data
+    sequence = numpy.frombuffer(b'ACGT', dtype=numpy.uint8)[counts.argmax(axis=1)]
+    sequence[coverage == 0] = ord('N')
 
-def read_file(file_name):
+    return sequence.tobytes().decode('ascii'), int((coverage == 0).sum())
+
+def consensus_from_reads(file_name, quality_weighted=False, batch_reads=CONSENSUS_BATCH_READS):
     """
-    Decodes the DNA encoded data in the given file using Huffman coding.
-    HuffGen decodes the first 7 DNA bases (first marker) to get the number of digits of the Huffman dictionary length (second marker).
-    Then, after decoding the length of the encoded dictionary, it decodes the dictionary and uses the Huffman codes
-    found in the dictionary to decode the encoded text.
-    The decoding of the first marker, the second marker and Huffman dictionary is based on the fixed length ASCII codes.
-    While the encoded data is mapped by the variable length Huffman codes.
+    Computes the per-base consensus of a pool of reads that cover the encoded sequence, before the Hamming
+    correction. Each read votes for its bases at its position (weighted by the probability that the base was
+    called correctly, if quality_weighted and the reads are in FASTQ format). Reads are streamed in batches of
+    batch_reads, so memory depends on the length of the sequence and not on the number of reads. The votes are
+    accumulated with NumPy if it is installed.
 
     Arguments:
-    - file_name: The file name that contains the encoded data in nucleotides.
-    - output_filename: The name of the desired output file. (default: data_decoded.txt)
+    - file_name: The name of the FASTA/FASTQ file.
+    - quality_weighted: Whether the votes are weighted by the base qualities (default: False).
+    - batch_reads: The number of reads accumulated at once (default: CONSENSUS_BATCH_READS).
 
     Returns:
-    - The decoded data saved in a text file.
+    - The consensus sequence, the number of reads and the number of positions without reads as a tuple.
+    """
+    try:
+        import numpy
+        counts = numpy.zeros(0)
+    except ImportError:
+        numpy = None
+        counts = [[], [], [], []]
+
+    reads_count = 0
+    length = 0
+    batch = []
+    for read in read_pool(file_name):
+        batch.append(read)
+        reads_count += 1
+        length = max(length, read_position(read[0]) + len(read[1]))
+        if len(batch) == batch_reads:
+            counts = accumulate_votes(counts, batch, quality_weighted, numpy)
+            batch = []
+    counts = accumulate_votes(counts, batch, quality_weighted, numpy)
+
+    consensus, uncovered = consensus_from_votes(counts, length, numpy)
+
+    return consensus, reads_count, uncovered
+
+def pad_codeword_layout(data):
+    """
+    Completes the trailing codeword of a consensus whose reads do not reach the end of the encoded sequence. The
+    sequence is padded with erased bases (N) up to the nearest length the encoder produces (see
+    check_codeword_layout), so that the erasure correction decodes the trailing codeword instead of rejecting it.
 
+    Arguments:
+    - data: The consensus sequence (without synchronization markers).
+
+    Returns:
+    - The padded sequence and the number of erased bases that were added as a tuple.
     """
-    with open(file_name, 'r', encoding='utf-8') as f:
-        lines = f.readlines()
-    encoded_data = ''
+    padding = 0
+    while (len(data) + padding) % 7 not in CODEWORD_TAIL_BASES:
+        padding += 1
 
-    for line in lines:
-        encoded_data += line
+    return data + 'N' * padding, padding
 
-    return encoded_data
+#################################### Block Checksum Functions ####################################
 
-#################################### Hamming Error Correction Functions ############################
+def save_failed_blocks(failed_blocks, formatted_time, block_bits=CHECKSUM_BLOCK_BITS):
+    """
+    Saves the indices and the bit ranges (without checksums) of the blocks that failed the checksum verification.
 
-def bit_switch(bit):
-    if bit == 1:
-        return 0
-    elif bit == 0:
-        return 1
-    
-def hamming_correct(string):
-    bits = [int(i) for i in string]
+    Arguments:
+    - failed_blocks: The list of the indices of the failed blocks.
+    - formatted_time: The ID (date and time) of the run.
+    - block_bits: The number of data bits in each block (default: CHECKSUM_BLOCK_BITS).
 
-    if len(bits) == 7:
-        parity_indices = [(0, 1, 3), (0, 2, 3), (1, 2, 3)]
-        parities = [bits[i] ^ bits[j] ^ bits[k] for i, j, k in parity_indices]
-        
-        p1 = parities[0] == bits[4]
-        p2 = parities[1] == bits[5]
-        p3 = parities[2] == bits[6]
+    Returns:
+    - The name of the CSV file.
+    """
+    blocks_file_name = 'DNAcodeX_failed_blocks_{}.csv'.format(formatted_time)
+    with open(blocks_file_name, 'w') as f:
+        f.write('Block,Bits\n')
+        for block in failed_blocks:
+            f.write('{},{}:{}\n'.format(block, block * block_bits, (block + 1) * block_bits))
 
-        error = False
+    return blocks_file_name
 
-        if p1 == False and p2 == False and p3 == True:
-            bits[0] = bit_switch(bits[0])
-            error = True
+def decode_passed_blocks(data, failed_blocks, type='txt', block_bits=CHECKSUM_BLOCK_BITS):
+    """
+    Decodes the data bits (see utf8_bin_decode and binary_to_image_bytes) without the blocks that failed the
+    checksum verification, whose decoding would only produce corrupted output. The data is decoded in the groups
+    of the decoding function (80 bits for txt, 8 bits otherwise) and the groups that overlap a failed block are
+    skipped. Each skipped range is replaced by a replacement character (U+FFFD) in text, and by zero bytes in
+    other formats so that the following bytes keep their offsets.
 
-        elif p1 == False and p2 == True and p3 == False:
-            bits[1] = bit_switch(bits[1])
-            error = True
+    Arguments:
+    - data: The data bits without checksums.
+    - failed_blocks: The sorted indices of the failed blocks, relative to the start of data.
+    - type: The format of the decoded file (default: 'txt').
+    - block_bits: The number of data bits in each block (default: CHECKSUM_BLOCK_BITS).
 
-        elif p1 == True and p2 == False and p3 == False:
-            bits[2] = bit_switch(bits[2])
-            error = True 
+    Returns:
+    - The decoded data (a string for txt, bytes otherwise).
+    """
+    if type == 'txt':
+        decode, group_bits = utf8_bin_decode, 80
+    else:
+        decode, group_bits = binary_to_image_bytes, 8
+
+    skipped = []
+    for block in failed_blocks:
+        start = block * block_bits // group_bits * group_bits  # First group that overlaps the block
+        end = min(-(-(block + 1) * block_bits // group_bits) * group_bits, len(data))  # End of the last one
+        if len(skipped) != 0 and start <= skipped[-1][1]:
+            skipped[-1][1] = end
+        else:
+            skipped.append([start, end])
 
-        elif p1 == False and p2 == False and p3 == False:
-            bits[3] = bit_switch(bits[3])
-            error = True
+    pieces = []
+    position = 0
+    for start, end in skipped:
+        pieces.append(decode(data[position:start]))
+        pieces.append('\ufffd' if type == 'txt' else bytes((end - start) // 8))
+        position = end
+    pieces.append(decode(data[position:]))
 
-        elif p1 == False and p2 == True and p3 == True:
-            bits[4] = bit_switch(bits[4])
-            error = True
+    return ('' if type == 'txt' else b'').join(pieces)
 
-        elif p1 == True and p2 == False and p3 == True:
-            bits[5] = bit_switch(bits[5])
+#################################### Pipelined Execution Functions ####################################
 
-        elif p1 == True and p2 == True and p3 == False:
-            bits[6] = bit_switch(bits[6])
-            error = True
+def peek_data_bits(file_name, codewords=16):
+    """
+    Corrects the first codewords of the sequence and returns their data bits, so that the tags at the start of the
+    data (block checksums and pre-compression) can be recognised before the pipelined mode streams the file.
 
-        elif p1 == True and p2 == True and p3 == True:
-            error = False
-            pass
-    
-    elif len(bits) == 6:
-        parity_indices = [(0, 1), (1, 2), (0, 2)]
-        parities = [bits[i] ^ bits[j] for i, j in parity_indices]
-
-        p1 = parities[0] == bits[3]
-        p2 = parities[1] == bits[4]
-        p3 = parities[2] == bits[5]
-
-        if p1 == False and p2 == True and p3 == False:
-            bits[0] = bit_switch(bits[0])
-            error = True
-
-        elif p1 == False and p2 == False and p3 == True:
-            bits[1] = bit_switch(bits[1])
-            error = True
-
-        elif p1 == False and p2 == False and p3 == True:
-            bits[2] = bit_switch(bits[2])
-            error = True 
-
-        elif p1 == False and p2 == True and p3 == True:
-            bits[3] = bit_switch(bits[3])
-            error = True
-
-        elif p1 == True and p2 == False and p3 == True:
-            bits[4] = bit_switch(bits[4])
-            error = True
-
-        elif p1 == True and p2 == True and p3 == False:
-            bits[5] = bit_switch(bits[5])
-            error = True
-
-        elif p1 == True and p2 == True and p3 == True:
-            error = False
-            pass
-
-    elif len(bits) == 5:
-        x1 = bit_switch(bits[0])
-        x2 = bit_switch(bits[1])
-        x3 = bits[0] ^ bits[1]
-
-        p1 = x1 == bits[2]
-        p2 = x2 == bits[3]
-        p3 = x3 == bits[4]
-
-        if p1 == False and p2 == True and p3 == False:
-            bits[0] = bit_switch(bits[0])
-            error = True
-
-        elif p1 == True and p2 == False and p3 == False:
-            bits[1] = bit_switch(bits[1])
-            error = True
-
-        elif p1 == False and p2 == True and p3 == True:
-            bits[2] = bit_switch(bits[2])
-            error = True 
-
-        elif p1 == True and p2 == False and p3 == True:
-            bits[3] = bit_switch(bits[3])
-            error = True
-
-        elif p1 == True and p2 == True and p3 == False:
-            bits[4] = bit_switch(bits[4])
-            error = True
-
-        elif p1 == True and p2 == True and p3 == True:
-            error = False
-            pass
-
-    elif len(bits) == 3:
-        if bits[0] != max(set(bits), key = bits.count):
-            bits[0] = max(set(bits), key = bits.count)
-            error = True
-        else:
-            error = False
-            pass
+    Arguments:
+    - file_name: The name of the file.
+    - codewords: The number of codewords to correct (default: 16, the checksum tag and the compression tag).
 
-    corrected_string = ''.join([str(i) for i in bits])
-    
-    return corrected_string, error
+    Returns:
+    - The data bits of the first whole codewords as a binary string.
+    """
+    with open(file_name, 'r', encoding='utf-8', newline='\r\n') as f:
+        head = validate_bases(f.read(4096))[0][:codewords * 7]
 
-def correct_string(string, formatted_time):
+    return correct_codewords(head[:len(head) // 7 * 7])[0]
 
-    corrected_string = ''
-    errors_count = 0
+def read_sequence_chunks(file_name, bases_counts, chunk_bases=PIPELINE_CHUNK_BASES, start=0):
+    """
+    Reads the DNA sequence in chunks of chunk_bases bases. Every piece of the file is validated and normalized
+    (see validate_bases) before it is split, so that removed whitespace does not shift the codeword boundaries.
 
-    sequences_file_name = 'DNAcodeX_corrected_seqs_{}.csv'.format(formatted_time)
-    open(sequences_file_name, 'w').close()
-    
-    for i in range(0, len(string), 7):
-        codeword_dna = string[i:i+7]
-        codeword_binary = dna_to_binary(codeword_dna)
-        corrected_codeword_binary, error = hamming_correct(codeword_binary)
-        corrected_string += corrected_codeword_binary
-
-        if error == True:
-            errors_count += 1
-            with open(sequences_file_name, 'a') as f:
-                f.write(codeword_dna + ',' + corrected_codeword_binary + ',' + codeword_binary + ',' + '{}:{}\n'.format(i, i+(len(codeword_binary))))
-
-    return corrected_string, errors_count, sequences_file_name
-
-def remove_hamming_bits(data):
-
-    data_without_parity = ''
-    parity_count = 0
-
-    for i in range(0, len(data), 7):
-        binary_string = data[i:i+7]
-        length = len(binary_string)
-
-        if length == 7:
-            data_without_parity += data[i:i+4]
-            parity_count += 3
-        elif length == 6:
-            data_without_parity += data[i:i+3]
-            parity_count += 3
-        elif length == 5:
-            data_without_parity += data[i:i+2]
-            parity_count += 3
-        elif length == 3:
-            data_without_parity += data[i:i+1]
-            parity_count += 2
-            
-
-    return data_without_parity, parity_count
-
-def binary_to_image_bytes(binary_data):
-    image_bytes = b''
-    for i in range(0, len(binary_data), 8):
-        eight_bits = binary_data[i:i+8]
-        integer = int(eight_bits, 2)
-        bytes = integer.to_bytes(1, byteorder='big')
-        image_bytes += bytes
-    
-    return image_bytes
+    Arguments:
+    - file_name: The name of the file.
+    - bases_counts: A dictionary the counts of each class of bases are added to.
+    - chunk_bases: The number of bases of each chunk (default: PIPELINE_CHUNK_BASES).
+    - start: The number of bases at the start of the sequence that form a chunk of their own, so that the
+      following chunks hold whole checksum blocks (default: 0, used for the checksum tag).
+
+    Returns:
+    - A generator of (chunk, position of the chunk in the sequence) tuples.
+    """
+    buffer = ''
+    position = 0
+    characters = 0
+    size = start or chunk_bases
+    with open(file_name, 'r', encoding='utf-8', newline='\r\n') as f:
+        for piece in iter(lambda: f.read(chunk_bases), ''):
+            normalized, counts, first_invalid = validate_bases(piece)
+            for name, count in counts.items():
+                bases_counts[name] = bases_counts.get(name, 0) + count
+            if first_invalid != -1:
+                raise SystemExit("The sequence contains characters that are not DNA bases (the first one at position {}).".format(characters + first_invalid))
+            characters += len(piece)
+
+            buffer += normalized
+            while len(buffer) >= size:
+                yield buffer[:size], position
+                buffer = buffer[size:]
+                position += size
+                size = chunk_bases
+
+    try:
+        check_codeword_layout(len(buffer), position)
+    except ValueError as error:
+        raise SystemExit(str(error))
+    if len(buffer) != 0:
+        yield buffer, position
+
+def decode_chunk(chunk, checksum=False, type='txt', block_bits=CHECKSUM_BLOCK_BITS, start=0):
+    """
+    Corrects and decodes a chunk of the sequence (see correct_codewords, verify_block_checksums and
+    decode_passed_blocks). Every chunk but the last must hold whole checksum blocks and whole 80-bit groups of
+    utf8_bin_decode, so that the result is the same as decoding the whole sequence at once.
+
+    Arguments:
+    - chunk: The chunk and its position in the sequence as a tuple.
+    - checksum: Whether block checksums were embedded (default: False).
+    - type: The format of the decoded file (default: 'txt').
+    - block_bits: The number of data bits in each block (default: CHECKSUM_BLOCK_BITS).
+    - start: The position of the first block in the sequence, after the checksum tag (default: 0). The tag is
+      corrected but not decoded.
+
+    Returns:
+    - The decoded data (a string for txt, bytes otherwise), the number of corrected errors, the number of removed
+      parity bits, the report lines of the corrected sequences, the number of codewords with erasures, the indices
+      of the failed blocks, the number of blocks and the number of data bits as a tuple.
+    """
+    string, position = chunk
+    data_bits, errors_count, parity_count, corrected_sequences, erasures_count = correct_codewords(string, position)
+    if position < start:
+        return ('' if type == 'txt' else b''), errors_count, parity_count, corrected_sequences, erasures_count, [], 0, 0
+
+    failed_blocks = []
+    blocks_count = 0
+    if checksum == True:
+        data_bits, failed_blocks, blocks_count = verify_block_checksums(data_bits, block_bits)
+
+    decoded_data = decode_passed_blocks(data_bits, failed_blocks, type, block_bits)
+    if checksum == True:
+        first_block = (position - start) // ((block_bits + 32) // 4 * 7)  # Bases per block: 4 data bits per codeword of 7 bases
+        failed_blocks = [first_block + block for block in failed_blocks]
+
+    return decoded_data, errors_count, parity_count, corrected_sequences, erasures_count, failed_blocks, blocks_count, len(data_bits)
+
+#################################### In-memory Functions ####################################
+
+def decode_huffman_payload(data_without_parity, codebook_dir=CODEBOOK_DIR):
+    """
+    Decodes the Huffman header (marker length, instructions length and instructions or codebook reference) and
+    the Huffman compressed payload that follows it.
+
+    Arguments:
+    - data_without_parity: The data bits of the sequence.
+    - codebook_dir: The directory of the codebook cache, for sequences that reference a shared codebook (default: CODEBOOK_DIR).
+
+    Returns:
+    - The decoded payload as a string.
+    """
+    header_len = decode_header(data_without_parity[:8])
+    instructions_length = decode_header(data_without_parity[8: (header_len + 1) * 8])
+    huffman_instructions_string_binary = utf8_bin_decode(data_without_parity[(header_len + 1) * 8: ((header_len + 1) * 8 + instructions_length)])
+    if huffman_instructions_string_binary.startswith('#'):
+        huffman_dict = load_codebook(huffman_instructions_string_binary[1:], codebook_dir)
+    else:
+        huffman_dict = construct_huffman_dict(huffman_instructions_string_binary)
+
+    return huffman_decode(data_without_parity[(header_len + 1) * 8 + instructions_length:], huffman_dict)
+
+def decode_data(sequence, type='txt', huffman=False, checksum=False, sync=False, codebook_dir=CODEBOOK_DIR):
+    """
+    Decodes a DNA sequence in memory, with the same result as the command line decoder but without the printed
+    report and the CSV files. Used by the service (dnacodex_service.py) to decode many small sequences.
+
+    Arguments:
+    - sequence: The DNA sequence.
+    - type: The format of the decoded file (default: 'txt').
+    - huffman: Whether Huffman compression was used (default: False).
+    - checksum: Whether CRC32 block checksums were embedded, for sequences without the checksum tag (default: False).
+    - sync: Whether synchronization markers were inserted (default: False).
+    - codebook_dir: The directory of the codebook cache (default: CODEBOOK_DIR).
+
+    Returns:
+    - The bytes of the decoded file and a dictionary of the correction statistics (errors, erasures, failed_blocks) as a tuple.
+    """
+    data, bases_counts, first_invalid = validate_bases(sequence)
+    if first_invalid != -1:
+        raise ValueError("The sequence contains {} characters that are not DNA bases (the first one at position {}).".format(bases_counts['invalid'], first_invalid))
+    if sync == True:
+        data = remove_sync_markers(data)[0]
+    check_codeword_layout(len(data))
+
+    data_without_parity, errors_count, parity_count, corrected_sequences, erasures_count = correct_codewords(data)
+    data_without_parity, checksum = split_checksum_tag(data_without_parity, checksum)
+    failed_blocks = []
+    if checksum == True:
+        data_without_parity, failed_blocks, blocks_count = verify_block_checksums(data_without_parity)
+
+    if huffman == True:
+        payload_decoded = decode_huffman_payload(data_without_parity, codebook_dir)
+        if type == 'txt':
+            decoded_data = payload_decoded.encode('utf-8')
+        else:
+            decoded_data = bytes([int(payload_decoded[i:i+3]) for i in range(0, len(payload_decoded), 3)])
+    elif compression_codec(data_without_parity) is not None:
+        try:
+            decoded_data = decompress_payload(binary_to_image_bytes(data_without_parity))[0]
+        except ValueError as error:
+            if len(failed_blocks) != 0:
+                raise ValueError("{} The compressed payload holds {} blocks that failed the CRC32 checksum verification.".format(error, len(failed_blocks))) from None
+            raise
+    elif type == 'txt':
+        decoded_data = decode_passed_blocks(data_without_parity, failed_blocks).encode('utf-8')
+    else:
+        decoded_data = decode_passed_blocks(data_without_parity, failed_blocks, type)
+
+    return decoded_data, {'errors': errors_count, 'erasures': erasures_count, 'failed_blocks': len(failed_blocks)}
 
 #####################################################################################################
 
-parser = argparse.ArgumentParser(description='Huffman DNA decoder')
+parser = argparse.ArgumentParser(description='Huffman DNA decoder', usage='%(prog)s -f FILE -t TYPE [options]')
 
 parser.add_argument('-f', '--file_name',required=True, type=str, metavar='', help='The name of the file you want to decode.')
 parser.add_argument('-huffman', '--Huffman', required=False, action='store_true', help='To be called if Huffman compression was used when the file was encoded.')
 parser.add_argument('-t', '--type', required=True, choices=['jpg', 'jpeg', 'png', 'txt', 'gz', 'txt.gz'], metavar='', help='The format of the file you are decoding.')
 parser.add_argument('-o', '--output_filename', required=True, default='decoded_data.txt', type=str, metavar='', help='The name of the output file you want to save the decoded data in.')
+parser.add_argument('-cb', '--codebook_dir', required=False, type=str, default=CODEBOOK_DIR, metavar='', help='The directory of the persistent codebook cache (needed if the sequence references a shared codebook).')
+parser.add_argument('-sync', '--Sync', required=False, action='store_true', help='To be called if synchronization markers were inserted when the file was encoded.')
+parser.add_argument('-reads', '--Reads', required=False, action='store_true', help='To be called if the input file is a pool of FASTA/FASTQ reads (with pos=N in their IDs) to be merged by consensus.')
+parser.add_argument('-quality', '--Quality', required=False, action='store_true', help='To be called if the consensus votes of FASTQ reads should be weighted by their base qualities.')
+parser.add_argument('-j', '--jobs', required=False, type=int, default=1, metavar='', help='The number of worker processes used for the Hamming correction of long sequences (or for the chunks in the pipelined mode).')
+parser.add_argument('--profile', required=False, action='store_true', help='To be called if you want the wall time, CPU time and peak memory of each stage to be recorded (also enabled by the DNACODEX_PROFILE environment variable).')
+parser.add_argument('--pstats', required=False, type=str, default=None, metavar='', help='The name of the file you want to save a cProfile (pstats) dump of the run in.')
+parser.add_argument('-pipeline', '--Pipeline', required=False, action='store_true', help='To be called if you want the sequence to be read, decoded and written in overlapping chunks (without Huffman compression, synchronization markers and read pools).')
+parser.add_argument('-checksum', '--Checksum', required=False, action='store_true', help='To be called if block checksums were embedded when the file was encoded (only needed for sequences encoded before checksummed sequences were tagged, the tag is detected otherwise).')
+
+
+def main(argv=None):
+    args = parser.parse_args(argv)
+
+    profile = start_profile(args.profile or os.environ.get('DNACODEX_PROFILE', '') not in ('', '0'))
+    if args.pstats is not None:
+        import cProfile
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    if args.Pipeline == True and (args.Huffman == True or args.Sync == True or args.Reads == True):
+        print("\n> Huffman decoding, synchronization markers and read pools need the whole sequence, so the file is decoded without the pipelined mode.")
+        args.Pipeline = False
+    checksum_start = 0
+    if args.Pipeline == True:
+        head_bits = peek_data_bits(args.file_name)
+        payload_head, checksum = split_checksum_tag(head_bits, args.Checksum)
+        if compression_codec(payload_head) is not None:
+            print("\n> The sequence was pre-compressed and the payload is decompressed at once, so the file is decoded without the pipelined mode.")
+            args.Pipeline = False
+        elif len(payload_head) != len(head_bits):
+            print("\n> The sequence is tagged as checksummed, so the CRC32 block checksums are verified.")
+            args.Checksum = True
+            checksum_start = (len(head_bits) - len(payload_head)) // 4 * 7  # Bases of the tag: 4 data bits per codeword of 7 bases
+
+    if args.Reads == True:
+        profile_stage(profile, 'consensus')
+        data, reads_count, uncovered_count = consensus_from_reads(args.file_name, args.Quality)
+    elif args.Pipeline == True:
+        data = None  # Streamed by the pipeline
+    else:
+        profile_stage(profile, 'read')
+        with open(args.file_name, 'r', encoding='utf-8', newline='\r\n') as f:
+            data = f.read()
 
-args = parser.parse_args()
-
-if __name__ == '__main__':
-    with open(args.file_name, 'r', encoding='utf-8', newline='\r\n') as f:
-        data = f.read()
-
-    input_file_size = os.path.getsize('./{}'.format(args.file_name))
     current_time = datetime.datetime.now()
     formatted_time = current_time.strftime("%Y%m%d%H%M%S")
 
     print("\n\033[1;34m############################ Decoding Info ############################\033[0m")
     print("\033[1;35m# Input File Name:\033[0m \033[93m{}\033[0m".format(args.file_name))
-    print("\033[1;35m# Input Sequence Length:\033[0m \033[93m{} DNA bases\033[0m".format(len(data)))
+    if data is not None:
+        print("\033[1;35m# Input Sequence Length:\033[0m \033[93m{} DNA bases\033[0m".format(len(data)))
     print("\033[1;35m# Output File Format:\033[0m \033[93m{}\033[0m".format(args.type))
     print("\033[1;35m# Huffman:\033[0m \033[93m{}\033[0m".format(args.Huffman))
     print("\033[1;35m# Error Correction Method:\033[0m \033[93mHamming\033[0m")
+    print("\033[1;35m# Block Checksums:\033[0m \033[93m{}\033[0m".format(args.Checksum))
+    print("\033[1;35m# Synchronization Markers:\033[0m \033[93m{}\033[0m".format(args.Sync))
+
+    if args.Pipeline == True:
+        profile_stage(profile, 'pipeline')
+        output_filename = args.output_filename + '.{}'.format(args.type)
+        sequences_file_name = 'DNAcodeX_corrected_seqs_{}.csv'.format(formatted_time)
+        bases_counts = {}
+        totals = {'errors': 0, 'parity': 0, 'erasures': 0, 'failed_blocks': [], 'blocks': 0, 'bits': 0}
+        with open(output_filename, 'w' if args.type == 'txt' else 'wb', buffering=PIPELINE_WRITE_BUFFER) as f, open(sequences_file_name, 'w') as sequences_file:
+            def write_chunk(result):
+                decoded_data, errors_count, parity_count, corrected_sequences, erasures_count, failed_blocks, blocks_count, bits_count = result
+                f.write(decoded_data)
+                sequences_file.writelines(corrected_sequences)
+                totals['errors'] += errors_count
+                totals['parity'] += parity_count
+                totals['erasures'] += erasures_count
+                totals['failed_blocks'] += failed_blocks
+                totals['blocks'] += blocks_count
+                totals['bits'] += bits_count
 
-    corrected_data, errors_count, sequences_file_name = correct_string(data, formatted_time)
-    print("\n> Hamming correction was applied.")
-    print("> Number of errors detected and corrected: \033[1;31m{}\033[0m".format(errors_count))
-    print("> The mutated and corrected sequences (if any), were saved in the file: \033[1;36m{}\033[0m".format(sequences_file_name))
-    data_without_parity, parity_count = remove_hamming_bits(corrected_data)
-    print("> Hamming correction parity check bits were removed from the input file.")
-    print("> Number of the removed parity check bits: \033[1;32m{} bits\033[0m".format(parity_count))
-    print("> The sequence length after the removal of Hamming parity check bits: \033[1;32m{} DNA bases\033[0m".format(len(data_without_parity)))
-    output_filename = args.output_filename + '.{}'.format(args.type)
-    open(output_filename, 'w').close()
-
-    if args.Huffman == True:
-        print("\033[1;32m> Huffman compression is applied\033[0m")
-        header_len = decode_header(dna_to_binary(data_without_parity[:8]))  # Decode the marker length from the encoded data string
-        instructions_length = decode_header(dna_to_binary(data_without_parity[8: (header_len + 1) * 8]))  # Decode the length of the instructions from the encoded data string
-        huffman_instructions_string_binary = utf8_bin_decode(dna_to_binary(data_without_parity[(header_len + 1) * 8: ((header_len + 1) * 8 + instructions_length)]))  # Decode the Huffman instructions from the encoded data string
-        huffman_dict = construct_huffman_dict(huffman_instructions_string_binary)  # Construct the Huffman dictionary from the Huffman instructions
-        payload_decoded = huffman_decode(dna_to_binary(data_without_parity[(header_len + 1) * 8 + instructions_length:]), huffman_dict)  # Decode the data using Huffman decoding
-        print("> Huffman compressed data was decoded.")
-
-        if args.type == 'txt':
-            with open(output_filename, 'w', encoding='utf-8') as f:
-                f.write(payload_decoded)
-
-        elif args.type == 'png' or args.type == 'jpg' or args.type == 'gz' or args.type == 'txt.gz':
-            with open(output_filename, 'wb') as bytes_file:
-                for i in range(0, len(payload_decoded), 3):
-                    integer = int(payload_decoded[i:i+3])
-                    bytes_data = integer.to_bytes(1, byteorder='big')
-                    bytes_file.write(bytes_data)
-
-    
-    elif args.Huffman == False:
+            try:
+                run_pipeline(read_sequence_chunks(args.file_name, bases_counts, start=checksum_start), functools.partial(decode_chunk, checksum=args.Checksum, type=args.type, start=checksum_start), write_chunk, args.jobs)
+            except UncorrectableCodeword as error:
+                raise SystemExit(str(error))
+        profile_stage(profile, None)
+
+        errors_count = totals['errors']
+        parity_count = totals['parity']
+        sequence_length = sum([bases_counts[name] for name in bases_counts if name not in ('whitespace', 'invalid')])
+        data_bits_length = totals['bits']
+        print("\n> Bases: " + ', '.join(['{} \033[1;32m{}\033[0m'.format(name, count) for name, count in bases_counts.items()]))
+        print("> The sequence was read, decoded and written in pipelined chunks of \033[1;32m{} DNA bases\033[0m ({} worker processes).".format(PIPELINE_CHUNK_BASES, args.jobs))
+        print("\n> Hamming correction was applied.")
+        print("> Number of errors detected and corrected: \033[1;31m{}\033[0m".format(errors_count))
+        if totals['erasures'] > 0:
+            print("> Codewords decoded with erased bases (N): \033[1;31m{}\033[0m".format(totals['erasures']))
+        print("> The mutated and corrected sequences (if any), were saved in the file: \033[1;36m{}\033[0m".format(sequences_file_name))
+        print("> Number of the removed parity check bits: \033[1;32m{} bits\033[0m".format(parity_count))
+        if args.Checksum == True:
+            if len(totals['failed_blocks']) == 0:
+                print("> All \033[1;32m{}\033[0m blocks passed the CRC32 checksum verification.".format(totals['blocks']))
+            else:
+                blocks_file_name = save_failed_blocks(totals['failed_blocks'], formatted_time)
+                print("> \033[1;31m{} of {}\033[0m blocks failed the CRC32 checksum verification (uncorrectable errors).".format(len(totals['failed_blocks']), totals['blocks']))
+                print("> The failed blocks were saved in the file: \033[1;36m{}\033[0m".format(blocks_file_name))
+                print("> The failed blocks were not decoded, they were replaced by {} in the output file.".format('U+FFFD' if args.type == 'txt' else 'zero bytes'))
         print("\033[1;31m> Huffman compression is NOT applied\033[0m")
-        if args.type == 'txt':
-            decoded_data = utf8_bin_decode(data_without_parity)
-            with open(output_filename, 'w') as f:
-                f.write(decoded_data)
-        
-        elif args.type == 'png' or args.type == 'jpg' or args.type == 'gz' or args.type == 'txt.gz': 
-            decoded_data = binary_to_image_bytes(data_without_parity)
-            with open(output_filename, 'wb') as binary_file:
-                binary_file.write(decoded_data)
 
-    output_file_size = os.path.getsize('./{}'.format(output_filename))
-    
-    if os.path.exists('./DNAcodeX_decoding_INFO.csv'):
-        pass
     else:
-        with open('DNAcodeX_decoding_INFO.csv', 'w') as f:
-            f.write('Input File,ID(DateTime),Errors Count,Length of Input Sequence,Removed Parity Bits,Length of Sequence After Parity Bits Removal,Output File Size (bytes)\n')
+        if args.Reads == True:
+            print("\n> The consensus sequence was computed from \033[1;32m{} reads\033[0m{}.".format(reads_count, ' (quality weighted)' if args.Quality == True else ''))
+            print("> Positions not covered by any read: \033[1;31m{}\033[0m".format(uncovered_count))
+
+        profile_stage(profile, 'validation')
+        data, bases_counts, first_invalid = validate_bases(data)
+        profile_stage(profile, None)
+        print("\n> Bases: " + ', '.join(['{} \033[1;32m{}\033[0m'.format(name, count) for name, count in bases_counts.items()]))
+        if first_invalid != -1:
+            raise SystemExit("The sequence contains {} characters that are not DNA bases (the first one at position {}).".format(bases_counts['invalid'], first_invalid))
+
+        if args.Sync == True:
+            profile_stage(profile, 'resynchronization')
+            data, resynchronized_segments, segments_count = remove_sync_markers(data)
+            profile_stage(profile, None)
+            print("\n> Synchronization markers were removed from the sequence.")
+            print("> Segments resynchronized after insertions or deletions: \033[1;31m{} of {}\033[0m".format(resynchronized_segments, segments_count))
+        if args.Reads == True:
+            data, padding = pad_codeword_layout(data)
+            uncovered_tail = len(data) - len(data.rstrip('N'))
+            if uncovered_tail > 0:
+                print("> Positions at the end of the sequence not covered by any read: \033[1;31m{}\033[0m ({} erased bases were added to complete the last codeword).".format(uncovered_tail, padding))
+        try:
+            check_codeword_layout(len(data))
+        except ValueError as error:
+            raise SystemExit(str(error))
+        profile_stage(profile, 'hamming_correction')
+        try:
+            data_without_parity, errors_count, parity_count, sequences_file_name, erasures_count = correct_and_strip(data, formatted_time, args.jobs)
+        except UncorrectableCodeword as error:
+            raise SystemExit(str(error))
+        profile_stage(profile, None)
+        print("\n> Hamming correction was applied.")
+        print("> Number of errors detected and corrected: \033[1;31m{}\033[0m".format(errors_count))
+        if erasures_count > 0:
+            print("> Codewords decoded with erased bases (N): \033[1;31m{}\033[0m".format(erasures_count))
+        print("> The mutated and corrected sequences (if any), were saved in the file: \033[1;36m{}\033[0m".format(sequences_file_name))
+        print("> Hamming correction parity check bits were removed from the input file.")
+        print("> Number of the removed parity check bits: \033[1;32m{} bits\033[0m".format(parity_count))
+        print("> The sequence length after the removal of Hamming parity check bits: \033[1;32m{} DNA bases\033[0m".format(len(data_without_parity)))
+
+        data_without_parity, checksum = split_checksum_tag(data_without_parity, args.Checksum)
+        failed_blocks = []
+        if checksum == True:
+            if args.Checksum == False:
+                print("> The sequence is tagged as checksummed, so the CRC32 block checksums are verified.")
+            profile_stage(profile, 'checksum')
+            data_without_parity, failed_blocks, blocks_count = verify_block_checksums(data_without_parity)
+            profile_stage(profile, None)
+            if len(failed_blocks) == 0:
+                print("> All \033[1;32m{}\033[0m blocks passed the CRC32 checksum verification.".format(blocks_count))
+            else:
+                blocks_file_name = save_failed_blocks(failed_blocks, formatted_time)
+                print("> \033[1;31m{} of {}\033[0m blocks failed the CRC32 checksum verification (uncorrectable errors).".format(len(failed_blocks), blocks_count))
+                print("> The failed blocks were saved in the file: \033[1;36m{}\033[0m".format(blocks_file_name))
+        output_filename = args.output_filename + '.{}'.format(args.type)
+        open(output_filename, 'w').close()
+
+        if args.Huffman == True:
+            print("\033[1;32m> Huffman compression is applied\033[0m")
+            profile_stage(profile, 'huffman_header')
+            header_len = decode_header(data_without_parity[:8])  # Decode the marker length from the encoded data string
+            instructions_length = decode_header(data_without_parity[8: (header_len + 1) * 8])  # Decode the length of the instructions from the encoded data string
+            huffman_instructions_string_binary = utf8_bin_decode(data_without_parity[(header_len + 1) * 8: ((header_len + 1) * 8 + instructions_length)])  # Decode the Huffman instructions from the encoded data string
+            if huffman_instructions_string_binary.startswith('#'):
+                try:
+                    huffman_dict = load_codebook(huffman_instructions_string_binary[1:], args.codebook_dir)  # The sequence references a shared codebook by its ID
+                except LookupError as error:
+                    raise SystemExit(str(error))
+            else:
+                huffman_dict = construct_huffman_dict(huffman_instructions_string_binary)  # Construct the Huffman dictionary from the Huffman instructions
+            profile_stage(profile, 'huffman_decode')
+            payload_decoded = huffman_decode(data_without_parity[(header_len + 1) * 8 + instructions_length:], huffman_dict)  # Decode the data using Huffman decoding
+            profile_stage(profile, 'write')
+            print("> Huffman compressed data was decoded.")
+            if len(failed_blocks) != 0:
+                print("> \033[1;31mThe Huffman decoding ran through the failed blocks, so the output file is corrupted from block {} on.\033[0m".format(failed_blocks[0]))
+
+            if args.type == 'txt':
+                with open(output_filename, 'w', encoding='utf-8') as f:
+                    f.write(payload_decoded)
+
+            elif args.type == 'png' or args.type == 'jpg' or args.type == 'gz' or args.type == 'txt.gz':
+                with open(output_filename, 'wb') as bytes_file:
+                    for i in range(0, len(payload_decoded), 3):
+                        integer = int(payload_decoded[i:i+3])
+                        bytes_data = integer.to_bytes(1, byteorder='big')
+                        bytes_file.write(bytes_data)
+
+
+        elif compression_codec(data_without_parity) is not None:
+            profile_stage(profile, 'decompression')
+            try:
+                decoded_data, codec = decompress_payload(binary_to_image_bytes(data_without_parity))
+            except ValueError as error:
+                if len(failed_blocks) != 0:
+                    raise SystemExit("{} The compressed payload holds {} blocks that failed the CRC32 checksum verification (see {}).".format(error, len(failed_blocks), blocks_file_name))
+                raise SystemExit(str(error))
+            profile_stage(profile, 'write')
+            print("\033[1;32m> {} compression is applied\033[0m".format(codec))
+            if len(failed_blocks) != 0:
+                print("> \033[1;31mThe decompression ran through the failed blocks, so the output file may be corrupted from block {} on.\033[0m".format(failed_blocks[0]))
+            print("> The {} compressed data was decompressed.".format(codec))
+            with open(output_filename, 'wb') as binary_file:
+                binary_file.write(decoded_data)  # The raw bytes of the original file, text files included
+
+        elif args.Huffman == False:
+            print("\033[1;31m> Huffman compression is NOT applied\033[0m")
+            if len(failed_blocks) != 0:
+                print("> The failed blocks were not decoded, they were replaced by {} in the output file.".format('U+FFFD' if args.type == 'txt' else 'zero bytes'))
+            if args.type == 'txt':
+                profile_stage(profile, 'utf8_decode')
+                decoded_data = decode_passed_blocks(data_without_parity, failed_blocks)
+                profile_stage(profile, 'write')
+                with open(output_filename, 'w') as f:
+                    f.write(decoded_data)
+        
+            elif args.type == 'png' or args.type == 'jpg' or args.type == 'gz' or args.type == 'txt.gz': 
+                profile_stage(profile, 'bytes_decode')
+                decoded_data = decode_passed_blocks(data_without_parity, failed_blocks, args.type)
+                profile_stage(profile, 'write')
+                with open(output_filename, 'wb') as binary_file:
+                    binary_file.write(decoded_data)
+        sequence_length = len(data)
+        data_bits_length = len(data_without_parity)
+
+    profile_stage(profile, None)
+    output_file_size = os.path.getsize('./{}'.format(output_filename))
+    print_profile(profile)
+
+    if args.pstats is not None:
+        profiler.disable()
+        profiler.dump_stats(args.pstats)
+        print("> cProfile statistics were saved in the file: \033[1;36m{}\033[0m".format(args.pstats))
     
-    with open('DNAcodeX_decoding_INFO.csv', 'a') as f:
-        f.write(args.file_name + ',' + formatted_time + ',' + str(errors_count) + ',' + str(len(data)) + ',' + str(parity_count) + ',' + str(len(data_without_parity)) + ',' + str(output_file_size) + '\n')
+    with open_csv_report('DNAcodeX_decoding_INFO.csv', 'Input File,ID(DateTime),Errors Count,Length of Input Sequence,Removed Parity Bits,Length of Sequence After Parity Bits Removal,Output File Size (bytes),Profile (stage=wall s/CPU s/peak KB)') as f:
+        f.write(args.file_name + ',' + formatted_time + ',' + str(errors_count) + ',' + str(sequence_length) + ',' + str(parity_count) + ',' + str(data_bits_length) + ',' + str(output_file_size) + ',' + format_profile(profile) + '\n')
     
     print("> Final output file size: \033[1;32m{} bytes\033[0m".format(output_file_size))
-    print("> Data has been decoded and saved in the file: \033[1;36m{}\033[0m\n".format(output_filename))
\ No newline at end of file
+    print("> Data has been decoded and saved in the file: \033[1;36m{}\033[0m\n".format(output_filename))
+
+
+if __name__ == '__main__':
+    main()
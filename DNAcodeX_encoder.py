@@ -1,6 +1,56 @@
 import argparse
+import array
+import collections
 import datetime
+import functools
+import hashlib
+import heapq
+import itertools
+import json
+import math
+import operator
 import os 
+import re
+import zlib
+
+from dnacodex_core import (
+    CHECKSUM_BLOCK_BITS,
+    CHECKSUM_TAG,
+    CODEBOOK_DIR,
+    CODEBOOKS,
+    COMPRESSION_CODECS,
+    SYNC_MARKER,
+    SYNC_SEGMENT_BASES,
+    PIPELINE_WRITE_BUFFER,
+    bit_switch,
+    codebook_path,
+    load_codebook,
+    checksum_tag,
+    compress_payload,
+    open_csv_report,
+    run_pipeline,
+    start_profile,
+    profile_stage,
+    format_profile,
+    print_profile,
+)
+
+
+MAX_HOMOPOLYMER = 3  # Longest run of the same base allowed by the constrained mapping
+GC_WINDOW = 50  # Length (in bases) of the sliding window in which the GC-content is constrained
+GC_MIN = 40  # Lowest GC-content (%) allowed in a window
+GC_MAX = 60  # Highest GC-content (%) allowed in a window
+CONSTRAINT_CHUNK_BASES = 2 ** 18  # Bases scanned at once by the constraint check, which bounds its memory
+
+CODEBOOK_CACHE_SIZE = 256  # Number of codebooks kept in the cache before the least recently used are evicted
+
+PIPELINE_CHUNK_BYTES = 2 ** 16  # Input bytes per chunk of the pipelined mode (whole checksum blocks, about 1 Mb of sequence)
+CDC_MIN_BYTES = 2 ** 11  # Smallest chunk of the content-defined chunking (except the last one)
+CDC_AVERAGE_BITS = 13  # A boundary is cut when this many bits of the rolling hash are zero (8 KiB chunks on average)
+CDC_MAX_BYTES = 2 ** 16  # Largest chunk of the content-defined chunking
+SEGMENT_STORE_DIR = 'DNAcodeX_segments'  # Default directory of the store of encoded chunks (DNA segments)
+BITS_TO_STRONG = bytes.maketrans(b'10', b'GC')  # 256-byte table mapping the bits of even positions to bases
+BITS_TO_WEAK = bytes.maketrans(b'10', b'AT')  # 256-byte table mapping the bits of odd positions to bases
 
 ######################################### General Functions #########################################
 def utf8_bin(u):
@@ -9,34 +59,93 @@ def utf8_bin(u):
 
 def map_to_dna(binary_string):
 
-    table = binary_string.maketrans('10', 'GC')  # Create a translation table to convert '10' to 'GC'
-    binary_string = binary_string.translate(table)  # Apply the translation table to convert the binary representation to the encoded marker
+    bits = binary_string.encode('ascii')
+    sequence = bytearray(bits.translate(BITS_TO_STRONG))  # Convert '10' to 'GC' at every position
+    sequence[1::2] = bits[1::2].translate(BITS_TO_WEAK)  # Convert '10' to 'AT' at the odd positions
 
-    binary_string = list(binary_string)
-    for i in range(1, len(binary_string), 2):
-        if binary_string[i] == 'C':
-            binary_string[i] = 'T'  # Replace 'C' with 'T'
-        if binary_string[i] == 'G':
-            binary_string[i] = 'A'  # Replace 'G' with 'A'
+    return sequence.decode('ascii')
 
-    binary_string = ''.join(binary_string)
-    return binary_string
+def map_to_dna_constrained(binary_string, max_homopolymer=MAX_HOMOPOLYMER, gc_window=GC_WINDOW, gc_min=GC_MIN, gc_max=GC_MAX, sync=False, segment_bases=SYNC_SEGMENT_BASES, marker=SYNC_MARKER):
+    """
+    Maps binary to DNA bases while constraining the homopolymer length and the GC-content of every window.
+    As in map_to_dna, 1 is mapped to G or A and 0 is mapped to C or T, so the decoder needs no changes. Instead of
+    alternating the two bases by position, the base of each bit is chosen so that no homopolymer is longer than
+    max_homopolymer, the GC-content of every window stays within gc_min and gc_max, and dinucleotide repeats
+    (e.g. CTCTCT for runs of 0s) are broken whenever the other constraints allow it. Copies of the synchronization
+    marker are always avoided, including those that would overlap the markers that add_sync_markers inserts after
+    every segment when sync is set, since the decoder could realign on them.
 
-#################################### Huffman Encoding Functions ####################################
-class node:
-    def __init__(self, symbol, frequency, left=None, right=None):
-        # symbol
-        self.symbol = symbol
+    Arguments:
+    - binary_string: The binary string to map.
+    - max_homopolymer: The longest run of the same base allowed (default: MAX_HOMOPOLYMER).
+    - gc_window: The length of the sliding window in bases (default: GC_WINDOW).
+    - gc_min: The lowest GC-content (%) allowed in a window (default: GC_MIN).
+    - gc_max: The highest GC-content (%) allowed in a window (default: GC_MAX).
+    - sync: Whether synchronization markers will be inserted into the sequence (default: False).
+    - segment_bases: The number of bases between two markers (default: SYNC_SEGMENT_BASES).
+    - marker: The synchronization marker (default: SYNC_MARKER).
+
+    Returns:
+    - The DNA sequence as a string.
+    """
+    bases = {'1': ('G', 'A'), '0': ('C', 'T')}  # (strong, weak) base for each bit
+    low = gc_min * gc_window / 100
+    high = gc_max * gc_window / 100
+
+    sequence = []
+    run = 0  # Length of the homopolymer at the end of the sequence
+    gc = 0  # GC count of the last gc_window - 1 bases
+    context = ''  # The last len(marker) - 1 bases of the sequence with its synchronization markers
+
+    for i, bit in enumerate(binary_string):
+        # A marker follows this base if it ends a segment that is not the last one
+        ahead = marker if sync == True and (i + 1) % segment_bases == 0 and i + 1 < len(binary_string) else ''
+        best = None
+        for strong, base in zip((1, 0), bases[bit]):
+            spurious_marker = (context + base + ahead).find(marker) not in (-1, len(context) + 1)
+            homopolymer = i != 0 and base == sequence[-1] and run == max_homopolymer
+            window_gc = gc + strong
+            gc_violation = i >= gc_window - 1 and (window_gc < low or window_gc > high)
+            repeat = i >= 2 and base == sequence[-2]
+            balance = abs(window_gc - (min(i, gc_window - 1) + 1) / 2)
+            score = (spurious_marker, homopolymer, gc_violation, repeat, balance)
+            if best is None or score < best[0]:
+                best = (score, base, strong)
+
+        base, strong = best[1], best[2]
+        run = run + 1 if i != 0 and base == sequence[-1] else 1
+        sequence.append(base)
+        context = (context + base + ahead)[1 - len(marker):]
+        gc += strong
+        if i >= gc_window - 1:
+            gc -= sequence[i - gc_window + 1] in 'GC'  # Slide the window forward by one base
+
+    return ''.join(sequence)
+
+def check_constraints(sequence, max_homopolymer=MAX_HOMOPOLYMER, gc_window=GC_WINDOW, gc_min=GC_MIN, gc_max=GC_MAX, chunk_bases=CONSTRAINT_CHUNK_BASES):
+    """
+    Scans a DNA sequence for homopolymers longer than max_homopolymer and for windows whose GC-content is outside
+    gc_min and gc_max. The sequence is streamed through check_constraints_chunk in chunks of chunk_bases, so the
+    memory used by the scan does not grow with the length of the sequence.
 
-        # frequency
-        self.frequency = frequency
+    Arguments:
+    - sequence: The DNA sequence to check.
+    - max_homopolymer: The longest run of the same base allowed (default: MAX_HOMOPOLYMER).
+    - gc_window: The length of the sliding window in bases, below 256 (default: GC_WINDOW).
+    - gc_min: The lowest GC-content (%) allowed in a window (default: GC_MIN).
+    - gc_max: The highest GC-content (%) allowed in a window (default: GC_MAX).
+    - chunk_bases: The number of bases scanned at once (default: CONSTRAINT_CHUNK_BASES).
 
-        # Left node
-        self.left = left
+    Returns:
+    - The number of homopolymer violations and the number of GC violations (regions of merged windows) as a tuple.
+    """
+    state = {}
+    for i in range(0, len(sequence), chunk_bases):
+        check_constraints_chunk(state, sequence[i:i+chunk_bases], max_homopolymer, gc_window, gc_min, gc_max)
 
-        # Right node
-        self.right = right
-        
+    return state.get('homopolymers', 0), state.get('gc_violations', 0)
+
+#################################### Huffman Encoding Functions ####################################
 def build_frequency_table(data):
     """
     Calculates the frequency of symbols in a given string.
@@ -48,73 +157,84 @@ def build_frequency_table(data):
         dict: A dictionary representing the frequency of each symbol.
     """
     
-    frequency_table = dict()
-    for element in data:
-        if frequency_table.get(element) is None:
-            frequency_table[element] = 1  # Initialize the frequency of the symbol.
-        else:
-            frequency_table[element] += 1  # Increment the frequency of the symbol.
+    frequency_table = dict(collections.Counter(data))  # Count the frequency of each symbol in a single pass.
     return frequency_table
 
 def build_huffman_tree(frequency_table):
     """
-    Builds a Huffman tree based on the frequency table.
+    Builds a Huffman tree based on the frequency table. The tree is stored as flat arrays: node i has the children
+    children[2 * i] and children[2 * i + 1] (-1 for leaves) and the symbol symbols[i] (None for internal nodes).
+    The leaves come first and the root is the last node.
 
     Args:
         frequency_table (dict): A dictionary representing the frequency of each symbol.
 
     Returns:
-        node: The root node of the Huffman tree.
+        tuple: The children array and the symbols list of the Huffman tree.
     """
-    nodes = []
-    for symbol, freq in frequency_table.items():
-        nodes.append(node(symbol, freq))  # Create a leaf node for each symbol with its frequency.
-
-    while len(nodes) > 1:
-        nodes = sorted(nodes, key=lambda node: node.frequency)  # Sort the nodes based on their frequency.
-        left_node = nodes.pop(0)  # Get the node with the lowest frequency.
-        right_node = nodes.pop(0)  # Get the next node with the lowest frequency.
-        parent_node = node(None, left_node.frequency + right_node.frequency, left_node, right_node)  # Create a parent node with the combined frequency.
-        nodes.append(parent_node)  # Add the parent node back to the list of nodes.
-    return nodes[0]  # Return the root node of the Huffman tree.
-
-def build_huffman_codes(node, code='', huffman_codes=[]):
+    symbols = list(frequency_table)
+    children = array.array('i', [-1] * (2 * len(symbols)))
+    # Nodes with equal frequencies are merged in the order they were created, leaves in the order of the table
+    heap = [(frequency, i) for i, frequency in enumerate(frequency_table.values())]
+    heapq.heapify(heap)
+
+    while len(heap) > 1:
+        left_frequency, left_node = heapq.heappop(heap)  # Get the node with the lowest frequency.
+        right_frequency, right_node = heapq.heappop(heap)  # Get the next node with the lowest frequency.
+        parent_node = len(symbols)
+        symbols.append(None)
+        children.extend([left_node, right_node])  # Create a parent node with the combined frequency.
+        heapq.heappush(heap, (left_frequency + right_frequency, parent_node))
+
+    return children, symbols
+
+def build_huffman_codes(huffman_tree, huffman_codes=None):
     """
-    Builds Huffman codes for each symbol in the Huffman tree.
+    Builds Huffman codes for each symbol in the Huffman tree, walking the tree with an explicit stack so that skewed
+    trees do not hit the recursion limit.
 
     Args:
-        node (node): The current node in the Huffman tree.
-        code (str): The Huffman code generated so far (default: '').
-        huffman_codes (list): A list to store the Huffman codes (default: []).
+        huffman_tree (tuple): The children array and the symbols list built by build_huffman_tree.
+        huffman_codes (dict): A dictionary to store the Huffman codes in (default: a new dictionary).
 
     Returns:
-        None
+        dict: The Huffman codes.
     """
-    if node is None:
-        return
-
-    if node.symbol is not None:
-        huffman_codes[node.symbol] = code  # Assign the Huffman code to the symbol.
+    if huffman_codes is None:
+        huffman_codes = dict()
+
+    children, symbols = huffman_tree
+    if len(symbols) == 0:
+        return huffman_codes
+
+    stack = [(len(symbols) - 1, '')]  # Start from the root.
+    while stack:
+        node, code = stack.pop()
+        if symbols[node] is not None:
+            huffman_codes[symbols[node]] = code or '0'  # Assign the Huffman code to the symbol (a single symbol still needs one bit).
+        else:
+            stack.append((children[2 * node + 1], code + '1'))  # Traverse the right child with 'G' appended to the code.
+            stack.append((children[2 * node], code + '0'))  # Traverse the left child with 'C' appended to the code.
 
-    build_huffman_codes(node.left, code + '0', huffman_codes)  # Traverse the left child with 'C' appended to the code.
-    build_huffman_codes(node.right, code + '1', huffman_codes)  # Traverse the right child with 'G' appended to the code.
+    return huffman_codes
 
-def huffman_encode(data):
+def huffman_encode(data, huffman_codes=None):
     """
     Encodes the input data using Huffman coding.
 
     Args:
         data (str): The input string to be encoded.
+        huffman_codes (dict): Huffman codes to use instead of building them from the data (default: None).
 
     Returns:
         tuple: A tuple containing the encoded payload and the Huffman codes.
     """
-    frequency_table = build_frequency_table(data)  # Calculate the frequency table.
-    
-    huffman_tree = build_huffman_tree(frequency_table)  # Build the Huffman tree.
-    huffman_codes = dict()
-    
-    build_huffman_codes(huffman_tree, '', huffman_codes)  # Build Huffman codes for each symbol.
+    if huffman_codes is None:
+        frequency_table = build_frequency_table(data)  # Calculate the frequency table.
+        
+        huffman_tree = build_huffman_tree(frequency_table)  # Build the Huffman tree.
+        
+        huffman_codes = build_huffman_codes(huffman_tree)  # Build Huffman codes for each symbol.
     
     encoded_payload = ''.join([huffman_codes[symbol] for symbol in data])  # Encode the input data using the Huffman codes.
 
@@ -138,6 +258,19 @@ def encode_huffman_instructions(huffman_codes):
 
     return binary_string
 
+def encode_codebook_reference(codebook_id):
+    """
+    Encodes a reference to a shared codebook in place of the Huffman instructions.
+    Embedded instructions always start with ',' so the '#' prefix tells the decoder to load the codebook by its ID.
+
+    Arguments:
+    - codebook_id: The ID of the codebook in the codebook cache.
+
+    Returns:
+    - The encoded reference as a string.
+    """
+    return utf8_bin('#' + codebook_id)
+
 def encode_marker(instructions_string):
     """
     Encodes the instructions length using a specific encoding scheme.
@@ -183,14 +316,85 @@ def read_chrs(file_name):
         
     return data
 
+#################################### Codebook Cache Functions ####################################
+
+def codebook_fingerprint(frequency_table):
+    """
+    Computes the fingerprint of a frequency table. Symbols are kept exactly while their relative frequencies are
+    quantized to half powers of two, so files with near-identical statistics share the same fingerprint (and codebook).
+
+    Arguments:
+    - frequency_table: A dictionary representing the frequency of each symbol.
+
+    Returns:
+    - The fingerprint (16 hexadecimal characters), used as the codebook ID.
+    """
+    total = sum(frequency_table.values())
+    histogram = sorted((symbol, round(2 * math.log2(frequency / total))) for symbol, frequency in frequency_table.items())
+
+    return hashlib.sha1(json.dumps(histogram).encode('utf-8')).hexdigest()[:16]
+
+def save_codebook(codebook_id, huffman_codes, codebook_dir=CODEBOOK_DIR, cache_size=CODEBOOK_CACHE_SIZE, pinned=False):
+    """
+    Saves a codebook in the codebook cache and evicts the least recently used codebooks beyond cache_size.
+    Pinned codebooks are saved in the subdirectory PINNED_CODEBOOK_DIR instead, which is never evicted, since
+    shared sequences cannot be decoded without the codebook they reference.
+
+    Arguments:
+    - codebook_id: The ID of the codebook.
+    - huffman_codes: A dictionary containing the Huffman codes.
+    - codebook_dir: The directory of the codebook cache (default: CODEBOOK_DIR).
+    - cache_size: The number of codebooks kept in the cache (default: CODEBOOK_CACHE_SIZE).
+    - pinned: Whether the codebook is referenced by a shared sequence (default: False).
+
+    Returns:
+    - None
+    """
+    path = codebook_path(codebook_id, codebook_dir, pinned)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(huffman_codes, f, ensure_ascii=False)
+    os.replace(path + '.tmp', path)  # Never leave a partially written codebook in the cache
+    CODEBOOKS[path] = huffman_codes
+    if pinned == True:
+        return
+
+    codebooks = [os.path.join(codebook_dir, name) for name in os.listdir(codebook_dir) if name.endswith('.json')]
+    codebooks.sort(key=os.path.getmtime, reverse=True)
+    for old_codebook in codebooks[cache_size:]:
+        os.remove(old_codebook)
+
+def cached_huffman_codes(data, codebook_dir=CODEBOOK_DIR, shared=False):
+    """
+    Returns the Huffman codes for the data from the codebook cache, building and caching them on a miss.
+    The codebook of a shared sequence is pinned, so that it is never evicted.
+
+    Arguments:
+    - data: The input string to be encoded.
+    - codebook_dir: The directory of the codebook cache (default: CODEBOOK_DIR).
+    - shared: Whether the sequence will reference the codebook instead of embedding it (default: False).
+
+    Returns:
+    - The Huffman codes, the codebook ID and whether the codebook was found in the cache as a tuple.
+    """
+    frequency_table = build_frequency_table(data)
+    codebook_id = codebook_fingerprint(frequency_table)
+
+    try:
+        huffman_codes = load_codebook(codebook_id, codebook_dir)
+        cache_hit = True
+    except LookupError:
+        huffman_codes = build_huffman_codes(build_huffman_tree(frequency_table))
+        cache_hit = False
+        save_codebook(codebook_id, huffman_codes, codebook_dir, pinned=shared)
+
+    if shared == True and not os.path.exists(codebook_path(codebook_id, codebook_dir, pinned=True)):
+        save_codebook(codebook_id, huffman_codes, codebook_dir, pinned=True)  # Pinned on the first shared use of a cached codebook
+
+    return huffman_codes, codebook_id, cache_hit
+
 #################################### Hamming Error Correction Functions ####################################
 
-def bit_switch(bit):
-    if bit == 1:
-        return 0
-    elif bit == 0:
-        return 1
-    
 def add_hamming(string):
     string_list = []
 
@@ -256,18 +460,412 @@ def file_to_binary(file_data):
     
     return binary_string
 
+ENCODING_TABLE = {}  # 8-bit string -> the 14 DNA bases of its two Hamming codewords, filled on first use
+
+def build_encoding_table():
+    """
+    Builds the lookup table of the fused encoding kernel. Every byte (as an 8-bit string) is split into two
+    4-bit groups, Hamming parity bits are added to each group and the two codewords are mapped to DNA with
+    add_hamming and map_to_dna, so the table reproduces their results exactly. The first codeword always starts
+    at an even position and the second one at an odd position, and since 14 bases are produced for every byte the
+    alignment is the same for all bytes.
+
+    Returns:
+    - The lookup table as a dictionary.
+    """
+    if len(ENCODING_TABLE) == 0:
+        for byte in range(256):
+            bits = f'{byte:08b}'
+            ENCODING_TABLE[bits] = map_to_dna(add_hamming(bits[:4]) + add_hamming(bits[4:]))
+
+    return ENCODING_TABLE
+
+def hamming_map_to_dna(binary_string):
+    """
+    Adds the Hamming parity bits to the binary string and maps it to DNA bases in a single pass, with the same
+    result as map_to_dna(add_hamming_to_string(binary_string)[0]). Each 8 bits are looked up in the encoding
+    table and the leftover bits (less than 8) are encoded by add_hamming_to_string and map_to_dna.
+
+    Arguments:
+    - binary_string: The binary string to encode.
+
+    Returns:
+    - The DNA sequence and the number of Hamming parity bits that were added as a tuple.
+    """
+    table = build_encoding_table()
+    full_length = len(binary_string) - len(binary_string) % 8
+    sequence = ''.join([table[binary_string[i:i+8]] for i in range(0, full_length, 8)])
+
+    leftover_codewords, leftover_parity_count = add_hamming_to_string(binary_string[full_length:])
+    sequence += map_to_dna(leftover_codewords)  # The leftover starts at an even position, as map_to_dna expects
+
+    return sequence, full_length // 4 * 3 + leftover_parity_count
+
+def bytes_to_dna(data):
+    """
+    Encodes bytes directly to DNA bases (14 bases per byte) with Hamming parity bits, without building the
+    binary string. The result is the same as hamming_map_to_dna(file_to_binary(data)).
+
+    Arguments:
+    - data: The bytes to encode.
+
+    Returns:
+    - The DNA sequence and the number of Hamming parity bits that were added as a tuple.
+    """
+    table = build_encoding_table()
+    byte_table = [table[f'{byte:08b}'] for byte in range(256)]
+
+    return ''.join(map(byte_table.__getitem__, data)), len(data) * 6
+
+#################################### Synchronization Functions ####################################
+
+def add_sync_markers(sequence, segment_bases=SYNC_SEGMENT_BASES, marker=SYNC_MARKER):
+    """
+    Inserts a synchronization marker after every segment of segment_bases bases. The decoder searches for the
+    markers to realign the codewords after insertions or deletions, so an indel only damages a single segment.
+
+    Arguments:
+    - sequence: The DNA sequence.
+    - segment_bases: The number of bases between two markers, a multiple of 7 (default: SYNC_SEGMENT_BASES).
+    - marker: The synchronization marker (default: SYNC_MARKER).
+
+    Returns:
+    - The DNA sequence with the markers and the number of markers as a tuple.
+    """
+    segments = [sequence[i:i+segment_bases] for i in range(0, len(sequence), segment_bases)]
+
+    return marker.join(segments), max(len(segments) - 1, 0)
+
+#################################### Block Checksum Functions ####################################
+
+def add_block_checksums(binary_string, block_bits=CHECKSUM_BLOCK_BITS):
+    """
+    Splits the binary string into fixed size blocks and appends the CRC32 checksum (32 bits) of each block after it.
+    The checksums let the decoder detect blocks that Hamming could not correct (e.g. double errors in a codeword).
+    The result starts with the checksum tag (outside the blocks), so that the decoder detects the checksums by itself.
+
+    Arguments:
+    - binary_string: The binary string to protect.
+    - block_bits: The number of data bits in each block (default: CHECKSUM_BLOCK_BITS).
+
+    Returns:
+    - The tagged binary string with the embedded checksums and the number of blocks as a tuple.
+    """
+    blocks = []
+    for i in range(0, len(binary_string), block_bits):
+        block = binary_string[i:i+block_bits]
+        blocks.append(block + f'{zlib.crc32(block.encode("ascii")):032b}')  # Append the 32-bit checksum of the block
+
+    return checksum_tag() + ''.join(blocks), len(blocks)
+
+#################################### Pipelined Execution Functions ####################################
+
+def read_chunks(file_name, chunk_bytes=PIPELINE_CHUNK_BYTES):
+    """
+    Reads a file in chunks of chunk_bytes bytes.
+
+    Arguments:
+    - file_name: The name of the file.
+    - chunk_bytes: The size of the chunks (default: PIPELINE_CHUNK_BYTES).
+
+    Returns:
+    - A generator of the chunks as bytes.
+    """
+    with open(file_name, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_bytes), b''):
+            yield chunk
+
+def encode_chunk(chunk, checksum=False, block_bits=CHECKSUM_BLOCK_BITS):
+    """
+    Encodes a chunk of the input to DNA (see bytes_to_dna), after appending the CRC32 checksum of every block if
+    checksum is set. Every chunk but the last must hold whole checksum blocks, so that the result is the same as
+    encoding the whole input at once.
+
+    Arguments:
+    - chunk: The chunk as bytes.
+    - checksum: Whether the block checksums are added (default: False).
+    - block_bits: The number of data bits in each block, a multiple of 8 (default: CHECKSUM_BLOCK_BITS).
+
+    Returns:
+    - The DNA sequence and the number of Hamming parity bits that were added as a tuple.
+    """
+    if checksum:
+        block_bytes = block_bits // 8
+        blocks = []
+        for i in range(0, len(chunk), block_bytes):
+            block = chunk[i:i+block_bytes]
+            block_binary = f'{int.from_bytes(block, "big"):0{len(block) * 8}b}'  # As in add_block_checksums, the checksum covers the bits as text
+            blocks.append(block + zlib.crc32(block_binary.encode('ascii')).to_bytes(4, 'big'))
+        chunk = b''.join(blocks)
+
+    return bytes_to_dna(chunk)
+
+def add_sync_markers_chunk(sequence, start, segment_bases=SYNC_SEGMENT_BASES, marker=SYNC_MARKER):
+    """
+    Inserts the synchronization markers into a chunk of the sequence that starts at position start (without the
+    markers), so that chunks joined in order are the same as add_sync_markers of the whole sequence.
+
+    Arguments:
+    - sequence: The chunk of the DNA sequence.
+    - start: The position of the chunk in the whole sequence.
+    - segment_bases: The number of bases between two markers (default: SYNC_SEGMENT_BASES).
+    - marker: The synchronization marker (default: SYNC_MARKER).
+
+    Returns:
+    - The chunk with the markers and the number of markers as a tuple.
+    """
+    first = -start % segment_bases  # Position of the first segment boundary in the chunk
+    pieces = [sequence[:first]]
+    markers_count = 0
+    for i in range(first, len(sequence), segment_bases):
+        if start + i > 0:
+            pieces.append(marker)
+            markers_count += 1
+        pieces.append(sequence[i:i+segment_bases])
+
+    return ''.join(pieces), markers_count
+
+def check_constraints_chunk(state, sequence, max_homopolymer=MAX_HOMOPOLYMER, gc_window=GC_WINDOW, gc_min=GC_MIN, gc_max=GC_MAX):
+    """
+    Counts the constraint violations of a sequence that arrives in chunks, with the same counts as a scan of the
+    whole sequence. Each chunk is scanned on bytes, translation tables and regular expressions, without a Python
+    level loop per base or window. Only the last gc_window - 1 bases, the homopolymer at the end and whether the
+    last window violates the GC constraint are carried over to the next chunk, so violations that span two chunks
+    are counted once.
+
+    Arguments:
+    - state: A dictionary with the carried over values and the violation counts, updated in place (start with {}).
+    - sequence: The next chunk of the DNA sequence.
+    - max_homopolymer, gc_window, gc_min, gc_max: As in check_constraints.
+    """
+    state.setdefault('homopolymers', 0)
+    state.setdefault('gc_violations', 0)
+    if len(sequence) == 0:
+        return
+
+    # The carried over homopolymer is prepended (at most max_homopolymer + 1 bases of it), so a run that continues
+    # in this chunk is matched at the start and counted only if it was not already too long
+    run_base, run_length = state.get('run', ('', 0))
+    prefix = run_base * min(run_length, max_homopolymer + 1)
+    text = prefix + sequence
+    for m in re.finditer(r'([ACGT])\1{%d,}' % max_homopolymer, text):
+        if m.start() != 0 or len(prefix) == 0 or run_length <= max_homopolymer:
+            state['homopolymers'] += 1
+    last_run = re.search(r'(.)\1*\Z', text, re.DOTALL)
+    if last_run.start() == 0 and len(prefix) != 0:
+        state['run'] = (run_base, run_length + len(sequence))
+    else:
+        state['run'] = (last_run.group(1), last_run.end() - last_run.start())
+
+    # Every window of the tail and the chunk ends in the chunk, so each window is checked once
+    text = state.get('tail', '') + sequence
+    gc_table = bytes.maketrans(b'GCgcATatN', b'\x01\x01\x01\x01\x00\x00\x00\x00\x00')
+    prefix_sums = [0, *itertools.accumulate(text.encode('ascii').translate(gc_table))]  # Cumulative GC count of the chunk
+    windows = bytes(map(operator.sub, prefix_sums[gc_window:], prefix_sums[:-gc_window]))  # GC count of every window (gc_window < 256)
+    violation_table = bytes(int(gc < gc_min * gc_window / 100 or gc > gc_max * gc_window / 100) for gc in range(256))
+    flags = windows.translate(violation_table)  # 1 for every window that violates the GC constraint
+
+    # Each run of violating windows is a single region, unless it continues the region of the previous chunk
+    regions = flags.count(b'\x00\x01') + flags.startswith(b'\x01')
+    if flags.startswith(b'\x01') and state.get('gc_open', False):
+        regions -= 1
+    state['gc_violations'] += regions
+    if len(flags) != 0:
+        state['gc_open'] = flags.endswith(b'\x01')
+    state['tail'] = text[len(text) - gc_window + 1:] if len(text) >= gc_window else text
+
+#################################### Content-defined Chunking Functions ####################################
+
+GEAR = [int.from_bytes(hashlib.sha256(bytes([byte])).digest()[:8], 'big') for byte in range(256)]  # Random 64-bit value of each byte for the rolling hash (fixed, so boundaries are stable across versions)
+
+def content_defined_chunks(data, min_bytes=CDC_MIN_BYTES, average_bits=CDC_AVERAGE_BITS, max_bytes=CDC_MAX_BYTES):
+    """
+    Splits the data into chunks whose boundaries depend on the content instead of the offset. A gear rolling hash
+    (h = 2h + GEAR[byte]) is updated with every byte and a boundary is cut where its top average_bits bits are zero.
+    The top bits depend on the last 64 bytes only, so an edit only moves the boundaries around it and the chunks
+    before and after the edit stay the same. The first min_bytes bytes of a chunk are not hashed, and a chunk
+    is cut after max_bytes bytes if no boundary was found.
+
+    Arguments:
+    - data: The bytes to split.
+    - min_bytes: The smallest chunk (default: CDC_MIN_BYTES).
+    - average_bits: The number of hash bits that must be zero at a boundary (default: CDC_AVERAGE_BITS).
+    - max_bytes: The largest chunk (default: CDC_MAX_BYTES).
+
+    Returns:
+    - A list of (offset, length) tuples.
+    """
+    gear = GEAR
+    mask = ((1 << average_bits) - 1) << (64 - average_bits)
+    chunks = []
+    start = 0
+    while start < len(data):
+        end = min(start + max_bytes, len(data))
+        cut = end
+        h = 0
+        for position in range(min(start + min_bytes, end), end):
+            h = ((h << 1) + gear[data[position]]) & 0xFFFFFFFFFFFFFFFF
+            if h & mask == 0:
+                cut = position + 1
+                break
+        chunks.append((start, cut - start))
+        start = cut
+
+    return chunks
+
+def encode_segments(data, chunks, store_dir=SEGMENT_STORE_DIR):
+    """
+    Encodes every chunk into its own DNA segment, keyed by the SHA-256 hash of the chunk in the segment store.
+    Segments of chunks that are already in the store (e.g. from a previous version of the file) are reused
+    instead of being encoded again. Every byte is encoded into 14 bases without leftover codewords, so the
+    concatenation of the segments is the same sequence as the encoding of the whole file.
+
+    Arguments:
+    - data: The bytes of the file.
+    - chunks: The (offset, length) tuples returned by content_defined_chunks.
+    - store_dir: The directory of the segment store (default: SEGMENT_STORE_DIR).
+
+    Returns:
+    - A list of (chunk hash, DNA segment, reused) tuples.
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    segments = []
+    for offset, length in chunks:
+        chunk = data[offset:offset + length]
+        chunk_hash = hashlib.sha256(chunk).hexdigest()
+        path = os.path.join(store_dir, chunk_hash + '.txt')
+
+        segment = None
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                segment = f.read()
+            if len(segment) != length * 14:
+                segment = None  # Damaged segment, encoded again
+        if segment is not None:
+            segments.append((chunk_hash, segment, True))
+            continue
+
+        segment = bytes_to_dna(chunk)[0]
+        with open(path + '.tmp', 'w') as f:
+            f.write(segment)
+        os.replace(path + '.tmp', path)  # Never leave a partially written segment in the store
+        segments.append((chunk_hash, segment, False))
+
+    return segments
+
+def save_segments_manifest(segments, chunks, manifest_file_name):
+    """
+    Saves the list of the segments of the sequence in order: the hash, the offset and the length of each chunk,
+    the position and the length of its segment in the sequence, and whether it was reused from the store.
+
+    Arguments:
+    - segments: The list returned by encode_segments.
+    - chunks: The list returned by content_defined_chunks.
+    - manifest_file_name: The name of the CSV file.
+
+    Returns:
+    - None
+    """
+    start = 0
+    with open(manifest_file_name, 'w') as f:
+        f.write('Segment,Chunk SHA-256,Offset (bytes),Length (bytes),Start (bases),Length (bases),Reused(0/1)\n')
+        for number, ((chunk_hash, segment, reused), (offset, length)) in enumerate(zip(segments, chunks)):
+            f.write(','.join([str(number), chunk_hash, str(offset), str(length), str(start), str(len(segment)), str(int(reused))]) + '\n')
+            start += len(segment)
+
+#################################### In-memory Functions ####################################
+
+def encode_data(data, type='txt', compress='none', checksum=False, constrained=False, sync=False, shared=False, codebook_dir=CODEBOOK_DIR):
+    """
+    Encodes the content of a file in memory, with the same result as the command line encoder but without the
+    printed report and the INFO CSV. Used by the service (dnacodex_service.py) to encode many small files.
+
+    Arguments:
+    - data: The bytes of the file.
+    - type: The format of the file (default: 'txt').
+    - compress: none, huffman or one of the COMPRESSION_CODECS (default: 'none').
+    - checksum: Whether CRC32 block checksums are embedded (default: False).
+    - constrained: Whether the constrained mapping is used (default: False).
+    - sync: Whether synchronization markers are inserted (default: False).
+    - shared: Whether the sequence references the cached Huffman codebook instead of embedding it (default: False).
+    - codebook_dir: The directory of the codebook cache, used with shared (default: CODEBOOK_DIR).
+
+    Returns:
+    - The DNA sequence.
+    """
+    if compress == 'huffman':
+        if type == 'txt':
+            data = data.decode('utf-8')
+        else:
+            data = ''.join([str(byte).zfill(3) for byte in data])
+
+        huffman_codes = None
+        if shared == True:
+            huffman_codes, codebook_id, cache_hit = cached_huffman_codes(data, codebook_dir, shared=True)
+        encoded_payload, huffman_codes = huffman_encode(data, huffman_codes)
+        if shared == True:
+            encoded_instructions = encode_codebook_reference(codebook_id)
+        else:
+            encoded_instructions = encode_huffman_instructions(huffman_codes)
+        encoded_marker, len_instructions_len = encode_marker(encoded_instructions)
+        binary_data = encode_marker(len_instructions_len)[0] + encoded_marker + encoded_instructions + encoded_payload
+    elif compress in COMPRESSION_CODECS:
+        binary_data = file_to_binary(compress_payload(data, compress))
+    elif type == 'txt':
+        binary_data = utf8_bin(data.decode('utf-8'))  # Rejects files that are not UTF-8, as the encoder does
+    else:
+        binary_data = file_to_binary(data)
+
+    if checksum == True:
+        binary_data = add_block_checksums(binary_data)[0]
+    if constrained == True:
+        sequence = map_to_dna_constrained(add_hamming_to_string(binary_data)[0], sync=sync)
+    else:
+        sequence = hamming_map_to_dna(binary_data)[0]
+    if sync == True:
+        sequence = add_sync_markers(sequence)[0]
+
+    return sequence
+
 ############################################################################################################
 
-parser = argparse.ArgumentParser(description='Huffman DNA encoding system.')
+parser = argparse.ArgumentParser(description='Huffman DNA encoding system.', usage='%(prog)s -f FILE -t TYPE [options]')
 
 parser.add_argument('-f', '--file_name', required=True, type=str, metavar='', help='The file name you want to encode.')
 parser.add_argument('-huffman', '--Huffman', required=False, action='store_true', help='To be called if you want the encoded file to be compressed using Huffman variable length codes.')
 parser.add_argument('-t', '--type', required=True, choices=['jpg', 'jpeg', 'png', 'txt', 'gz', 'txt.gz'], metavar='', help='The format of the file you are encoding.')
+parser.add_argument('-compress', '--compress', required=False, choices=['none', 'huffman', *COMPRESSION_CODECS], default='none', metavar='', help='The compression applied before the Hamming coding and the mapping: none, huffman (same as -huffman), {} (the codec is recorded in the sequence and undone by the decoder automatically).'.format(', '.join(COMPRESSION_CODECS)))
 parser.add_argument('-o', '--output_filename', required=False, type=str, default='encoded_data.txt', metavar='', help='The name of the output file you want to save the encoded data in.')
-
-args = parser.parse_args()
-
-if __name__ == '__main__':
+parser.add_argument('-constrained', '--Constrained', required=False, action='store_true', help='To be called if you want the homopolymer length and the GC-content of the sequence to be constrained (max homopolymer {}, GC {}-{} %% in windows of {} bases).'.format(MAX_HOMOPOLYMER, GC_MIN, GC_MAX, GC_WINDOW))
+parser.add_argument('-check', '--Check', required=False, action='store_true', help='To be called if you want the sequence to be scanned for homopolymers and GC-content violations (always done with -constrained).')
+parser.add_argument('-cache', '--Cache', required=False, action='store_true', help='To be called if you want the Huffman codebook to be taken from (or saved in) the persistent codebook cache.')
+parser.add_argument('-shared', '--Shared', required=False, action='store_true', help='To be called if you want the sequence to reference the cached Huffman codebook by its ID instead of embedding it (implies -cache).')
+parser.add_argument('-cb', '--codebook_dir', required=False, type=str, default=CODEBOOK_DIR, metavar='', help='The directory of the persistent codebook cache.')
+parser.add_argument('--profile', required=False, action='store_true', help='To be called if you want the wall time, CPU time and peak memory of each stage to be recorded (also enabled by the DNACODEX_PROFILE environment variable).')
+parser.add_argument('--pstats', required=False, type=str, default=None, metavar='', help='The name of the file you want to save a cProfile (pstats) dump of the run in.')
+parser.add_argument('-sync', '--Sync', required=False, action='store_true', help='To be called if you want a synchronization marker to be inserted every {} bases, so that insertions and deletions only damage one segment.'.format(SYNC_SEGMENT_BASES))
+parser.add_argument('-pipeline', '--Pipeline', required=False, action='store_true', help='To be called if you want the file to be read, encoded and written in overlapping chunks (without Huffman compression and constrained mapping).')
+parser.add_argument('-j', '--jobs', required=False, type=int, default=1, metavar='', help='The number of worker processes that encode the chunks in the pipelined mode.')
+parser.add_argument('-checksum', '--Checksum', required=False, action='store_true', help='To be called if you want a CRC32 checksum to be embedded after every block of {} bits.'.format(CHECKSUM_BLOCK_BITS))
+parser.add_argument('-cdc', '--CDC', required=False, action='store_true', help='To be called if you want the file to be split into content-defined chunks that are encoded into separate segments and reused from the segment store when they did not change (without compression, constrained mapping, checksums and synchronization markers).')
+parser.add_argument('-store', '--segment_store', required=False, type=str, default=SEGMENT_STORE_DIR, metavar='', help='The directory of the store of encoded segments used with -cdc.')
+
+
+def main(argv=None):
+    args = parser.parse_args(argv)
+    if args.compress == 'huffman':
+        args.Huffman = True
+    elif args.Huffman == True and args.compress != 'none':
+        parser.error('-huffman cannot be combined with -compress {}'.format(args.compress))
+    elif args.Huffman == True:
+        args.compress = 'huffman'
+
+    profile = start_profile(args.profile or os.environ.get('DNACODEX_PROFILE', '') not in ('', '0'))
+    if args.pstats is not None:
+        import cProfile
+
+        profiler = cProfile.Profile()
+        profiler.enable()
 
     input_file_size = os.path.getsize('./{}'.format(args.file_name))
     current_time = datetime.datetime.now()
@@ -278,80 +876,229 @@ if __name__ == '__main__':
     print("\033[1;35m# File Format:\033[0m \033[93m{}\033[0m".format(args.type))
     print("\033[1;35m# File Size:\033[0m \033[93m{} bytes\033[0m".format(input_file_size))
     print("\033[1;35m# Huffman:\033[0m \033[93m{}\033[0m".format(args.Huffman))
+    print("\033[1;35m# Compression:\033[0m \033[93m{}\033[0m".format(args.compress))
     print("\033[1;35m# Error Correction Method:\033[0m \033[93mHamming\033[0m")
-    if args.Huffman == True:
-        if args.type == 'txt':
-            data = read_chrs(args.file_name)
-
-            suffix = '_text.txt'
-            data_bits = len(data) * 8
-            
+    print("\033[1;35m# Block Checksums:\033[0m \033[93m{}\033[0m".format(args.Checksum))
+    print("\033[1;35m# Constrained Mapping:\033[0m \033[93m{}\033[0m".format(args.Constrained))
+    print("\033[1;35m# Synchronization Markers:\033[0m \033[93m{}\033[0m".format(args.Sync))
+    if args.CDC == True and (args.compress != 'none' or args.Constrained == True or args.Checksum == True or args.Sync == True):
+        print("\n> Compression, the constrained mapping, block checksums and synchronization markers span the chunk boundaries, so the file is encoded without content-defined chunking.")
+        args.CDC = False
+    if args.CDC == True and args.Pipeline == True:
+        print("\n> Content-defined chunking needs the whole input, so the file is encoded without the pipelined mode.")
+        args.Pipeline = False
+    if args.Pipeline == True and (args.compress != 'none' or args.Constrained == True):
+        print("\n> Compression and the constrained mapping need the whole input, so the file is encoded without the pipelined mode.")
+        args.Pipeline = False
+
+    if args.Pipeline == True:
+        print("\n\033[1;31m> Huffman compression was NOT applied\033[0m")
+        profile_stage(profile, 'pipeline')
+        suffix = '_text.txt' if args.type == 'txt' else '_{}.txt'.format(args.type)
+        output_filename = args.output_filename + suffix
+        constraints = {}
+        totals = {'parity': 0, 'markers': 0, 'length': 0, 'gc': 0}
+        with open(output_filename, 'w', buffering=PIPELINE_WRITE_BUFFER) as f:
+            def write_chunk(result):
+                sequence, chunk_parity_count = result
+                if args.Checksum == True and totals['length'] == 0:
+                    tag_sequence, tag_parity_count = bytes_to_dna(CHECKSUM_TAG)  # The tag (whole codewords) goes in front of the first chunk, as in add_block_checksums
+                    sequence = tag_sequence + sequence
+                    chunk_parity_count += tag_parity_count
+                if args.Sync == True:
+                    sequence, chunk_markers_count = add_sync_markers_chunk(sequence, totals['length'] - totals['markers'] * len(SYNC_MARKER))
+                    totals['markers'] += chunk_markers_count
+                totals['parity'] += chunk_parity_count
+                totals['length'] += len(sequence)
+                totals['gc'] += sequence.count('G') + sequence.count('C')
+                if args.Check == True:
+                    check_constraints_chunk(constraints, sequence)  # The writer sees the chunks in order, with the markers
+                f.write(sequence)
+
+            run_pipeline(read_chunks(args.file_name), functools.partial(encode_chunk, checksum=args.Checksum), write_chunk, args.jobs)
+        profile_stage(profile, None)
+
+        parity_count = totals['parity']
+        markers_count = totals['markers']
+
+        binary_length = input_file_size * 8
+        sequence_length = totals['length']
+        gc_content = round(totals['gc'] / sequence_length * 100, 3)
+        compression_ratio = 0
+        if args.Checksum == True:
+            print("> CRC32 checksums were added to \033[1;32m{} blocks\033[0m of {} bits.".format(-(-binary_length // CHECKSUM_BLOCK_BITS), CHECKSUM_BLOCK_BITS))
+        print("> The file was read, encoded and written in pipelined chunks of \033[1;32m{} bytes\033[0m ({} worker processes).".format(PIPELINE_CHUNK_BYTES, args.jobs))
+        print("> Hamming correction parity check bits were added to the sequence.")
+        print('> The number of Hamming parity bits that were added: \033[1;32m{} bits\033[0m'.format(parity_count))
+        print("> The ratio of parity check bits to the full length of the sequence: \033[1;32m{} %\033[0m".format(round(parity_count/(sequence_length - markers_count * len(SYNC_MARKER)) * 100)))
+        if args.Sync == True:
+            print("> \033[1;32m{}\033[0m synchronization markers were inserted (one every {} bases).".format(markers_count, SYNC_SEGMENT_BASES))
+        print("> GC-content of the full sequence: \033[1;32m{} %\033[0m".format(gc_content))
+        if args.Check == True:
+            print("> Homopolymers longer than {} bases: \033[1;32m{}\033[0m".format(MAX_HOMOPOLYMER, constraints.get('homopolymers', 0)))
+            print("> Regions with GC-content outside {}-{} % (windows of {} bases): \033[1;32m{}\033[0m".format(GC_MIN, GC_MAX, GC_WINDOW, constraints.get('gc_violations', 0)))
+        print("> Full length of the sequence: \033[1;32m{} DNA bases\033[0m".format(sequence_length))
 
-        elif args.type == 'jpeg' or args.type == 'jpg' or args.type == 'png' or args.type == 'gz' or args.type == 'txt.gz':
+    else:
+        profile_stage(profile, 'read')
+        if args.CDC == True:
             with open(args.file_name, 'rb') as f:
                 read = f.read()
-                
-            data = ''
-            for byte in read:
-                data += str(byte).zfill(3)
+            if args.type == 'txt':
+                read.decode('utf-8')  # Text files must be UTF-8, as without chunking
+            suffix = '_text.txt' if args.type == 'txt' else '_{}.txt'.format(args.type)
+            print("\n\033[1;31m> Huffman compression was NOT applied\033[0m")
+
+            compression_ratio = 0
+            decoding_info_ratio = 0
+
+        elif args.Huffman == True:
+            if args.type == 'txt':
+                data = read_chrs(args.file_name)
 
-            suffix = '_{}.txt'.format(args.type)
+                suffix = '_text.txt'
+            
 
-        encoded_payload, huffman_codes = huffman_encode(data)  # Perform Huffman encoding on the data to obtain encoded data and Huffman codes
-        encoded_instructions = encode_huffman_instructions(huffman_codes)  # Encode the Huffman codes to obtain the encoded instructions
-        encoded_marker, len_instructions_len = encode_marker(encoded_instructions)  # Encode the length of the instructions to obtain the marker and length of instructions
-        marker_len = encode_marker(len_instructions_len)  # Encode the length of the instructions length to obtain the marker length
-        binary_data = marker_len[0] + encoded_marker + encoded_instructions + encoded_payload # Concatenate the marker length, marker, instructions, and data to form the final encoded string
+            elif args.type == 'jpeg' or args.type == 'jpg' or args.type == 'png' or args.type == 'gz' or args.type == 'txt.gz':
+                with open(args.file_name, 'rb') as f:
+                    read = f.read()
+                
+                data = ''
+                for byte in read:
+                    data += str(byte).zfill(3)
+
+                suffix = '_{}.txt'.format(args.type)
+
+            profile_stage(profile, 'huffman')
+            if args.Cache == True or args.Shared == True:
+                huffman_codes, codebook_id, cache_hit = cached_huffman_codes(data, args.codebook_dir, args.Shared)  # Reuse the codebook of files with near-identical statistics
+                print("\n> Huffman codebook \033[1;36m{}\033[0m was {}".format(codebook_id, 'found in the codebook cache' if cache_hit else 'built and saved in the codebook cache'))
+            else:
+                huffman_codes = None
+            encoded_payload, huffman_codes = huffman_encode(data, huffman_codes)  # Perform Huffman encoding on the data to obtain encoded data and Huffman codes
+            if args.Shared == True:
+                encoded_instructions = encode_codebook_reference(codebook_id)  # Reference the shared codebook instead of embedding it
+            else:
+                encoded_instructions = encode_huffman_instructions(huffman_codes)  # Encode the Huffman codes to obtain the encoded instructions
+            encoded_marker, len_instructions_len = encode_marker(encoded_instructions)  # Encode the length of the instructions to obtain the marker and length of instructions
+            marker_len = encode_marker(len_instructions_len)  # Encode the length of the instructions length to obtain the marker length
+            binary_data = marker_len[0] + encoded_marker + encoded_instructions + encoded_payload # Concatenate the marker length, marker, instructions, and data to form the final encoded string
         
-        encoded_payload_bits = len(encoded_payload)
-        compression_ratio = round((encoded_payload_bits)/(input_file_size * 8) * 100, 3)
-        decoding_info_ratio = round((len(marker_len) + len(encoded_marker) + len(encoded_instructions))/len(binary_data)*100, 3)
+            encoded_payload_bits = len(encoded_payload)
+            compression_ratio = round((encoded_payload_bits)/(input_file_size * 8) * 100, 3)
+            decoding_info_ratio = round((len(marker_len) + len(encoded_marker) + len(encoded_instructions))/len(binary_data)*100, 3)
 
-        print("\n\033[1;32m> Huffman compression was applied\033[0m")
-        print("> Space usage BEFORE Huffman compression: \033[1;31m{} bits\033[0m".format(input_file_size * 8))
-        print("> Space usage AFTER Huffman compression (payload): \033[1;32m{} bits\033[0m".format(encoded_payload_bits))
-        print("> Space usage AFTER Huffman compression (payload + header): \033[1;32m{} bits\033[0m".format(len(binary_data)))
+            print("\n\033[1;32m> Huffman compression was applied\033[0m")
+            print("> Space usage BEFORE Huffman compression: \033[1;31m{} bits\033[0m".format(input_file_size * 8))
+            print("> Space usage AFTER Huffman compression (payload): \033[1;32m{} bits\033[0m".format(encoded_payload_bits))
+            print("> Space usage AFTER Huffman compression (payload + header): \033[1;32m{} bits\033[0m".format(len(binary_data)))
 
-        print("> Compression ratio (payload): \033[1;32m{} %\033[0m".format(compression_ratio))  
-        print("> Ratio of decoding information to the full encoded data: \033[1;32m{} %\033[0m".format(decoding_info_ratio))
+            print("> Compression ratio (payload): \033[1;32m{} %\033[0m".format(compression_ratio))  
+            print("> Ratio of decoding information to the full encoded data: \033[1;32m{} %\033[0m".format(decoding_info_ratio))
             
 
             
-    elif args.Huffman == False:
-        if args.type == 'txt':
-            with open(args.file_name, 'r', encoding='utf-8', newline='\r\n') as f:
-                read = f.read()
-            binary_data = utf8_bin(read)  
-            suffix = '_text.txt'
-
-        elif args.type == 'jpeg' or args.type == 'jpg' or args.type == 'png' or args.type == 'gz' or args.type == 'txt.gz':
+        elif args.compress in COMPRESSION_CODECS:
             with open(args.file_name, 'rb') as f:
-                read = f.read()
-            binary_data = file_to_binary(read)
-            suffix = '_{}.txt'.format(args.type)
-        print("\n\033[1;31m> Huffman compression was NOT applied\033[0m")
-
-        compression_ratio = 0
-        decoding_info_ratio = 0
-
-    binary_data_hamming, parity_count = add_hamming_to_string(binary_data)
-    output_data = map_to_dna(binary_data_hamming)
-    print("> Hamming correction parity check bits were added to the sequence.")
-    print('> The number of Hamming parity bits that were added: \033[1;32m{} bits\033[0m'.format(parity_count))
-    print("> The ratio of parity check bits to the full length of the sequence: \033[1;32m{} %\033[0m".format(round(parity_count/len(output_data) * 100)))
-    print("> GC-content of the full sequence: \033[1;32m{} %\033[0m".format(gc_counter(output_data)))
-    print("> Full length of the sequence: \033[1;32m{} DNA bases\033[0m".format(len(output_data)))
-    output_filename = args.output_filename + suffix
-
-    if os.path.exists('./DNAcodeX_encoding_INFO.csv'):
-        pass
-    else:
-        with open('DNAcodeX_encoding_INFO.csv', 'w') as f:
-            f.write('Input File,ID(DateTime),Huffman,Size Before Compression (bits),Size AFter Compression (bits),Compression Ratio (payload)(%),Hamming Parity Bits Count,Parity Check Ratio (%),Output Sequence Length(DNA bases)\n')
-    
-    with open('DNAcodeX_encoding_INFO.csv', 'a') as f:
-        f.write(args.file_name + ',' + formatted_time + ',' + str(args.Huffman) + ',' + str(input_file_size * 8) + ',' + str(len(binary_data)) + ',' + str(compression_ratio) + ',' + str(parity_count) + ',' + str(round(parity_count/len(output_data) * 100)) + ',' + str(len(output_data)) + '\n')
+                read = f.read()  # The raw bytes are compressed, so text files need no UTF-8 handling
+            suffix = '_text.txt' if args.type == 'txt' else '_{}.txt'.format(args.type)
+
+            profile_stage(profile, 'compression')
+            compressed = compress_payload(read, args.compress)
+            profile_stage(profile, 'binary')
+            binary_data = file_to_binary(compressed)
+
+            compression_ratio = round(len(binary_data)/(input_file_size * 8) * 100, 3) if input_file_size > 0 else 0
+            decoding_info_ratio = 0
+
+            print("\n\033[1;32m> {} compression was applied\033[0m".format(args.compress))
+            print("> Space usage BEFORE {} compression: \033[1;31m{} bits\033[0m".format(args.compress, input_file_size * 8))
+            print("> Space usage AFTER {} compression (payload + codec tag): \033[1;32m{} bits\033[0m".format(args.compress, len(binary_data)))
+            print("> Compression ratio (payload): \033[1;32m{} %\033[0m".format(compression_ratio))
+
+        elif args.Huffman == False:
+            if args.type == 'txt':
+                with open(args.file_name, 'r', encoding='utf-8', newline='\r\n') as f:
+                    read = f.read()
+                profile_stage(profile, 'binary')
+                binary_data = utf8_bin(read)  
+                suffix = '_text.txt'
+
+            elif args.type == 'jpeg' or args.type == 'jpg' or args.type == 'png' or args.type == 'gz' or args.type == 'txt.gz':
+                with open(args.file_name, 'rb') as f:
+                    read = f.read()
+                profile_stage(profile, 'binary')
+                binary_data = file_to_binary(read)
+                suffix = '_{}.txt'.format(args.type)
+            print("\n\033[1;31m> Huffman compression was NOT applied\033[0m")
+
+            compression_ratio = 0
+            decoding_info_ratio = 0
+
+        if args.CDC == False:
+            protected_data = binary_data  # Chunks are mapped straight from the bytes of the file
+        if args.Checksum == True:
+            profile_stage(profile, 'checksum')
+            protected_data, blocks_count = add_block_checksums(binary_data)
+            print("> CRC32 checksums were added to \033[1;32m{} blocks\033[0m of {} bits.".format(blocks_count, CHECKSUM_BLOCK_BITS))
+
+        if args.CDC == True:
+            profile_stage(profile, 'chunking')
+            chunks = content_defined_chunks(read)
+            profile_stage(profile, 'segments')
+            segments = encode_segments(read, chunks, args.segment_store)
+            output_data = ''.join([segment for chunk_hash, segment, reused in segments])
+            parity_count = len(read) * 6
+            new_bases = sum([len(segment) for chunk_hash, segment, reused in segments if reused == False])
+            manifest_file_name = args.output_filename + suffix[:-len('.txt')] + '_segments.csv'
+            save_segments_manifest(segments, chunks, manifest_file_name)
+            print("> The file was split into \033[1;32m{}\033[0m content-defined chunks (about {} bytes each).".format(len(chunks), 2 ** CDC_AVERAGE_BITS))
+            print("> Segments reused from the segment store: \033[1;32m{} of {}\033[0m".format(sum([reused for chunk_hash, segment, reused in segments]), len(segments)))
+            print("> New bases to synthesize: \033[1;32m{} of {} DNA bases\033[0m".format(new_bases, len(output_data)))
+            print("> The list of the segments was saved in the file: \033[1;36m{}\033[0m".format(manifest_file_name))
+        elif args.Constrained == True:
+            profile_stage(profile, 'hamming')
+            binary_data_hamming, parity_count = add_hamming_to_string(protected_data)
+            profile_stage(profile, 'mapping')
+            output_data = map_to_dna_constrained(binary_data_hamming, sync=args.Sync)
+        else:
+            profile_stage(profile, 'hamming_mapping')
+            output_data, parity_count = hamming_map_to_dna(protected_data)  # Fused Hamming and mapping kernel
+        print("> Hamming correction parity check bits were added to the sequence.")
+        print('> The number of Hamming parity bits that were added: \033[1;32m{} bits\033[0m'.format(parity_count))
+        print("> The ratio of parity check bits to the full length of the sequence: \033[1;32m{} %\033[0m".format(round(parity_count/len(output_data) * 100)))
+        if args.Sync == True:
+            profile_stage(profile, 'sync_markers')
+            output_data, markers_count = add_sync_markers(output_data)
+            print("> \033[1;32m{}\033[0m synchronization markers were inserted (one every {} bases).".format(markers_count, SYNC_SEGMENT_BASES))
+        print("> GC-content of the full sequence: \033[1;32m{} %\033[0m".format(gc_counter(output_data)))
+        if args.Constrained == True or args.Check == True:
+            profile_stage(profile, 'constraint_check')
+            homopolymers_count, gc_violations_count = check_constraints(output_data)
+            profile_stage(profile, None)
+            print("> Homopolymers longer than {} bases: \033[1;32m{}\033[0m".format(MAX_HOMOPOLYMER, homopolymers_count))
+            print("> Regions with GC-content outside {}-{} % (windows of {} bases): \033[1;32m{}\033[0m".format(GC_MIN, GC_MAX, GC_WINDOW, gc_violations_count))
+        print("> Full length of the sequence: \033[1;32m{} DNA bases\033[0m".format(len(output_data)))
+        output_filename = args.output_filename + suffix
+
+        profile_stage(profile, 'write')
+        with open(output_filename, 'w') as f:
+            f.write(output_data)
+        binary_length = len(read) * 8 if args.CDC == True else len(binary_data)
+        sequence_length = len(output_data)
+    profile_stage(profile, None)
+    print_profile(profile)
+
+    if args.pstats is not None:
+        profiler.disable()
+        profiler.dump_stats(args.pstats)
+        print("> cProfile statistics were saved in the file: \033[1;36m{}\033[0m".format(args.pstats))
+
+    with open_csv_report('DNAcodeX_encoding_INFO.csv', 'Input File,ID(DateTime),Compression,Size Before Compression (bits),Size AFter Compression (bits),Compression Ratio (payload)(%),Hamming Parity Bits Count,Parity Check Ratio (%),Output Sequence Length(DNA bases),Profile (stage=wall s/CPU s/peak KB)') as f:
+        f.write(args.file_name + ',' + formatted_time + ',' + args.compress + ',' + str(input_file_size * 8) + ',' + str(binary_length) + ',' + str(compression_ratio) + ',' + str(parity_count) + ',' + str(round(parity_count/sequence_length * 100)) + ',' + str(sequence_length) + ',' + format_profile(profile) + '\n')
  
-    with open(output_filename, 'w') as f:
-        f.write(output_data)
     print("> DNA encoded data was saved in the file: \033[1;36m{}\033[0m\n".format(output_filename))
+
+
+if __name__ == '__main__':
+    main()
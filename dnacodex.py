@@ -0,0 +1,58 @@
+import importlib
+import sys
+
+# Subcommand -> (module, description). Only the module of the chosen subcommand is imported, so
+# starting one tool does not pay for the imports of the others.
+COMMANDS = {
+    'encode': ('DNAcodeX_encoder', 'Encode a text or image file into a DNA sequence.'),
+    'decode': ('DNAcodeX_decoder', 'Decode a DNA sequence (or a pool of reads) back into a file.'),
+    'simulate': ('mutations_simulator', 'Simulate mutations on encoded sequences and report the retrieval rates.'),
+    'serve': ('dnacodex_service', 'Run a local encode/decode service with warm tables and batched workers.'),
+    'bench': ('dnacodex_bench', 'Measure the throughput of every stage of the pipeline.'),
+}
+
+#####################################################################################################
+
+def load_command(name):
+    """
+    Imports the module of a subcommand.
+
+    Arguments:
+    - name: The name of the subcommand.
+
+    Returns:
+    - The imported module.
+    """
+    return importlib.import_module(COMMANDS[name][0])
+
+def print_usage(file=sys.stdout):
+    """
+    Prints the list of the available subcommands.
+    """
+    print('usage: dnacodex <command> [arguments]\n\ncommands:', file=file)
+    for name, (_, description) in COMMANDS.items():
+        print('  {:<10}{}'.format(name, description), file=file)
+    print("\nRun 'dnacodex <command> -h' for the arguments of a command.", file=file)
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+
+    if not argv or argv[0] in ('-h', '--help'):
+        print_usage()
+        return 0
+
+    if argv[0] not in COMMANDS:
+        print("\033[1;31mUnknown command:\033[0m {}\n".format(argv[0]), file=sys.stderr)
+        print_usage(sys.stderr)
+        return 2
+
+    module = load_command(argv[0])
+    module.parser.prog = 'dnacodex {}'.format(argv[0])
+    module.main(argv[1:])
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,294 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import sys
+import time
+
+import DNAcodeX_encoder as encoder
+import mutations_simulator as simulator
+import dnacodex_core as core
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    import resource  # Unix only
+except ImportError:
+    resource = None
+
+######################################### Input Generation Functions #########################################
+
+WORDS = ['the', 'and', 'of', 'to', 'that', 'in', 'he', 'shall', 'unto', 'for', 'i', 'his', 'a', 'lord', 'they', 'be', 'is', 'him', 'not', 'them']
+UTF8_CHARS = 'ÄÖÜäöüßéèêçñåøæαβγδεζηθλμπσωЖЗИЙКЛМНОПабвгдеж中文字符数据存储편집저장𝄞𝄢😀😃🧬'
+
+def parse_size(size):
+    """
+    Converts a size such as 1K, 10M or 512 to a number of bytes.
+
+    Arguments:
+    - size: The size as a string.
+
+    Returns:
+    - The size in bytes as an integer.
+    """
+    units = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+    size = size.strip().upper()
+    if size[-1] in units:
+        return int(float(size[:-1]) * units[size[-1]])
+
+    return int(size)
+
+def generate_input(kind, size, seed=0):
+    """
+    Generates a synthetic input of approximately the given size in bytes (UTF-8 encoded for text inputs).
+
+    Arguments:
+    - kind: 'text' (ASCII words), 'binary' (random bytes) or 'utf8' (text dominated by multi-byte characters).
+    - size: The size of the input in bytes.
+    - seed: The seed of the random generator (default: 0).
+
+    Returns:
+    - The input as a string for the text kinds and as bytes for the binary kind.
+    """
+    rng = random.Random(seed)
+    if kind == 'binary':
+        return rng.randbytes(size)
+
+    pieces = []
+    length = 0
+    while length < size:
+        if kind == 'text':
+            piece = rng.choice(WORDS) + (' ' if rng.random() < 0.9 else '.\r\n')
+        else:
+            piece = ''.join(rng.choice(UTF8_CHARS) for _ in range(4)) + ' '
+        pieces.append(piece)
+        length += len(piece.encode('utf-8'))
+
+    return ''.join(pieces)
+
+######################################### Measurement Functions #########################################
+
+def peak_rss():
+    """
+    Returns the peak resident set size of the process in kilobytes, or None where the resource module is not
+    available (Windows).
+    """
+    if resource is None:
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        peak = peak // 1024  # macOS reports bytes instead of kilobytes
+
+    return peak
+
+def time_stage(results, stage, bases, function, *arguments):
+    """
+    Runs a single pipeline stage and records its wall time, throughput and the peak RSS of the process after it.
+
+    Arguments:
+    - results: The dictionary the stage measurements are added to.
+    - stage: The name of the stage.
+    - bases: The number of DNA bases the stage works on (used for the throughput).
+    - function: The function to time.
+    - arguments: The arguments of the function.
+
+    Returns:
+    - The return value of the function.
+    """
+    start = time.perf_counter()
+    output = function(*arguments)
+    seconds = time.perf_counter() - start
+
+    results[stage] = {
+        'seconds': round(seconds, 6),
+        'bases_per_second': round(bases / seconds, 1) if seconds > 0 else None,
+        'peak_rss_kb': peak_rss(),
+    }
+
+    return output
+
+def sequence_bases(bits):
+    """
+    Returns the number of DNA bases that Hamming coding maps the given number of data bits to (7 bases per 4 bits,
+    and 6, 5 or 3 bases for a last group of 3, 2 or 1 bits).
+    """
+    groups, rest = divmod(bits, 4)
+
+    return groups * 7 + (0, 3, 5, 6)[rest]
+
+def bench_entropy_coders(raw, data, huffman_payload, huffman_codes):
+    """
+    Compares the Huffman and the rANS entropy coders on one input: the size of the compressed data (header
+    included), the number of DNA bases it is mapped to, the bases rANS saves and the time each coder takes.
+
+    Arguments:
+    - raw: The input as bytes.
+    - data: The input as given to huffman_encode.
+    - huffman_payload: The Huffman encoded payload of the data.
+    - huffman_codes: The Huffman codes of the data.
+
+    Returns:
+    - A dictionary with the measurements of each coder.
+    """
+    instructions = encoder.encode_huffman_instructions(huffman_codes)
+    marker, instructions_length = encoder.encode_marker(instructions)
+    huffman_bits = len(encoder.encode_marker(instructions_length)[0]) + len(marker) + len(instructions) + len(huffman_payload)
+
+    start = time.perf_counter()
+    core.huffman_decode(huffman_payload, huffman_codes)
+    huffman_decode_seconds = time.perf_counter() - start
+
+    coders = {'huffman': {'bits': huffman_bits, 'bases': sequence_bases(huffman_bits), 'decode_seconds': round(huffman_decode_seconds, 6)}}
+    for name, module in (('rans', None), ('rans_numpy', numpy)):
+        if name == 'rans_numpy' and numpy is None:
+            continue
+        start = time.perf_counter()
+        compressed = core.rans_encode(raw, numpy=module)
+        encode_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        core.rans_decode(compressed, module)
+        decode_seconds = time.perf_counter() - start
+        bits = len(compressed) * 8
+        coders[name] = {
+            'bits': bits,
+            'bases': sequence_bases(bits),
+            'bases_saved': sequence_bases(huffman_bits) - sequence_bases(bits),
+            'encode_seconds': round(encode_seconds, 6),
+            'decode_seconds': round(decode_seconds, 6),
+            'decode_bytes_per_second': round(len(raw) / decode_seconds, 1) if decode_seconds > 0 else None,
+        }
+
+    return coders
+
+def bench_input(kind, size, mutations_rate, indel_rate, seed=0, raw=None):
+    """
+    Runs every stage of the encoder, the simulator and the decoder on one synthetic input. Only the public kernels
+    of the stages are timed (the encoder and simulator functions and the decoding functions of dnacodex_core), not
+    the file handling of the command line tools.
+
+    Arguments:
+    - kind: The kind of the input ('text', 'binary' or 'utf8').
+    - size: The size of the input in bytes.
+    - mutations_rate: The rate of the substitutions introduced before the correction stage.
+    - indel_rate: The rate of the insertions and of the deletions introduced in the synchronization stages.
+    - seed: The seed of the random generators (default: 0).
+    - raw: The content of an input file to use instead of a synthetic input (default: None).
+
+    Returns:
+    - A dictionary with the input description, the measurements of each stage and the comparison of the entropy coders.
+    """
+    if raw is None:
+        raw = generate_input(kind, size, seed)
+    if kind == 'binary':
+        data = ''.join([str(byte).zfill(3) for byte in raw])  # Same representation as the Huffman path of the encoder
+    else:
+        data = raw
+
+    stages = {}
+    # The throughput of every stage is reported against the final sequence length, so it is only known after
+    # the mapping stage. The encoding stages are timed first and their throughput filled in afterwards.
+    payload, huffman_codes = time_stage(stages, 'huffman_encode', 0, encoder.huffman_encode, data)
+    codewords, parity_count = time_stage(stages, 'add_hamming_to_string', 0, encoder.add_hamming_to_string, payload)
+    sequence = time_stage(stages, 'map_to_dna', 0, encoder.map_to_dna, codewords)
+    encoder.build_encoding_table()  # Built once per process, so it is kept out of the timing
+    time_stage(stages, 'hamming_map_to_dna', 0, encoder.hamming_map_to_dna, payload)
+    if kind == 'binary':
+        time_stage(stages, 'bytes_to_dna', 0, encoder.bytes_to_dna, raw)
+    else:
+        time_stage(stages, 'bytes_to_dna', 0, encoder.bytes_to_dna, raw.encode('utf-8'))
+    bases = len(sequence)
+    for stage in stages.values():
+        stage['bases_per_second'] = round(bases / stage['seconds'], 1) if stage['seconds'] > 0 else None
+
+    random.seed(seed)
+    mutated_sequence = time_stage(stages, 'simulate_substitution', bases, simulator.simulate_substitution, sequence, mutations_rate)[0]
+
+    synchronized_sequence = time_stage(stages, 'add_sync_markers', bases, encoder.add_sync_markers, sequence)[0]
+    shifted_sequence = time_stage(stages, 'simulate_indels', bases, simulator.simulate_indels, synchronized_sequence, indel_rate, indel_rate)[0]
+    time_stage(stages, 'remove_sync_markers', bases, core.remove_sync_markers, shifted_sequence)
+
+    core.build_correction_table()  # Built once per process, so it is kept out of the timing
+    full_codewords = mutated_sequence[:len(mutated_sequence) - len(mutated_sequence) % 7]  # A substituted leftover codeword may have no correction rule
+    time_stage(stages, 'correct_codewords', bases, core.correct_codewords, full_codewords)
+
+    data_without_parity = time_stage(stages, 'remove_hamming_bits', bases, core.remove_hamming_bits, codewords)[0]
+    time_stage(stages, 'huffman_decode', bases, core.huffman_decode, data_without_parity, huffman_codes)
+
+    if kind != 'binary':
+        utf8_sequence_bases = len(encoder.utf8_bin(data)) * 7 // 4  # Length of the sequence without Huffman coding
+        time_stage(stages, 'utf8_bin_decode', utf8_sequence_bases, core.utf8_bin_decode, encoder.utf8_bin(data))
+
+    raw_bytes = raw if kind == 'binary' else raw.encode('utf-8')
+    entropy_coders = bench_entropy_coders(raw_bytes, data, payload, huffman_codes)
+
+    return {
+        'kind': kind,
+        'size_bytes': size,
+        'sequence_bases': bases,
+        'mutations_rate': mutations_rate,
+        'indel_rate': indel_rate,
+        'stages': stages,
+        'entropy_coders': entropy_coders,
+    }
+
+#####################################################################################################
+
+parser = argparse.ArgumentParser(description='DNAcodeX encoder, decoder and simulator throughput benchmark')
+
+parser.add_argument('-k', '--kinds', required=False, type=str, default='text,binary,utf8', metavar='', help='Comma separated kinds of synthetic inputs (text, binary, utf8).')
+parser.add_argument('-s', '--sizes', required=False, type=str, default='1K,10K,100K', metavar='', help='Comma separated input sizes from 1K to 100M.')
+parser.add_argument('-m', '--mutations_rate', required=False, type=float, default=0.0001, metavar='', help='The rate of the substitutions introduced before the correction stage.')
+parser.add_argument('-i', '--indel_rate', required=False, type=float, default=0.0001, metavar='', help='The rate of the insertions and of the deletions introduced before the resynchronization stage.')
+parser.add_argument('-f', '--files', required=False, type=str, default=None, metavar='', help='Comma separated files (e.g. corpora) to benchmark in addition to the synthetic inputs (.txt files as text, others as binary).')
+parser.add_argument('--seed', required=False, type=int, default=0, metavar='', help='The seed of the synthetic inputs and of the substitutions.')
+parser.add_argument('-o', '--output_filename', required=False, type=str, default=None, metavar='', help='The JSON file the results are saved in (default: printed to the standard output).')
+
+
+def main(argv=None):
+    args = parser.parse_args(argv)
+
+    report = {
+        'id': datetime.datetime.now().strftime("%Y%m%d%H%M%S"),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': [],
+    }
+
+    for size in args.sizes.split(','):
+        for kind in args.kinds.split(','):
+            result = bench_input(kind, parse_size(size), args.mutations_rate, args.indel_rate, args.seed)
+            report['results'].append(result)
+            print('> {} {}: {} bases, {}'.format(kind, size, result['sequence_bases'], ', '.join('{} {:.3f}s'.format(stage, value['seconds']) for stage, value in result['stages'].items())), file=sys.stderr)
+
+    for file_name in (args.files.split(',') if args.files else []):
+        if file_name.endswith('.txt'):
+            with open(file_name, 'r', encoding='utf-8', newline='') as f:
+                kind, raw = 'text', f.read()
+        else:
+            with open(file_name, 'rb') as f:
+                kind, raw = 'binary', f.read()
+        result = bench_input(kind, os.path.getsize(file_name), args.mutations_rate, args.indel_rate, args.seed, raw)
+        result['file'] = file_name
+        report['results'].append(result)
+        print('> {}: {} bases, {}'.format(file_name, result['sequence_bases'], ', '.join('{} {:.3f}s'.format(stage, value['seconds']) for stage, value in result['stages'].items())), file=sys.stderr)
+
+    for result in report['results']:
+        coders = result['entropy_coders']
+        print('> {} {}: Huffman {} bases, rANS {} bases ({} saved, decode {:.3f}s vs {:.3f}s)'.format(result.get('file', result['kind']), result['size_bytes'], coders['huffman']['bases'], coders['rans']['bases'], coders['rans']['bases_saved'], coders['huffman']['decode_seconds'], coders.get('rans_numpy', coders['rans'])['decode_seconds']), file=sys.stderr)
+
+    if args.output_filename is None:
+        print(json.dumps(report, indent=2))
+    else:
+        with open(args.output_filename, 'w') as f:
+            json.dump(report, f, indent=2)
+        print("> Benchmark results were saved in the file: \033[1;36m{}\033[0m".format(args.output_filename), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,1238 @@
+"""
+Core functions shared by the DNAcodeX encoder, decoder and mutations simulator (and the dnacodex command).
+Only the standard library modules that every run needs are imported here; the modules that only some runs need
+(multiprocessing, tracemalloc, resource, lzma, bz2) are imported by the functions that use them.
+"""
+import array
+import collections
+import itertools
+import json
+import math
+import os
+import queue
+import sys
+import threading
+import time
+import zlib
+
+CHECKSUM_BLOCK_BITS = 4096  # Number of data bits covered by each CRC32 checksum
+CHECKSUM_TAG = b'DXK\x01'  # Tag in front of checksummed data (format 1: a CRC32 after every block of CHECKSUM_BLOCK_BITS bits)
+CODEBOOK_DIR = 'DNAcodeX_codebooks'  # Default directory of the persistent Huffman codebook cache
+PINNED_CODEBOOK_DIR = 'pinned'  # Subdirectory of the codebook cache with the codebooks referenced by shared sequences (never evicted)
+CODEWORD_TAIL_BASES = (0, 6, 5, 3)  # Sequence lengths modulo 7 produced by the encoder: no leftover codeword, or one of 6, 5 or 3 bases
+SYNC_MARKER = 'ACGTTGCA'  # Synchronization marker, never produced by map_to_dna (two strong bases in a row) and avoided by map_to_dna_constrained
+SYNC_SEGMENT_BASES = 700  # Number of bases (100 codewords) between two synchronization markers
+SYNC_SEARCH_WINDOW = 21  # Largest shift (in bases) of a marker from its expected position
+PIPELINE_QUEUE_SIZE = 8  # Largest number of chunks waiting between two stages of the pipelined mode
+PIPELINE_WRITE_BUFFER = 2 ** 23  # Buffer size (in bytes) of the output file in the pipelined mode
+BASE_BITS = bytes.maketrans(b'ACGTNacgtn', b'1010N1010N')  # 256-byte table: G/A -> 1, C/T -> 0, N kept, other bytes unchanged
+BASE_BITS_MAP = BASE_BITS.decode('latin-1')  # The same table indexed by character, for strings
+BIT_VALUES = bytes.maketrans(b'01', b'\x00\x01')  # Bit characters -> branch of the Huffman decoding tree
+COMPRESSION_MAGIC = b'DXC'  # Tag of a pre-compressed payload, followed by one byte with the ID of the codec
+COMPRESSION_CODECS = {'zlib': 1, 'lzma': 2, 'bz2': 3, 'rans': 4}  # Codec name -> ID recorded in the tag
+RANS_PROB_BITS = 14  # Precision (in bits) of the rANS frequencies
+RANS_LOWER = 1 << 16  # Lower bound of a rANS state, which stays in [2 ** 16, 2 ** 32) between 16-bit words
+RANS_MAX_LANES = 256  # Largest number of interleaved rANS states
+RANS_LANE_SYMBOLS = 1024  # Symbols per interleaved state, so that the 4-byte final states stay a small overhead
+RANS_MAX_ALPHABET = 4096  # Largest number of distinct characters modelled by the rANS character model
+
+#################################### General Functions ####################################
+
+def dna_to_binary(data):
+    """
+    Maps a DNA sequence to bits (G/A -> 1, C/T -> 0) in a single pass over the 256-byte BASE_BITS table. Lowercase
+    bases are mapped like uppercase ones, N (n) is kept as N so that unknown bases stay visible, and any other
+    character is left unchanged.
+
+    Arguments:
+    - data: The DNA sequence as a string, or as bytes, bytearray or memoryview.
+
+    Returns:
+    - The bits as a string for a string sequence, and as bytes otherwise.
+    """
+    if isinstance(data, str):
+        return data.translate(BASE_BITS_MAP)
+
+    return bytes(data).translate(BASE_BITS)  # bytes(data) is data itself for bytes
+
+def utf8_bin_decode(string):
+    decoded_string = ''
+
+    for i in range(0, len(string), 80):
+        chunk = string[i: i + 80]
+        while len(chunk) != 0:
+
+            if chunk.startswith('0'):
+                f = chunk[:8]
+
+            elif chunk.startswith('110'):
+                f = chunk[0:16]
+
+            elif chunk.startswith('1110'):
+                f = chunk[0:24]
+
+            elif chunk.startswith('11110'):
+                f = chunk[0:32]
+                
+            else:
+                break
+            try:
+                chunk = chunk.removeprefix(f)
+                bit = int(f, 2)
+                bit = bit.to_bytes((bit.bit_length() + 7) // 8, 'big').decode('utf-8')
+                decoded_string += bit
+            except:
+                pass
+        
+    return decoded_string
+
+def binary_to_image_bytes(binary_data):
+    image_bytes = bytes([int(binary_data[i:i+8], 2) for i in range(0, len(binary_data), 8)])  # Built at once, not by repeated concatenation
+
+    return image_bytes
+
+def open_csv_report(file_name, header):
+    """
+    Opens a CSV report for appending, and writes its header if the file does not exist yet.
+    A report written by an older version with fewer columns is migrated first: its header is replaced and the
+    missing columns of its rows are filled with NA. A report with any other header is kept under a new name
+    (with the time of its last change) and a new report is started, so the appended rows always match the header.
+
+    Arguments:
+    - file_name: The name of the CSV file.
+    - header: The header of the report, without the newline.
+
+    Returns:
+    - The report file opened for appending.
+    """
+    if os.path.exists(file_name):
+        with open(file_name, 'r', encoding='utf-8') as f:
+            old_header = f.readline().rstrip('\r\n')
+
+        if old_header != header:
+            old_columns = old_header.split(',')
+            columns = header.split(',')
+
+            if old_header and old_columns == columns[:len(old_columns)]:
+                padding = ',NA' * (len(columns) - len(old_columns))
+                with open(file_name, 'r', encoding='utf-8') as old_file, open(file_name + '.tmp', 'w', encoding='utf-8') as new_file:
+                    old_file.readline()
+                    new_file.write(header + '\n')
+                    for line in old_file:
+                        line = line.rstrip('\r\n')
+                        if line:
+                            new_file.write(line + padding + '\n')
+                os.replace(file_name + '.tmp', file_name)
+                print("> The columns of \033[1;36m{}\033[0m were updated, missing values were filled with NA".format(file_name))
+            else:
+                root, extension = os.path.splitext(file_name)
+                old_name = '{}_{}{}'.format(root, time.strftime('%Y%m%d%H%M%S', time.localtime(os.path.getmtime(file_name))), extension)
+                os.replace(file_name, old_name)
+                print("> \033[1;33m{}\033[0m had different columns, it was kept as \033[1;36m{}\033[0m and a new file was started".format(file_name, old_name))
+
+    if not os.path.exists(file_name):
+        with open(file_name, 'w', encoding='utf-8') as f:
+            f.write(header + '\n')
+
+    return open(file_name, 'a', encoding='utf-8')
+
+#################################### Huffman Decoding Functions ####################################
+
+def decode_header(header):
+    """
+    Decodes the header using a specific decoding scheme.
+
+    Arguments:
+    - header: The encoded header string.
+
+    Returns:
+    - The decoded header as an integer. A ValueError is raised if the header is not a number (e.g. after mutations).
+    """
+    integers = ''
+    n = 8  # Number of bits in each segment
+    x = [header[i:i+n] for i in range(0, len(header), n)]  # Split the header into segments of n bits
+    for bit in x:
+        bit = int(bit, 2)  # Convert the binary segment to an integer
+        bit = bit.to_bytes((bit.bit_length() + 7) // 8, 'big').decode()  # Convert the integer to its corresponding ASCII character
+        integers += bit  # Concatenate the ASCII characters to form the decoded header string
+    integers = int(integers)  # Convert the decoded header string to an integer
+
+    return integers
+
+CODEBOOKS = {}  # Codebook path -> Huffman codes loaded by this process (a saved codebook never changes)
+
+def codebook_path(codebook_id, codebook_dir=CODEBOOK_DIR, pinned=False):
+    """
+    Returns the path of a codebook in the codebook cache, or in its subdirectory of pinned codebooks.
+    """
+    if pinned == True:
+        codebook_dir = os.path.join(codebook_dir, PINNED_CODEBOOK_DIR)
+
+    return os.path.join(codebook_dir, codebook_id + '.json')
+
+def load_codebook(codebook_id, codebook_dir=CODEBOOK_DIR):
+    """
+    Loads a codebook by its ID from the pinned codebooks (those referenced by shared sequences), or else from the
+    codebook cache, where it is marked as recently used. Codebooks already loaded by this process are kept in
+    memory, so long-running processes (such as the service) read each file only once.
+
+    Arguments:
+    - codebook_id: The ID of the codebook.
+    - codebook_dir: The directory of the codebook cache (default: CODEBOOK_DIR).
+
+    Returns:
+    - The Huffman codes as a dictionary. A LookupError is raised if the codebook is neither pinned nor in the cache.
+    """
+    for pinned in (True, False):
+        path = codebook_path(codebook_id, codebook_dir, pinned)
+        if path not in CODEBOOKS:
+            if not os.path.exists(path):
+                continue
+            with open(path, 'r', encoding='utf-8') as f:
+                CODEBOOKS[path] = json.load(f)
+        if pinned == False and os.path.exists(path):
+            os.utime(path)  # The modification time records the last use for the LRU eviction
+
+        return CODEBOOKS[path]
+
+    raise LookupError("The codebook {} was not found in the codebook cache: {}".format(codebook_id, codebook_dir))
+
+def construct_huffman_dict(instructions_string):
+    """
+    Constructs a Huffman dictionary from the encoded instructions string.
+
+    Arguments:
+    - instructions_string: The encoded instructions string.
+
+    Returns:
+    - The Huffman dictionary containing the codes.
+    """
+    codes = []
+    codes_list = []
+    huffman_instructions_dict = {}
+
+    if instructions_string.find(',,') != -1:  # Check if multiple sets of codes are present
+        codes_list = instructions_string.split(',,')  # Split the instructions into separate code sets
+        codes_list1 = codes_list[0].split(',')  # Split the first set of codes
+        for code in codes_list1:
+            codes.append(code)
+
+        codes_list2 = codes_list[1].split(',')  # Split the second set of codes
+        codes_list2[0] = ',' + codes_list2[0]
+        for code in codes_list2:
+            codes.append(code)
+    else:
+        codes = instructions_string[1:].split(',')  # Split the codes if only one set is present
+
+    for code in codes:
+        if len(code) != 0:
+            huffman_instructions_dict[code[0]] = code[1:]  # Create key-value pairs in the dictionary with character as the key and code as the value
+
+    return huffman_instructions_dict
+
+def build_decoding_tree(huffman_codes):
+    """
+    Builds the Huffman decoding tree as a flat array of child offsets. The children of the node at offset n are
+    children[n] (bit 0) and children[n + 1] (bit 1), the root is at offset 0, a leaf is stored as ~i where i is
+    the index of its symbol in symbols, and missing branches lead to a dead node at offset 2 that never emits a
+    symbol again. As when the codes are matched one bit at a time, the shortest matching code wins, the last
+    symbol wins for duplicate codes, and codes that are empty or not made of bits are never matched.
+
+    Arguments:
+    - huffman_codes: The Huffman codes used for decoding.
+
+    Returns:
+    - The children list and the symbols list as a tuple.
+    """
+    inverse_codes = {value: key for key, value in huffman_codes.items() if value != '' and set(value) <= {'0', '1'}}
+    children = [2, 2, 2, 2]  # Root and dead node, every missing branch leads to the dead node
+    symbols = []
+
+    for code in sorted(inverse_codes, key=len):  # Shorter codes first, so that a code is never added below a leaf
+        node = 0
+        for bit in code[:-1]:
+            child = children[node + int(bit)]
+            if child < 0:
+                break  # A shorter code is a prefix of this one, so it can never be matched
+            if child == 2:
+                child = len(children)
+                children[node + int(bit)] = child
+                children.extend([2, 2])
+            node = child
+        else:
+            children[node + int(code[-1])] = ~len(symbols)
+            symbols.append(inverse_codes[code])
+
+    return children, symbols
+
+def huffman_decode(encoded_data, huffman_codes):
+    """
+    Decodes the encoded data using Huffman decoding.
+
+    Arguments:
+    - encoded_data: The encoded data to be decoded.
+    - huffman_codes: The Huffman codes used for decoding.
+
+    Returns:
+    - The decoded data as a string.
+    """
+    children, symbols = build_decoding_tree(huffman_codes)  # Flat array of child offsets instead of a dictionary of code strings
+    node = 0  # Offset of the current node, starting from the root
+    decoded_data = []  # The decoded symbols
+
+    for bit in encoded_data.encode('ascii').translate(BIT_VALUES):
+        node = children[node + bit]
+        if node < 0:
+            decoded_data.append(symbols[~node])  # A leaf was reached, so its symbol is decoded
+            node = 0  # Go back to the root
+
+    return ''.join(decoded_data)
+
+#################################### rANS Entropy Coding Functions ####################################
+
+def encode_varint(value):
+    """
+    Encodes a non-negative integer in 7-bit groups (LEB128), so that small numbers take a single byte.
+    """
+    encoded = bytearray()
+    while value >= 0x80:
+        encoded.append(value & 0x7F | 0x80)
+        value >>= 7
+    encoded.append(value)
+
+    return bytes(encoded)
+
+def decode_varint(data, position):
+    """
+    Decodes an integer written by encode_varint.
+
+    Arguments:
+    - data: The bytes that hold the integer.
+    - position: The position of its first byte.
+
+    Returns:
+    - The integer and the position of the byte after it as a tuple.
+    """
+    value = 0
+    shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7F) << shift
+        shift += 7
+        if byte < 0x80:
+            return value, position
+
+def rans_symbols(data, numpy=None):
+    """
+    Chooses the symbols modelled by the rANS coder. Like huffman_encode, UTF-8 text with multi-byte characters is
+    modelled by characters, as the bytes of a character depend on each other; any other data is modelled by bytes.
+    The model with the smaller estimated size (order-0 entropy and frequency table) is chosen.
+
+    Arguments:
+    - data: The bytes to model.
+    - numpy: The NumPy module, or None to build the symbols in pure Python (default: None).
+
+    Returns:
+    - The symbol indices, the count of each symbol and the alphabet (a string of characters, or None for the
+      byte model) as a tuple.
+    """
+    data = bytes(data)
+    length = len(data)
+    counts = [data.count(symbol) for symbol in range(256)]  # 256 passes of bytes.count run in C
+    cost = sum([count * math.log2(length / count) + 16 for count in counts if count != 0]) + 256
+
+    try:
+        text = data.decode('utf-8')
+    except UnicodeDecodeError:
+        text = None
+    if text is not None and len(text) != length:  # Multi-byte characters
+        character_counts = collections.Counter(text)
+        alphabet = ''.join(sorted(character_counts))
+        character_cost = sum([count * math.log2(len(text) / count) + 16 for count in character_counts.values()]) + len(alphabet.encode('utf-8')) * 8
+        if len(alphabet) <= RANS_MAX_ALPHABET and character_cost < cost:
+            if numpy is None:
+                index = {character: i for i, character in enumerate(alphabet)}
+                symbols = [index[character] for character in text]
+            else:
+                code_points = numpy.frombuffer(text.encode('utf-32-le'), dtype='<u4')
+                symbols = numpy.searchsorted(numpy.array([ord(character) for character in alphabet], dtype=numpy.uint32), code_points)
+            return symbols, [character_counts[character] for character in alphabet], alphabet
+
+    symbols = data if numpy is None else numpy.frombuffer(data, dtype=numpy.uint8)
+
+    return symbols, counts, None
+
+def rans_frequencies(counts, prob_bits=RANS_PROB_BITS):
+    """
+    Scales the counts of the symbols to frequencies that sum to 2 ** prob_bits. Every symbol that occurs keeps a
+    frequency of at least 1, so that it can still be coded.
+
+    Arguments:
+    - counts: The number of occurrences of each symbol.
+    - prob_bits: The precision of the frequencies in bits (default: RANS_PROB_BITS).
+
+    Returns:
+    - The list of the frequencies.
+    """
+    total = sum(counts)
+    scale = 1 << prob_bits
+    frequencies = [max(1, count * scale // total) if count != 0 else 0 for count in counts]
+
+    present = sorted([symbol for symbol in range(len(counts)) if counts[symbol] != 0], key=lambda symbol: -counts[symbol])
+    difference = scale - sum(frequencies)
+    if difference > 0 and len(present) != 0:
+        frequencies[present[0]] += difference  # The rounding loss goes to the most frequent symbol
+    i = 0
+    while difference < 0:
+        symbol = present[i % len(present)]  # Rare symbols rounded up to 1 are paid for by the frequent ones
+        if frequencies[symbol] > 1:
+            frequencies[symbol] -= 1
+            difference += 1
+        i += 1
+
+    return frequencies
+
+def rans_encode(data, lanes=None, numpy=None):
+    """
+    Compresses bytes with a static order-0 rANS (range asymmetric numeral systems) coder. Unlike Huffman coding,
+    which spends a whole number of bits on every symbol, rANS codes each symbol in -log2(frequency) bits on
+    average, which matters for skewed distributions. The symbols (see rans_symbols) are distributed round-robin
+    over several interleaved coder states that share a single stream of 16-bit words, so the decoder can advance
+    all of the states of a round at once with NumPy. The encoder works backwards, as rANS is last in, first out.
+
+    Arguments:
+    - data: The bytes to compress.
+    - lanes: The number of interleaved states, or None to choose it from the length of the data (default: None).
+    - numpy: The NumPy module, or None to encode in pure Python (default: None).
+
+    Returns:
+    - The compressed bytes: the number of symbols, the number of states, a CRC32 of the data, the model and its
+      frequency table, the final states and the words.
+    """
+    symbols, counts, alphabet = rans_symbols(data, numpy)
+    length = len(symbols)
+    if lanes is None:
+        lanes = max(1, min(RANS_MAX_LANES, length // RANS_LANE_SYMBOLS))
+    frequencies = rans_frequencies(counts)
+    starts = [0] * len(frequencies)
+    for symbol in range(1, len(frequencies)):
+        starts[symbol] = starts[symbol - 1] + frequencies[symbol - 1]
+    limits = [((RANS_LOWER >> RANS_PROB_BITS) << 16) * frequency for frequency in frequencies]  # States at or above the limit emit a word first
+
+    if numpy is None:
+        states = [RANS_LOWER] * lanes
+        words = []
+        for i in range(length - 1, -1, -1):
+            lane = i % lanes
+            symbol = symbols[i]
+            state = states[lane]
+            if state >= limits[symbol]:
+                words.append(state & 0xFFFF)
+                state >>= 16
+            frequency = frequencies[symbol]
+            states[lane] = ((state // frequency) << RANS_PROB_BITS) + state % frequency + starts[symbol]
+        words.reverse()
+        words = array.array('H', words)
+        if sys.byteorder == 'little':
+            words.byteswap()
+        words = words.tobytes()
+    else:
+        frequencies_table = numpy.array(frequencies, dtype=numpy.int64)
+        starts_table = numpy.array(starts, dtype=numpy.int64)
+        limits_table = numpy.array(limits, dtype=numpy.int64)
+        states = numpy.full(lanes, RANS_LOWER, dtype=numpy.int64)
+        emitted = []
+        for start in range((length - 1) // lanes * lanes, -1, -lanes):  # One round of states at a time, last round first
+            round_symbols = symbols[start:start + lanes]
+            state = states[:len(round_symbols)]
+            need = state >= limits_table[round_symbols]
+            emitted.append((state[need] & 0xFFFF)[::-1])  # Lanes in reverse order, as in the pure Python loop
+            state[need] >>= 16
+            frequency = frequencies_table[round_symbols]
+            state[:] = ((state // frequency) << RANS_PROB_BITS) + state % frequency + starts_table[round_symbols]
+        words = numpy.concatenate(emitted)[::-1].astype('>u2').tobytes() if emitted else b''
+        states = [int(state) for state in states]
+
+    header = bytearray(encode_varint(length) + encode_varint(lanes))
+    header += zlib.crc32(data).to_bytes(4, 'big')
+    if alphabet is None:
+        header.append(0)  # Byte model, followed by a bitmap of the bytes that occur
+        header += sum([1 << symbol for symbol in range(256) if frequencies[symbol] != 0]).to_bytes(32, 'big')
+    else:
+        header.append(1)  # Character model, followed by the UTF-8 encoded alphabet
+        header += encode_varint(len(alphabet.encode('utf-8'))) + alphabet.encode('utf-8')
+    for frequency in frequencies:
+        if frequency != 0:
+            header += encode_varint(frequency)
+    for state in states:
+        header += state.to_bytes(4, 'big')
+
+    return bytes(header) + words
+
+def rans_decode(data, numpy=None):
+    """
+    Decompresses bytes written by rans_encode. A slot table maps every one of the 2 ** RANS_PROB_BITS slots of a
+    state to its symbol, so each step is a table lookup, a multiplication and at most one 16-bit read.
+
+    Arguments:
+    - data: The compressed bytes.
+    - numpy: The NumPy module, or None to decode in pure Python (default: None).
+
+    Returns:
+    - The decompressed bytes.
+
+    Raises:
+    - ValueError: If the compressed bytes are damaged.
+    """
+    try:
+        length, position = decode_varint(data, 0)
+        lanes, position = decode_varint(data, position)
+        if lanes == 0 or lanes > RANS_MAX_LANES:
+            raise ValueError("The rANS header is damaged.")
+        checksum = int.from_bytes(data[position:position + 4], 'big')
+        model = data[position + 4]
+        position += 5
+        if model == 0:
+            bitmap = int.from_bytes(data[position:position + 32], 'big')
+            position += 32
+            alphabet = None
+            present = [bitmap >> symbol & 1 for symbol in range(256)]
+        elif model == 1:
+            alphabet_length, position = decode_varint(data, position)
+            alphabet = bytes(data[position:position + alphabet_length]).decode('utf-8')
+            position += alphabet_length
+            present = [1] * len(alphabet)
+        else:
+            raise ValueError("The rANS model is damaged.")
+        frequencies = [0] * len(present)
+        for symbol in range(len(present)):
+            if present[symbol]:
+                frequencies[symbol], position = decode_varint(data, position)
+        states = [int.from_bytes(data[position + 4 * lane:position + 4 * lane + 4], 'big') for lane in range(lanes)]
+        position += 4 * lanes
+    except (IndexError, UnicodeDecodeError):
+        raise ValueError("The rANS header is damaged.")
+    if length != 0 and sum(frequencies) != 1 << RANS_PROB_BITS:
+        raise ValueError("The rANS frequency table is damaged.")
+
+    slot_symbols = []
+    starts = [0] * len(frequencies)
+    for symbol in range(len(frequencies)):
+        starts[symbol] = len(slot_symbols)
+        slot_symbols += [symbol] * frequencies[symbol]
+    mask = (1 << RANS_PROB_BITS) - 1
+    words = data[position:]
+    words_count = len(words) // 2
+
+    if numpy is None:
+        words = array.array('H', words[:2 * words_count])
+        if sys.byteorder == 'little':
+            words.byteswap()
+        decoded = bytearray(length) if alphabet is None else [0] * length
+        read = 0
+        try:
+            for i in range(length):
+                lane = i % lanes
+                state = states[lane]
+                slot = state & mask
+                symbol = slot_symbols[slot]
+                state = frequencies[symbol] * (state >> RANS_PROB_BITS) + slot - starts[symbol]
+                if state < RANS_LOWER:
+                    state = (state << 16) | words[read]
+                    read += 1
+                states[lane] = state
+                decoded[i] = symbol
+        except IndexError:
+            raise ValueError("The rANS stream is truncated.")
+        if alphabet is not None:
+            decoded = ''.join([alphabet[symbol] for symbol in decoded]).encode('utf-8')
+    else:
+        slot_table = numpy.array(slot_symbols, dtype=numpy.uint8 if alphabet is None else numpy.uint16)
+        frequencies_table = numpy.array(frequencies, dtype=numpy.int64)
+        starts_table = numpy.array(starts, dtype=numpy.int64)
+        words_table = numpy.frombuffer(words[:2 * words_count], dtype='>u2').astype(numpy.int64)
+        states_table = numpy.array(states, dtype=numpy.int64)
+        decoded = numpy.empty(length, dtype=slot_table.dtype)
+        read = 0
+        for start in range(0, length, lanes):  # All of the states of a round are advanced at once
+            state = states_table[:min(lanes, length - start)]
+            slot = state & mask
+            symbol = slot_table[slot]
+            state[:] = frequencies_table[symbol] * (state >> RANS_PROB_BITS) + slot - starts_table[symbol]
+            need = state < RANS_LOWER
+            count = int(numpy.count_nonzero(need))
+            if count != 0:
+                if read + count > words_count:
+                    raise ValueError("The rANS stream is truncated.")
+                state[need] = (state[need] << 16) | words_table[read:read + count]  # The lanes read in ascending order
+                read += count
+            decoded[start:start + len(state)] = symbol
+        states = [int(state) for state in states_table]
+        if alphabet is None:
+            decoded = decoded.tobytes()
+        else:
+            decoded = numpy.array([ord(character) for character in alphabet], dtype='<u4')[decoded].tobytes().decode('utf-32-le').encode('utf-8')
+
+    if read != words_count or any([state != RANS_LOWER for state in states]) or zlib.crc32(decoded) != checksum:
+        raise ValueError("The rANS stream is damaged.")
+
+    return bytes(decoded)
+
+#################################### Hamming Error Correction Functions ####################################
+
+def bit_switch(bit):
+    if bit == 1:
+        return 0
+    elif bit == 0:
+        return 1
+
+class UncorrectableCodeword(ValueError):
+    """
+    Raised by hamming_correct for a codeword whose length or parity combination has no correction rule.
+    """
+
+def hamming_correct(string):
+    bits = [int(i) for i in string]
+
+    if len(bits) == 7:
+        parity_indices = [(0, 1, 3), (0, 2, 3), (1, 2, 3)]
+        parities = [bits[i] ^ bits[j] ^ bits[k] for i, j, k in parity_indices]
+        
+        p1 = parities[0] == bits[4]
+        p2 = parities[1] == bits[5]
+        p3 = parities[2] == bits[6]
+
+        error = False
+
+        if p1 == False and p2 == False and p3 == True:
+            bits[0] = bit_switch(bits[0])
+            error = True
+
+        elif p1 == False and p2 == True and p3 == False:
+            bits[1] = bit_switch(bits[1])
+            error = True
+
+        elif p1 == True and p2 == False and p3 == False:
+            bits[2] = bit_switch(bits[2])
+            error = True 
+
+        elif p1 == False and p2 == False and p3 == False:
+            bits[3] = bit_switch(bits[3])
+            error = True
+
+        elif p1 == False and p2 == True and p3 == True:
+            bits[4] = bit_switch(bits[4])
+            error = True
+
+        elif p1 == True and p2 == False and p3 == True:
+            bits[5] = bit_switch(bits[5])
+
+        elif p1 == True and p2 == True and p3 == False:
+            bits[6] = bit_switch(bits[6])
+            error = True
+
+        elif p1 == True and p2 == True and p3 == True:
+            error = False
+            pass
+    
+    elif len(bits) == 6:
+        parity_indices = [(0, 1), (1, 2), (0, 2)]
+        parities = [bits[i] ^ bits[j] for i, j in parity_indices]
+
+        p1 = parities[0] == bits[3]
+        p2 = parities[1] == bits[4]
+        p3 = parities[2] == bits[5]
+
+        if p1 == False and p2 == True and p3 == False:
+            bits[0] = bit_switch(bits[0])
+            error = True
+
+        elif p1 == False and p2 == False and p3 == True:
+            bits[1] = bit_switch(bits[1])
+            error = True
+
+        elif p1 == False and p2 == False and p3 == True:
+            bits[2] = bit_switch(bits[2])
+            error = True 
+
+        elif p1 == False and p2 == True and p3 == True:
+            bits[3] = bit_switch(bits[3])
+            error = True
+
+        elif p1 == True and p2 == False and p3 == True:
+            bits[4] = bit_switch(bits[4])
+            error = True
+
+        elif p1 == True and p2 == True and p3 == False:
+            bits[5] = bit_switch(bits[5])
+            error = True
+
+        elif p1 == True and p2 == True and p3 == True:
+            error = False
+            pass
+
+        else:
+            raise UncorrectableCodeword("No correction rule for the codeword {}".format(string))
+
+    elif len(bits) == 5:
+        x1 = bit_switch(bits[0])
+        x2 = bit_switch(bits[1])
+        x3 = bits[0] ^ bits[1]
+
+        p1 = x1 == bits[2]
+        p2 = x2 == bits[3]
+        p3 = x3 == bits[4]
+
+        if p1 == False and p2 == True and p3 == False:
+            bits[0] = bit_switch(bits[0])
+            error = True
+
+        elif p1 == True and p2 == False and p3 == False:
+            bits[1] = bit_switch(bits[1])
+            error = True
+
+        elif p1 == False and p2 == True and p3 == True:
+            bits[2] = bit_switch(bits[2])
+            error = True 
+
+        elif p1 == True and p2 == False and p3 == True:
+            bits[3] = bit_switch(bits[3])
+            error = True
+
+        elif p1 == True and p2 == True and p3 == False:
+            bits[4] = bit_switch(bits[4])
+            error = True
+
+        elif p1 == True and p2 == True and p3 == True:
+            error = False
+            pass
+
+        else:
+            raise UncorrectableCodeword("No correction rule for the codeword {}".format(string))
+
+    elif len(bits) == 3:
+        if bits[0] != max(set(bits), key = bits.count):
+            bits[0] = max(set(bits), key = bits.count)
+            error = True
+        else:
+            error = False
+            pass
+
+    else:
+        raise UncorrectableCodeword("No correction rule for codewords of {} bits".format(len(bits)))
+
+    corrected_string = ''.join([str(i) for i in bits])
+    
+    return corrected_string, error
+
+CORRECTION_TABLE = {}  # DNA codeword -> (data bits, corrected codeword, codeword in binary, error), filled on first use
+
+def build_correction_table():
+    """
+    Builds the lookup table of the fused correction kernel. Every possible DNA codeword of 7, 6, 5 and 3 bases is
+    corrected once with hamming_correct, so the table reproduces its results exactly. Codewords that hamming_correct
+    cannot handle are left out of the table.
+
+    Returns:
+    - The lookup table as a dictionary.
+    """
+    if len(CORRECTION_TABLE) == 0:
+        data_lengths = {7: 4, 6: 3, 5: 2, 3: 1}
+        for length, data_length in data_lengths.items():
+            for bases in itertools.product('ACGT', repeat=length):
+                codeword_dna = ''.join(bases)
+                codeword_binary = dna_to_binary(codeword_dna)
+                try:
+                    corrected_codeword_binary, error = hamming_correct(codeword_binary)
+                except UncorrectableCodeword:
+                    continue  # Parity combination without a correction rule
+                CORRECTION_TABLE[codeword_dna] = (corrected_codeword_binary[:data_length], corrected_codeword_binary, codeword_binary, error)
+
+    return CORRECTION_TABLE
+
+def correct_erasures(codeword_dna, table):
+    """
+    Corrects a codeword that contains erased bases (N). Every way of filling the erasures is looked up in the
+    correction table and a filling that is already a valid codeword is preferred, so up to two erasures are
+    recovered exactly (the minimum distance of the code is 3). Otherwise the first filling with a single bit
+    correction is used, and if no filling can be corrected the erasures are read as 0.
+
+    Arguments:
+    - codeword_dna: The DNA codeword with erasures.
+    - table: The correction table.
+
+    Returns:
+    - The data bits, the corrected codeword, the codeword in binary (with N at the erasures) and whether a bit was corrected as a tuple.
+    """
+    erasures = [i for i, base in enumerate(codeword_dna) if base == 'N']
+    fallback = None
+    for bits in itertools.product('GC', repeat=len(erasures)):  # G -> 1, C -> 0
+        filled = list(codeword_dna)
+        for i, base in zip(erasures, bits):
+            filled[i] = base
+        entry = table.get(''.join(filled))
+        if entry is None:
+            continue
+        if entry[1] == entry[2]:  # Already a valid codeword (the error flag of hamming_correct misses some corrections)
+            return entry[0], entry[1], dna_to_binary(codeword_dna), False
+        if fallback is None:
+            fallback = entry
+
+    if fallback is not None:
+        return fallback[0], fallback[1], dna_to_binary(codeword_dna), True
+
+    codeword_binary = dna_to_binary(codeword_dna.replace('N', 'C'))
+    return remove_hamming_bits(codeword_binary)[0], codeword_binary, dna_to_binary(codeword_dna), False
+
+def check_codeword_layout(length, offset=0):
+    """
+    Checks that a sequence splits into the codewords the encoder produces: codewords of 7 bases, followed by at
+    most one leftover codeword of 6, 5 or 3 bases. Other lengths (e.g. after a lost base) would leave a trailing
+    codeword that hamming_correct cannot decode, so they are rejected before the correction starts.
+
+    Arguments:
+    - length: The length of the sequence (without synchronization markers).
+    - offset: The position of the sequence in the full sequence, used in the error message (default: 0).
+
+    Returns:
+    - None, or raises ValueError if the length of the trailing codeword is not one of CODEWORD_TAIL_BASES.
+    """
+    if length % 7 not in CODEWORD_TAIL_BASES:
+        raise ValueError("The sequence has {} bases, which leaves a trailing codeword of {} bases at position {} (the encoder only produces trailing codewords of 6, 5 or 3 bases).".format(offset + length, length % 7, offset + length - length % 7))
+
+def correct_codewords(string, offset=0):
+    """
+    Corrects the DNA sequence and removes the Hamming parity bits in a single pass. Each codeword of 7 bases is
+    looked up in the correction table, which maps it directly to its corrected data bits, instead of mapping the
+    codeword to binary, correcting it and removing the parity bits in separate passes over the full sequence.
+    A codeword without erasures that is not in the table has no correction rule, and UncorrectableCodeword is
+    raised with its position.
+
+    Arguments:
+    - string: The DNA sequence (or a chunk of it starting at a codeword boundary).
+    - offset: The position of the chunk in the full sequence, used in the report of the corrected sequences (default: 0).
+
+    Returns:
+    - The corrected data bits, the number of corrected errors, the number of removed parity bits, the report lines of the corrected sequences and the number of codewords with erasures as a tuple.
+    """
+    table = build_correction_table()
+    data_bits = []
+    errors_count = 0
+    parity_count = 0
+    corrected_sequences = []
+    erasures_count = 0
+
+    for i in range(0, len(string), 7):
+        codeword_dna = string[i:i+7]
+        entry = table.get(codeword_dna)
+        if entry is None and 'N' in codeword_dna:
+            entry = correct_erasures(codeword_dna, table)  # Erased bases are decoded as known unknowns
+            erasures_count += 1
+        elif entry is None:
+            codeword_binary = dna_to_binary(codeword_dna)
+            try:
+                corrected_codeword_binary, error = hamming_correct(codeword_binary)
+            except UncorrectableCodeword:
+                raise UncorrectableCodeword("The codeword {} ({} bases) at position {} has no correction rule.".format(codeword_dna, len(codeword_dna), offset + i)) from None
+            entry = (remove_hamming_bits(corrected_codeword_binary)[0], corrected_codeword_binary, codeword_binary, error)
+
+        data, corrected_codeword_binary, codeword_binary, error = entry
+        data_bits.append(data)
+        parity_count += len(codeword_dna) - len(data)
+
+        if error == True:
+            errors_count += 1
+            corrected_sequences.append(codeword_dna + ',' + corrected_codeword_binary + ',' + codeword_binary + ',' + '{}:{}\n'.format(offset + i, offset + i + (len(codeword_binary))))
+
+    return ''.join(data_bits), errors_count, parity_count, corrected_sequences, erasures_count
+
+def remove_hamming_bits(data):
+
+    data_without_parity = ''
+    parity_count = 0
+
+    for i in range(0, len(data), 7):
+        binary_string = data[i:i+7]
+        length = len(binary_string)
+
+        if length == 7:
+            data_without_parity += data[i:i+4]
+            parity_count += 3
+        elif length == 6:
+            data_without_parity += data[i:i+3]
+            parity_count += 3
+        elif length == 5:
+            data_without_parity += data[i:i+2]
+            parity_count += 3
+        elif length == 3:
+            data_without_parity += data[i:i+1]
+            parity_count += 2
+            
+
+    return data_without_parity, parity_count
+
+#################################### Synchronization Functions ####################################
+
+def remove_sync_markers(data, segment_bases=SYNC_SEGMENT_BASES, marker=SYNC_MARKER, window=SYNC_SEARCH_WINDOW):
+    """
+    Removes the synchronization markers that the encoder inserted between segments of segment_bases bases, and
+    restores the length of the segments that were shifted by insertions or deletions. Each marker is searched for
+    within window bases of its expected position, so an indel only damages the segment it occurred in instead of
+    desynchronizing every later codeword. If a marker is not found (e.g. it was itself mutated), it is assumed to
+    be at its expected position.
+
+    Arguments:
+    - data: The DNA sequence with synchronization markers.
+    - segment_bases: The number of bases between two markers, a multiple of 7 (default: SYNC_SEGMENT_BASES).
+    - marker: The synchronization marker (default: SYNC_MARKER).
+    - window: The largest shift of a marker from its expected position (default: SYNC_SEARCH_WINDOW).
+
+    Returns:
+    - The DNA sequence without markers, the number of resynchronized segments and the number of segments as a tuple.
+    """
+    segments = []
+    resynchronized = 0
+    position = 0
+
+    while position < len(data):
+        expected = position + segment_bases
+        start = max(position, expected - window)
+        candidates = []
+        found = data.find(marker, start, expected + window + len(marker))
+        while found != -1:
+            candidates.append(found)
+            found = data.find(marker, found + 1, expected + window + len(marker))
+
+        if len(candidates) != 0:
+            end = min(candidates, key=lambda candidate: abs(candidate - expected))  # Closest marker to the expected position
+            next_position = end + len(marker)
+        elif len(data) - position <= segment_bases + window:
+            segment = data[position:]  # Last segment, which is not followed by a marker
+            valid_length = len(segment) - {1: 1, 2: 2, 4: 1}.get(len(segment) % 7, 0)  # Leftover codewords have 3, 5 or 6 bases
+            if valid_length != len(segment):
+                resynchronized += 1
+            segments.append(segment[:valid_length])
+            break
+        else:
+            end = expected  # The marker was mutated, assume it is in its expected position
+            next_position = end + len(marker)
+
+        segment = data[position:end]
+        if len(segment) != segment_bases:
+            resynchronized += 1
+            segment = segment[:segment_bases] + 'C' * (segment_bases - len(segment))  # Restore the length of the segment
+        segments.append(segment)
+        position = next_position
+
+    return ''.join(segments), resynchronized, len(segments)
+
+#################################### Block Checksum Functions ####################################
+
+def verify_block_checksums(data, block_bits=CHECKSUM_BLOCK_BITS):
+    """
+    Verifies the CRC32 checksum that was embedded after each block by the encoder and removes it.
+
+    Arguments:
+    - data: The binary string after the removal of the Hamming parity bits.
+    - block_bits: The number of data bits in each block (default: CHECKSUM_BLOCK_BITS).
+
+    Returns:
+    - The data without checksums, the list of the indices of the failed blocks and the number of blocks as a tuple.
+    """
+    blocks = []
+    failed_blocks = []
+    step = block_bits + 32
+
+    for i in range(0, len(data), step):
+        segment = data[i:i+step]
+        block, checksum = segment[:-32], segment[-32:]
+        if f'{zlib.crc32(block.encode("ascii")):032b}' != checksum:
+            failed_blocks.append(i // step)  # The block was corrupted beyond what Hamming can correct
+        blocks.append(block)
+
+    return ''.join(blocks), failed_blocks, len(blocks)
+
+def checksum_tag():
+    """
+    Returns the tag that the encoder places in front of checksummed data, as a binary string of 32 bits.
+    """
+    return ''.join([f'{byte:08b}' for byte in CHECKSUM_TAG])
+
+def split_checksum_tag(data, checksum=False):
+    """
+    Detects the tag of checksummed data, like compression_codec does for a pre-compressed payload, and removes it.
+    Sequences encoded before checksummed data was tagged carry no tag, so their checksums are only verified if checksum is True.
+
+    Arguments:
+    - data: The binary string after the removal of the Hamming parity bits.
+    - checksum: Whether untagged data holds block checksums (default: False).
+
+    Returns:
+    - The data without the tag and whether it holds block checksums as a tuple.
+    """
+    tag_bits = len(CHECKSUM_TAG) * 8
+    if data[:tag_bits] == checksum_tag():
+        return data[tag_bits:], True
+
+    return data, checksum
+
+#################################### Pre-compression Functions ####################################
+
+def compress_payload(data, codec):
+    """
+    Compresses the raw bytes of a file with a standard library codec (or the rANS coder) and prepends the tag that records the codec,
+    so that the decoder can undo the compression without being told which codec was used. Every codec keeps its
+    own integrity check (Adler-32, CRC32 in the xz container, the bzip2 block CRCs and the CRC32 in the rANS header).
+
+    Arguments:
+    - data: The bytes to compress.
+    - codec: The name of the codec ('zlib', 'lzma', 'bz2' or 'rans').
+
+    Returns:
+    - The tag followed by the compressed bytes.
+    """
+    if codec == 'zlib':
+        compressed = zlib.compress(data, 9)
+    elif codec == 'lzma':
+        import lzma
+
+        compressed = lzma.compress(data, format=lzma.FORMAT_XZ, check=lzma.CHECK_CRC32)
+    elif codec == 'bz2':
+        import bz2
+
+        compressed = bz2.compress(data, 9)
+    elif codec == 'rans':
+        try:
+            import numpy
+        except ImportError:
+            numpy = None
+        compressed = rans_encode(data, numpy=numpy)
+    else:
+        raise ValueError("Unknown compression codec: {}".format(codec))
+
+    return COMPRESSION_MAGIC + bytes([COMPRESSION_CODECS[codec]]) + compressed
+
+def compression_codec(data):
+    """
+    Returns the name of the codec recorded in the tag at the start of the data, or None if the data is not tagged.
+
+    Arguments:
+    - data: The first bytes of the payload, or its bits as a binary string.
+    """
+    if isinstance(data, str):
+        data = binary_to_image_bytes(data[:(len(COMPRESSION_MAGIC) + 1) * 8])
+    if data[:len(COMPRESSION_MAGIC)] != COMPRESSION_MAGIC or len(data) <= len(COMPRESSION_MAGIC):
+        return None
+
+    for codec, codec_id in COMPRESSION_CODECS.items():
+        if data[len(COMPRESSION_MAGIC)] == codec_id:
+            return codec
+
+    return None
+
+def decompress_payload(data):
+    """
+    Removes the codec tag and decompresses the payload with the recorded codec.
+
+    Arguments:
+    - data: The tagged bytes produced by compress_payload.
+
+    Returns:
+    - The decompressed bytes and the name of the codec as a tuple.
+
+    Raises:
+    - ValueError: If the data is not tagged or the payload is damaged beyond what Hamming corrected.
+    """
+    codec = compression_codec(data)
+    if codec is None:
+        raise ValueError("The payload does not start with a compression tag.")
+
+    compressed = data[len(COMPRESSION_MAGIC) + 1:]
+    try:
+        if codec == 'zlib':
+            return zlib.decompress(compressed), codec
+        elif codec == 'lzma':
+            import lzma
+
+            return lzma.decompress(compressed, format=lzma.FORMAT_XZ), codec
+        elif codec == 'bz2':
+            import bz2
+
+            return bz2.decompress(compressed), codec
+        else:
+            try:
+                import numpy
+            except ImportError:
+                numpy = None
+            return rans_decode(compressed, numpy), codec
+    except Exception as error:  # zlib.error, lzma.LZMAError, OSError and EOFError depending on the codec
+        raise ValueError("The {} payload could not be decompressed ({}).".format(codec, error))
+
+#################################### Pipelined Execution Functions ####################################
+
+def run_pipeline(chunks, compute, write, jobs=1, queue_size=PIPELINE_QUEUE_SIZE):
+    """
+    Runs the read, compute and write stages concurrently, so that the disk and the CPU are busy at the same time.
+    A reader thread pulls the chunks from the chunks iterator into a bounded queue. The chunks are computed in order,
+    in the calling thread or in a pool of jobs worker processes, and a writer thread passes the results to write
+    from a second bounded queue. At most queue_size chunks wait in each queue, so memory stays bounded. An error
+    in any stage stops the pipeline and is raised again here.
+
+    Arguments:
+    - chunks: An iterator of the input chunks (consumed by the reader thread).
+    - compute: The function applied to every chunk (a module level function if jobs > 1).
+    - write: The function called with every result, in the order of the chunks.
+    - jobs: The number of worker processes of the compute stage (default: 1).
+    - queue_size: The largest number of chunks waiting in each queue (default: PIPELINE_QUEUE_SIZE).
+    """
+    done = object()  # Marks the end of a queue
+    inputs = queue.Queue(queue_size)
+    outputs = queue.Queue(queue_size)
+    errors = []
+
+    def reader():
+        try:
+            for chunk in chunks:
+                if errors:
+                    break
+                inputs.put(chunk)
+        except BaseException as error:
+            errors.append(error)
+        finally:
+            inputs.put(done)
+
+    def writer():
+        for result in iter(outputs.get, done):
+            if errors:
+                continue  # Results after a failure are only drained
+            try:
+                write(result)
+            except BaseException as error:
+                errors.append(error)
+
+    threads = [threading.Thread(target=reader, daemon=True), threading.Thread(target=writer, daemon=True)]
+    for thread in threads:
+        thread.start()
+
+    try:
+        if jobs > 1:
+            import multiprocessing
+
+            in_flight = threading.BoundedSemaphore(queue_size)  # Pool.imap reads ahead, so the chunks it holds are limited here
+
+            def feed():
+                for chunk in iter(inputs.get, done):
+                    in_flight.acquire()
+                    yield chunk
+
+            with multiprocessing.Pool(jobs) as pool:
+                for result in pool.imap(compute, feed()):
+                    in_flight.release()
+                    outputs.put(result)
+                    if errors:
+                        break
+        else:
+            for chunk in iter(inputs.get, done):
+                outputs.put(compute(chunk))
+                if errors:
+                    break
+    except BaseException as error:
+        errors.append(error)
+    finally:
+        outputs.put(done)
+        threads[1].join()
+        if errors:
+            while threads[0].is_alive():  # Unblock the reader so that it can stop
+                try:
+                    inputs.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+        threads[0].join()
+
+    if errors:
+        raise errors[0]
+
+#################################### Profiling Functions ####################################
+
+def start_profile(enabled):
+    """
+    Starts recording the wall time, CPU time and peak memory of each stage of the pipeline.
+
+    Arguments:
+    - enabled: Whether profiling was requested (--profile or the DNACODEX_PROFILE environment variable).
+
+    Returns:
+    - The profile as a dictionary, or None if profiling is disabled.
+    """
+    if not enabled:
+        return None
+
+    import tracemalloc
+
+    tracemalloc.start()  # Traces the memory allocated by Python, which slows the run down
+    return {'stages': [], 'current': None, 'wall': 0, 'cpu': 0}
+
+def profile_stage(profile, stage):
+    """
+    Closes the stage that is currently measured (if any) and starts measuring the next one.
+
+    Arguments:
+    - profile: The profile returned by start_profile (nothing is recorded if it is None).
+    - stage: The name of the next stage, or None to close the last stage.
+
+    Returns:
+    - None
+    """
+    if profile is None:
+        return
+
+    import tracemalloc
+
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    if profile['current'] is not None:
+        peak = tracemalloc.get_traced_memory()[1]
+        profile['stages'].append((profile['current'], wall - profile['wall'], cpu - profile['cpu'], peak // 1024))
+    tracemalloc.reset_peak()
+
+    profile['current'] = stage
+    profile['wall'] = wall
+    profile['cpu'] = cpu
+
+def format_profile(profile):
+    """
+    Formats the measurements of the stages for the INFO CSV file (stage=wall s/CPU s/peak KB, separated by ';').
+
+    Arguments:
+    - profile: The profile returned by start_profile.
+
+    Returns:
+    - The formatted measurements, or 'NA' if profiling is disabled.
+    """
+    if profile is None:
+        return 'NA'
+
+    return ';'.join('{}={:.4f}/{:.4f}/{}'.format(*stage) for stage in profile['stages'])
+
+def print_profile(profile):
+    """
+    Prints the measurements of the stages.
+
+    Arguments:
+    - profile: The profile returned by start_profile.
+
+    Returns:
+    - None
+    """
+    if profile is None:
+        return
+
+    print("\033[1;34m> Profile (wall time, CPU time, peak Python memory):\033[0m")
+    for stage, wall, cpu, peak in profile['stages']:
+        print("    {:<18} {:>10.4f} s {:>10.4f} s {:>12} KB".format(stage, wall, cpu, peak))
+    try:
+        import resource  # Unix only
+    except ImportError:
+        return
+    print("    Peak RSS of the process: {} KB".format(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss))
@@ -0,0 +1,448 @@
+import argparse
+import collections
+import http.server
+import json
+import os
+import queue
+import signal
+import socketserver
+import stat
+import threading
+import time
+import urllib.parse
+
+import DNAcodeX_decoder as decoder
+import DNAcodeX_encoder as encoder
+from dnacodex_core import CODEBOOK_DIR, CODEBOOKS, COMPRESSION_CODECS, PINNED_CODEBOOK_DIR, build_correction_table
+
+SERVICE_HOST = '127.0.0.1'  # The service only listens on the loopback interface
+SERVICE_PORT = 8765
+SERVICE_BATCH_JOBS = 32  # Largest number of small jobs sent to a worker process at once
+SERVICE_BATCH_WINDOW_MS = 2  # Time the dispatcher waits for more small jobs before it sends a batch
+SERVICE_SMALL_JOB_BYTES = 2 ** 16  # Jobs with a larger body are sent to a worker process alone
+SERVICE_MAX_BODY_BYTES = 2 ** 28  # Larger requests are refused
+SERVICE_LISTEN_BACKLOG = 128  # Connections waiting to be accepted, for bursts of concurrent clients
+SERVICE_METRICS_WINDOW = 10000  # Number of recent jobs of each operation kept for the latency percentiles
+FILE_TYPES = ('jpg', 'jpeg', 'png', 'txt', 'gz', 'txt.gz')
+
+#################################### Worker Functions ####################################
+
+def warm_worker(codebook_dir=CODEBOOK_DIR):
+    """
+    Builds the lookup tables of the encoder and the decoder and loads the codebook cache into memory, so that
+    the first jobs of a worker process do not pay for them.
+
+    Arguments:
+    - codebook_dir: The directory of the codebook cache (default: CODEBOOK_DIR).
+
+    Returns:
+    - The number of codebooks loaded.
+    """
+    encoder.build_encoding_table()
+    decoder.build_base_tables()
+    build_correction_table()
+
+    paths = []
+    for directory in (codebook_dir, os.path.join(codebook_dir, PINNED_CODEBOOK_DIR)):
+        if os.path.isdir(directory):
+            paths += [os.path.join(directory, name) for name in os.listdir(directory) if name.endswith('.json')]
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            huffman_codes = json.load(f)
+        CODEBOOKS[path] = huffman_codes  # Not marked as used, so warming does not change the LRU order
+
+    return len(paths)
+
+def start_worker(codebook_dir=CODEBOOK_DIR):
+    """
+    Initializes a worker process of the pool. Ctrl+C is handled by the service process, which stops the workers.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    warm_worker(codebook_dir)
+
+def run_job(operation, body, options):
+    """
+    Runs a single encode or decode job.
+
+    Arguments:
+    - operation: 'encode' or 'decode'.
+    - body: The bytes of the file to encode, or the DNA sequence to decode.
+    - options: The options of the job as a dictionary (see parse_options).
+
+    Returns:
+    - Whether the job succeeded, the output bytes (or the error message), the correction statistics and the compute time in seconds as a tuple.
+    """
+    start = time.perf_counter()
+    statistics = {}
+    try:
+        if operation == 'encode':
+            output = encoder.encode_data(body, options['type'], options['compress'], options['checksum'], options['constrained'], options['sync'], options['shared'], options['codebook_dir']).encode('ascii')
+        else:
+            output, statistics = decoder.decode_data(body.decode('ascii', errors='replace'), options['type'], options['huffman'], options['checksum'], options['sync'], options['codebook_dir'])
+    except Exception as error:
+        return False, str(error) or type(error).__name__, statistics, time.perf_counter() - start
+
+    return True, output, statistics, time.perf_counter() - start
+
+def run_batch(jobs):
+    """
+    Runs a batch of jobs in a worker process.
+
+    Arguments:
+    - jobs: A list of (operation, body, options) tuples.
+
+    Returns:
+    - The list of the results of run_job.
+    """
+    return [run_job(operation, body, options) for operation, body, options in jobs]
+
+#################################### Dispatcher Functions ####################################
+
+def submit_batch(batch, pool, metrics):
+    """
+    Sends a batch of jobs to the worker pool (or runs it in the dispatcher thread without a pool) and wakes the
+    request handlers of the jobs when their results are ready.
+
+    Arguments:
+    - batch: The list of the jobs (dictionaries with the request, its result and an event).
+    - pool: The multiprocessing pool, or None.
+    - metrics: The metrics of the service.
+
+    Returns:
+    - None
+    """
+    record_batch(metrics, len(batch))
+
+    def complete(results):
+        for job, result in zip(batch, results):
+            job['result'] = result
+            job['batch_size'] = len(batch)
+            job['done'].set()
+
+    def fail(error):
+        complete([(False, 'The worker process failed: {}'.format(error), {}, 0)] * len(batch))
+
+    requests = [(job['operation'], job['body'], job['options']) for job in batch]
+    if pool is None:
+        complete(run_batch(requests))
+    else:
+        pool.apply_async(run_batch, (requests,), callback=complete, error_callback=fail)
+
+def dispatch(jobs, pool, metrics, batch_jobs=SERVICE_BATCH_JOBS, batch_window=SERVICE_BATCH_WINDOW_MS / 1000, small_job_bytes=SERVICE_SMALL_JOB_BYTES):
+    """
+    Takes the jobs from the queue and groups the small ones into batches, so that a worker process receives
+    many small jobs in one message instead of paying the inter-process overhead for each of them. A batch is sent
+    when it holds batch_jobs jobs or when no other job arrived within batch_window seconds. Large jobs are sent alone.
+
+    Arguments:
+    - jobs: The queue of the jobs (None stops the dispatcher).
+    - pool: The multiprocessing pool, or None to run the jobs in the dispatcher thread.
+    - metrics: The metrics of the service.
+    - batch_jobs: The largest number of jobs in a batch (default: SERVICE_BATCH_JOBS).
+    - batch_window: The time in seconds to wait for more small jobs (default: SERVICE_BATCH_WINDOW_MS / 1000).
+    - small_job_bytes: The largest body of a job that is batched (default: SERVICE_SMALL_JOB_BYTES).
+
+    Returns:
+    - None
+    """
+    stopping = False
+    while not stopping:
+        job = jobs.get()
+        if job is None:
+            break
+
+        batch = [job]
+        if len(job['body']) <= small_job_bytes:
+            deadline = time.perf_counter() + batch_window
+            while len(batch) < batch_jobs:
+                try:
+                    next_job = jobs.get(timeout=max(deadline - time.perf_counter(), 0))
+                except queue.Empty:
+                    break
+                if next_job is None:
+                    stopping = True
+                    break
+                if len(next_job['body']) > small_job_bytes:
+                    submit_batch([next_job], pool, metrics)
+                else:
+                    batch.append(next_job)
+        submit_batch(batch, pool, metrics)
+
+#################################### Metrics Functions ####################################
+
+def new_metrics(window=SERVICE_METRICS_WINDOW):
+    """
+    Creates the metrics of the service.
+
+    Arguments:
+    - window: The number of recent jobs of each operation kept for the percentiles (default: SERVICE_METRICS_WINDOW).
+
+    Returns:
+    - The metrics as a dictionary.
+    """
+    operations = {}
+    for operation in ('encode', 'decode'):
+        operations[operation] = {'jobs': 0, 'failed': 0, 'bytes_in': 0, 'bytes_out': 0,
+                                 'latency': collections.deque(maxlen=window), 'compute': collections.deque(maxlen=window), 'wait': collections.deque(maxlen=window)}
+
+    return {'lock': threading.Lock(), 'started': time.time(), 'operations': operations, 'batches': 0, 'batched_jobs': 0, 'largest_batch': 0}
+
+def record_batch(metrics, batch_size):
+    with metrics['lock']:
+        metrics['batches'] += 1
+        metrics['batched_jobs'] += batch_size
+        metrics['largest_batch'] = max(metrics['largest_batch'], batch_size)
+
+def record_job(metrics, operation, succeeded, bytes_in, bytes_out, latency, compute):
+    """
+    Records the latency of a job. The wait is the part of the latency not spent computing (queueing, batching
+    and the transfer to and from the worker process).
+
+    Arguments:
+    - metrics: The metrics of the service.
+    - operation: 'encode' or 'decode'.
+    - succeeded: Whether the job succeeded.
+    - bytes_in: The size of the request body.
+    - bytes_out: The size of the response body.
+    - latency: The time in seconds from the arrival of the request to its result.
+    - compute: The time in seconds the worker process spent on the job.
+
+    Returns:
+    - None
+    """
+    with metrics['lock']:
+        counters = metrics['operations'][operation]
+        counters['jobs'] += 1
+        counters['failed'] += 0 if succeeded else 1
+        counters['bytes_in'] += bytes_in
+        counters['bytes_out'] += bytes_out
+        counters['latency'].append(latency)
+        counters['compute'].append(compute)
+        counters['wait'].append(max(latency - compute, 0))
+
+def percentiles(values):
+    """
+    Summarizes a list of durations in seconds.
+
+    Arguments:
+    - values: The durations.
+
+    Returns:
+    - The mean, p50, p95, p99 and maximum in milliseconds as a dictionary.
+    """
+    if len(values) == 0:
+        return {}
+
+    values = sorted(values)
+    def pick(q):
+        return round(values[min(len(values) - 1, int(q * len(values)))] * 1000, 3)
+
+    return {'mean': round(sum(values) / len(values) * 1000, 3), 'p50': pick(0.5), 'p95': pick(0.95), 'p99': pick(0.99), 'max': round(values[-1] * 1000, 3)}
+
+def metrics_report(metrics, workers):
+    """
+    Builds the report of the /metrics endpoint.
+
+    Arguments:
+    - metrics: The metrics of the service.
+    - workers: The number of worker processes.
+
+    Returns:
+    - The report as a dictionary.
+    """
+    with metrics['lock']:
+        report = {'uptime_s': round(time.time() - metrics['started'], 3), 'workers': workers,
+                  'batches': metrics['batches'], 'mean_batch_size': round(metrics['batched_jobs'] / metrics['batches'], 3) if metrics['batches'] > 0 else 0,
+                  'largest_batch': metrics['largest_batch']}
+        for operation, counters in metrics['operations'].items():
+            report[operation] = {'jobs': counters['jobs'], 'failed': counters['failed'], 'bytes_in': counters['bytes_in'], 'bytes_out': counters['bytes_out'],
+                                 'latency_ms': percentiles(counters['latency']), 'compute_ms': percentiles(counters['compute']), 'wait_ms': percentiles(counters['wait'])}
+
+    return report
+
+#################################### Request Handling Functions ####################################
+
+def query_flag(params, name):
+    return params.get(name, ['0'])[-1].lower() in ('1', 'true', 'yes')
+
+def parse_options(operation, query, codebook_dir):
+    """
+    Reads the options of a job from the query string of its request, with the names of the command line options
+    (type, compress, checksum, constrained, sync and shared for encode; type, huffman, checksum and sync for decode).
+
+    Arguments:
+    - operation: 'encode' or 'decode'.
+    - query: The query string.
+    - codebook_dir: The directory of the codebook cache of the service.
+
+    Returns:
+    - The options as a dictionary.
+    """
+    params = urllib.parse.parse_qs(query)
+    options = {'type': params.get('type', ['txt'])[-1], 'checksum': query_flag(params, 'checksum'), 'sync': query_flag(params, 'sync'), 'codebook_dir': codebook_dir}
+    if options['type'] not in FILE_TYPES:
+        raise ValueError('Unknown type: {} (choose from {})'.format(options['type'], ', '.join(FILE_TYPES)))
+
+    if operation == 'encode':
+        options['compress'] = params.get('compress', ['huffman' if query_flag(params, 'huffman') else 'none'])[-1]
+        if options['compress'] not in ('none', 'huffman', *COMPRESSION_CODECS):
+            raise ValueError('Unknown compression: {} (choose from none, huffman, {})'.format(options['compress'], ', '.join(COMPRESSION_CODECS)))
+        options['constrained'] = query_flag(params, 'constrained')
+        options['shared'] = query_flag(params, 'shared')
+        if options['shared'] == True and options['compress'] != 'huffman':
+            raise ValueError('shared needs compress=huffman')
+    else:
+        options['huffman'] = query_flag(params, 'huffman')
+
+    return options
+
+class ServiceHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Handles the requests of the service: POST /encode and POST /decode take the input as the request body and
+    return the output as the response body, GET /metrics returns the metrics as JSON and GET /health returns ok.
+    """
+    protocol_version = 'HTTP/1.1'  # Keep-alive, so that clients can reuse their connections
+
+    def address_string(self):
+        return self.client_address[0] if isinstance(self.client_address, tuple) else 'unix'  # Unix sockets have no client address
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def send_body(self, code, body, content_type='text/plain; charset=utf-8', headers=None):
+        self.send_response(code)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = urllib.parse.urlsplit(self.path).path
+        if path == '/health':
+            self.send_body(200, b'ok\n')
+        elif path == '/metrics':
+            self.send_body(200, (json.dumps(metrics_report(self.server.metrics, self.server.workers), indent=2) + '\n').encode('utf-8'), 'application/json')
+        else:
+            self.send_body(404, b'Unknown path, use POST /encode, POST /decode, GET /metrics or GET /health\n')
+
+    def do_POST(self):
+        arrival = time.perf_counter()
+        url = urllib.parse.urlsplit(self.path)
+        operation = url.path.strip('/')
+        length = int(self.headers.get('Content-Length', 0))
+        if operation not in ('encode', 'decode'):
+            self.rfile.read(length)
+            self.send_body(404, b'Unknown path, use POST /encode or POST /decode\n')
+            return
+        if length > SERVICE_MAX_BODY_BYTES:
+            self.close_connection = True  # The body is not read
+            self.send_body(413, 'The body is larger than {} bytes\n'.format(SERVICE_MAX_BODY_BYTES).encode('utf-8'))
+            return
+
+        body = self.rfile.read(length)
+        try:
+            options = parse_options(operation, url.query, self.server.codebook_dir)
+        except ValueError as error:
+            self.send_body(400, (str(error) + '\n').encode('utf-8'))
+            return
+
+        job = {'operation': operation, 'body': body, 'options': options, 'done': threading.Event()}
+        self.server.jobs.put(job)
+        job['done'].wait()
+        succeeded, output, statistics, compute = job['result']
+        latency = time.perf_counter() - arrival
+
+        if not succeeded:
+            output = (output + '\n').encode('utf-8')
+        record_job(self.server.metrics, operation, succeeded, len(body), len(output), latency, compute)
+
+        headers = {'X-DNAcodeX-Latency-Ms': '{:.3f}'.format(latency * 1000), 'X-DNAcodeX-Compute-Ms': '{:.3f}'.format(compute * 1000), 'X-DNAcodeX-Batch-Size': str(job['batch_size'])}
+        for name, value in statistics.items():
+            headers['X-DNAcodeX-' + name.replace('_', '-').title()] = str(value)
+        if succeeded:
+            self.send_body(200, output, 'text/plain; charset=ascii' if operation == 'encode' else 'application/octet-stream', headers)
+        else:
+            self.send_body(422, output, headers=headers)
+
+class ServiceHTTPServer(http.server.ThreadingHTTPServer):
+    request_queue_size = SERVICE_LISTEN_BACKLOG
+
+class UnixHTTPServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+    request_queue_size = SERVICE_LISTEN_BACKLOG
+
+#####################################################################################################
+
+parser = argparse.ArgumentParser(description='DNAcodeX encode/decode service.', usage='%(prog)s [--host HOST] [--port PORT | --unix PATH] [options]')
+
+parser.add_argument('--host', required=False, type=str, default=SERVICE_HOST, metavar='', help='The local address the HTTP service listens on (default: {}).'.format(SERVICE_HOST))
+parser.add_argument('-p', '--port', required=False, type=int, default=SERVICE_PORT, metavar='', help='The port the HTTP service listens on (default: {}).'.format(SERVICE_PORT))
+parser.add_argument('-u', '--unix', required=False, type=str, default=None, metavar='', help='The path of a Unix socket to listen on instead of the HTTP port.')
+parser.add_argument('-j', '--jobs', required=False, type=int, default=1, metavar='', help='The number of worker processes (0 runs the jobs in the service process).')
+parser.add_argument('-cb', '--codebook_dir', required=False, type=str, default=CODEBOOK_DIR, metavar='', help='The directory of the persistent codebook cache, loaded into memory at start.')
+parser.add_argument('--batch_jobs', required=False, type=int, default=SERVICE_BATCH_JOBS, metavar='', help='The largest number of small jobs sent to a worker process at once (default: {}).'.format(SERVICE_BATCH_JOBS))
+parser.add_argument('--batch_window', required=False, type=float, default=SERVICE_BATCH_WINDOW_MS, metavar='', help='The time in milliseconds to wait for more small jobs before a batch is sent (default: {}).'.format(SERVICE_BATCH_WINDOW_MS))
+parser.add_argument('-v', '--verbose', required=False, action='store_true', help='To be called if you want every request to be logged.')
+
+
+def main(argv=None):
+    args = parser.parse_args(argv)
+    if args.host not in ('127.0.0.1', 'localhost', '::1'):
+        parser.error('the service only listens on localhost (got --host {})'.format(args.host))
+
+    codebooks_count = warm_worker(args.codebook_dir)  # The worker processes are forked from this warm process
+    pool = None
+    if args.jobs > 0:
+        import multiprocessing
+
+        pool = multiprocessing.Pool(args.jobs, start_worker, (args.codebook_dir,))
+
+    if args.unix is not None:
+        if os.path.exists(args.unix) and stat.S_ISSOCK(os.stat(args.unix).st_mode):
+            os.remove(args.unix)  # A socket left behind by a previous run
+        server = UnixHTTPServer(args.unix, ServiceHandler)
+        address = 'unix:{}'.format(args.unix)
+    else:
+        server = ServiceHTTPServer((args.host, args.port), ServiceHandler)
+        address = 'http://{}:{}'.format(args.host, server.server_address[1])
+
+    server.jobs = queue.Queue()
+    server.metrics = new_metrics()
+    server.workers = args.jobs
+    server.codebook_dir = args.codebook_dir
+    server.verbose = args.verbose
+    dispatcher = threading.Thread(target=dispatch, args=(server.jobs, pool, server.metrics, max(args.batch_jobs, 1), args.batch_window / 1000), daemon=True)
+    dispatcher.start()
+
+    def stop(signum, frame):
+        raise KeyboardInterrupt
+
+    signal.signal(signal.SIGTERM, stop)
+
+    print("\n\033[1;34m############################ DNAcodeX Service ############################\033[0m")
+    print("\033[1;35m# Listening on:\033[0m \033[93m{}\033[0m".format(address))
+    print("\033[1;35m# Worker Processes:\033[0m \033[93m{}\033[0m".format(args.jobs if args.jobs > 0 else 'none (in-process)'))
+    print("\033[1;35m# Batches:\033[0m \033[93mup to {} jobs, {} ms window\033[0m".format(args.batch_jobs, args.batch_window))
+    print("\033[1;35m# Codebooks Loaded:\033[0m \033[93m{}\033[0m".format(codebooks_count))
+    print("> POST /encode, POST /decode, GET /metrics, GET /health (Ctrl+C to stop)\n", flush=True)
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n> The service was stopped.")
+    finally:
+        server.server_close()
+        server.jobs.put(None)
+        dispatcher.join()
+        if pool is not None:
+            pool.terminate()  # The server is closed, so the results of unfinished jobs could not be sent anyway
+            pool.join()
+        if args.unix is not None and os.path.exists(args.unix):
+            os.remove(args.unix)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,446 +1,919 @@
 import argparse
+import cmath
+import collections
 import hashlib
+import math
 import random
 import datetime
 import os
+import re
+import sqlite3
+import sys
+
+from dnacodex_core import (
+    CODEBOOK_DIR,
+    dna_to_binary,
+    utf8_bin_decode,
+    binary_to_image_bytes,
+    compression_codec,
+    decompress_payload,
+    decode_header,
+    load_codebook,
+    construct_huffman_dict,
+    huffman_decode,
+    hamming_correct,
+    UncorrectableCodeword,
+    correct_codewords,
+    remove_hamming_bits,
+    remove_sync_markers,
+    verify_block_checksums,
+    split_checksum_tag,
+    open_csv_report,
+)
+
+MIN_ADAPTIVE_RUNS = 10  # Runs made before the adaptive mode may stop early
+RESULTS_DB = 'Mutations_simulator_results.db'  # Default SQLite results store
+RESULTS_FLUSH_RUNS = 10000  # Runs inserted into the results store per transaction
 
-######################################### General Functions #######################################
-def dna_to_binary(data):
-    data = data.replace('T', 'C')
-    data = data.replace('A', 'G')
+########################## Single Base Substitutions Simulation Functions ##########################
 
-    table = data.maketrans('GC', '10')
-    decoded_dna = data.translate(table)
+def simulate_substitution(sequence, mutation_rate, rng=random):
+    sequence = list(sequence)
+    seq_length = len(sequence)
+    num_mutations = round(int(seq_length * mutation_rate))
 
-    return decoded_dna
+    mutation_positions = rng.sample(range(seq_length), num_mutations)
 
-def utf8_bin_decode(string):
-    decoded_string = ''
+    for position in mutation_positions:
+        current_nucleotide = sequence[position]
+        possible_nucleotides = ['A', 'C', 'G', 'T']
+        possible_nucleotides.remove(current_nucleotide)
+        new_nucleotide = rng.choice(possible_nucleotides)
+        sequence[position] = new_nucleotide
 
-    for i in range(0, len(string), 80):
-        chunk = string[i: i + 80]
-        while len(chunk) != 0:
+    mutated_sequence = ''.join(sequence)
+    return mutated_sequence, num_mutations
 
-            if chunk.startswith('0'):
-                f = chunk[:8]
+def simulate_indels(sequence, insertion_rate, deletion_rate, rng=random):
+    """
+    Introduces random single base insertions and deletions in the sequence.
 
-            elif chunk.startswith('110'):
-                f = chunk[0:16]
+    Arguments:
+    - sequence: The DNA sequence.
+    - insertion_rate: The rate of the insertions.
+    - deletion_rate: The rate of the deletions.
+    - rng: The random number generator (default: the random module).
 
-            elif chunk.startswith('1110'):
-                f = chunk[0:24]
+    Returns:
+    - The mutated sequence and the number of insertions and deletions as a tuple.
+    """
+    seq_length = len(sequence)
+    num_insertions = round(int(seq_length * insertion_rate))
+    num_deletions = round(int(seq_length * deletion_rate))
+
+    positions = rng.sample(range(seq_length), num_insertions + num_deletions)
+    deletions = set(positions[num_insertions:])
+
+    pieces = []
+    last = 0
+    for position in sorted(positions):
+        pieces.append(sequence[last:position])
+        if position in deletions:
+            last = position + 1  # Skip the deleted base
+        else:
+            pieces.append(rng.choice('ACGT'))  # Insert a random base before the current one
+            last = position
+    pieces.append(sequence[last:])
 
-            elif chunk.startswith('11110'):
-                f = chunk[0:32]
-                
-            else:
-                break
-            try:
-                chunk = chunk.removeprefix(f)
-                bit = int(f, 2)
-                bit = bit.to_bytes((bit.bit_length() + 7) // 8, 'big').decode('utf-8')
-                decoded_string += bit
-            except:
-                pass
+    mutated_sequence = ''.join(pieces)
+    return mutated_sequence, num_insertions + num_deletions
+
+def run_code(data, huffman, type, codebook_dir=CODEBOOK_DIR, sync=False):
+
+    if sync == True:
+        data = remove_sync_markers(data)[0]
+    data_without_parity, errors_count = correct_codewords(data)[:2]
+    data_without_parity, checksum = split_checksum_tag(data_without_parity)
+    if checksum == True:
+        data_without_parity = verify_block_checksums(data_without_parity)[0]  # Decoded without the checksums, as by the decoder
+
+    if huffman == True:
+        header_len = decode_header(data_without_parity[:8])  # Decode the marker length from the encoded data string
+        instructions_length = decode_header(data_without_parity[8: (header_len + 1) * 8])  # Decode the length of the instructions from the encoded data string
+        huffman_instructions_string_binary = utf8_bin_decode(data_without_parity[(header_len + 1) * 8: ((header_len + 1) * 8 + instructions_length)])  # Decode the Huffman instructions from the encoded data string
+        if huffman_instructions_string_binary.startswith('#'):
+            huffman_dict = load_codebook(huffman_instructions_string_binary[1:], codebook_dir)  # The sequence references a shared codebook by its ID
+        else:
+            huffman_dict = construct_huffman_dict(huffman_instructions_string_binary)  # Construct the Huffman dictionary from the Huffman instructions
+        decoded_data = huffman_decode(data_without_parity[(header_len + 1) * 8 + instructions_length:], huffman_dict)  # Decode the data using Huffman decoding
+
+    elif compression_codec(data_without_parity) is not None:
+        decoded_data = decompress_payload(binary_to_image_bytes(data_without_parity))[0].hex()  # Raises ValueError if the payload is damaged
+
+    elif type == 'png' or type == 'jpg' or type == 'gz' or type == 'txt.gz':
+        for i in range(0, len(decoded_data), 3):
+            integer = int(decoded_data[i:i+3])
+            decoded_bytes = integer.to_bytes(1, byteorder='big')
+            decoded_data += str(decoded_bytes)
+
+    elif huffman == False:
+        if type == 'txt':
+            decoded_data = utf8_bin_decode(data_without_parity)
         
-    return decoded_string
+        elif type == 'png' or type == 'jpg' or type == 'gz' or type == 'txt.gz': 
+            decoded_data = binary_to_image_bytes(data_without_parity)
+    
+    md5sum = hashlib.md5(decoded_data.encode('utf-8')).hexdigest()
+    return md5sum, errors_count
 
-#################################### Huffman Decoding Functions ####################################
+def run_checksums(data, sync=False):
+    """
+    Corrects the sequence and verifies the embedded block checksums without decoding the payload.
+
+    Arguments:
+    - data: The DNA sequence that was encoded with block checksums.
+    - sync: Whether the sequence has synchronization markers (default: False).
 
-def decode_header(header):
+    Returns:
+    - The list of the indices of the failed blocks and the number of corrected errors as a tuple.
     """
-    Decodes the header using a specific decoding scheme.
+    if sync == True:
+        data = remove_sync_markers(data)[0]
+    data_without_parity, errors_count = correct_codewords(data)[:2]
+    failed_blocks = verify_block_checksums(split_checksum_tag(data_without_parity, True)[0])[1]
+
+    return failed_blocks, errors_count
+
+#################################### Analytic Estimator Functions ####################################
+
+SURVIVAL_TABLE = {}  # Codeword (bits) -> probability that it still decodes to the same data bits after j substituted bases, j = 0..n
+
+def decode_codeword(codeword):
+    """
+    Decodes a single codeword (as bits) with hamming_correct, as correct_codewords does.
+
+    Returns:
+    - The data bits, or None if hamming_correct has no rule for the parity combination.
+    """
+    try:
+        return remove_hamming_bits(hamming_correct(codeword)[0])[0]
+    except UncorrectableCodeword:
+        return None
+
+def codeword_survival(codeword):
+    """
+    Computes from the case tables of hamming_correct the probability that a codeword still decodes to its data
+    bits after j of its bases were substituted. A substituted base is replaced by one of the three other bases,
+    and only two of them change its bit (A and G both map to 1, C and T both map to 0), so every substitution
+    flips the bit with probability 2/3 and is silent otherwise. Each pattern of flipped bits is decoded once and
+    counted for every set of substituted bases that contains it.
 
     Arguments:
-    - header: The encoded header string.
+    - codeword: The codeword as a string of 7, 6, 5 or 3 bits.
 
     Returns:
-    - The decoded header as an integer.
-    """
-    integers = ''
-    n = 8  # Number of bits in each segment
-    x = [header[i:i+n] for i in range(0, len(header), n)]  # Split the header into segments of n bits
-    for bit in x:
-        try:
-            bit = int(bit, 2)  # Convert the binary segment to an integer
-            bit = bit.to_bytes((bit.bit_length() + 7) // 8, 'big').decode()  # Convert the integer to its corresponding ASCII character
-            integers += bit  # Concatenate the ASCII characters to form the decoded header string
-        except (ValueError, UnicodeDecodeError):
-            # Skip this segment if conversion fails
+    - A tuple of the probabilities for j = 0..n substituted bases.
+    """
+    if codeword in SURVIVAL_TABLE:
+        return SURVIVAL_TABLE[codeword]
+
+    n = len(codeword)
+    reference = decode_codeword(codeword)
+    survived = [0.0] * (n + 1)
+    for flips in range(1 << n):
+        flipped = format(int(codeword, 2) ^ flips, '0{}b'.format(n))
+        if decode_codeword(flipped) != reference:
             continue
-            
-    try:
-        integers = int(integers)  # Convert the decoded header string to an integer
-        return integers
-    except ValueError:
-        # Handle the case where the final integer conversion fails
-        return 0 
+        flipped_count = bin(flips).count('1')
+        for j in range(flipped_count, n + 1):  # Every set of j substituted bases containing the flipped ones
+            survived[j] += math.comb(n - flipped_count, j - flipped_count) * (2 / 3) ** flipped_count * (1 / 3) ** (j - flipped_count)
+    SURVIVAL_TABLE[codeword] = tuple([survived[j] / math.comb(n, j) for j in range(n + 1)])
 
-def construct_huffman_dict(instructions_string):
+    return SURVIVAL_TABLE[codeword]
+
+def sequence_codeword_classes(data, sync=False):
     """
-    Constructs a Huffman dictionary from the encoded instructions string.
+    Groups the codewords of a sequence by their survival probabilities.
 
     Arguments:
-    - instructions_string: The encoded instructions string.
+    - data: The unmutated DNA sequence.
+    - sync: Whether the sequence has synchronization markers (default: False).
 
     Returns:
-    - The Huffman dictionary containing the codes.
-    """
-    codes = []
-    codes_list = []
-    huffman_instructions_dict = {}
-
-    if instructions_string.find(',,') != -1:  # Check if multiple sets of codes are present
-        codes_list = instructions_string.split(',,')  # Split the instructions into separate code sets
-        codes_list1 = codes_list[0].split(',')  # Split the first set of codes
-        for code in codes_list1:
-            codes.append(code)
-
-        codes_list2 = codes_list[1].split(',')  # Split the second set of codes
-        codes_list2[0] = ',' + codes_list2[0]
-        for code in codes_list2:
-            codes.append(code)
-    else:
-        codes = instructions_string[1:].split(',')  # Split the codes if only one set is present
+    - A dictionary of (number of bases, survival probabilities) -> number of codewords. The bases of the
+      synchronization markers are counted as codewords of one base that always survive, since remove_sync_markers
+      assumes a mutated marker is at its expected position.
+    """
+    length = len(data)
+    if sync == True:
+        data = remove_sync_markers(data)[0]
+
+    classes = collections.Counter()
+    for codeword_dna, count in collections.Counter([data[i:i+7] for i in range(0, len(data), 7)]).items():
+        survival = codeword_survival(dna_to_binary(codeword_dna))
+        classes[(len(codeword_dna), survival)] += count
+    if length > len(data):
+        classes[(1, (1.0, 1.0))] += length - len(data)
+
+    return classes
+
+def retrieval_probability(classes, length, num_mutations):
+    """
+    Computes the probability of perfect retrieval when num_mutations distinct bases of the sequence are
+    substituted, as simulate_substitution does: every codeword must still decode to its data bits. The result is
+    approximate (aliasing below ~1e-15), since the coefficient is read from a limited number of roots of unity.
+
+    For each codeword class, P(y) = sum_j C(n, j) s(j) p^j (1 - p)^(n - j) y^j with p = num_mutations / length,
+    where s(j) is the survival probability after j substitutions. The product of P(y)^m over the classes is the
+    generating function of (number of substitutions, survival) when every base is substituted independently with
+    probability p, so its coefficient of y^num_mutations divided by the binomial probability of num_mutations is
+    the probability for exactly num_mutations substitutions. The coefficient is read from the values of the product
+    on N roots of unity, with N large enough (or larger than the sequence) that the other coefficients folded onto
+    it are negligible, which takes milliseconds even for long sequences.
+
+    Arguments:
+    - classes: The codeword classes returned by sequence_codeword_classes.
+    - length: The length of the sequence (markers included).
+    - num_mutations: The number of substituted bases.
 
-    for code in codes:
-        if len(code) != 0:
-            huffman_instructions_dict[code[0]] = code[1:]  # Create key-value pairs in the dictionary with character as the key and code as the value
+    Returns:
+    - The probability of perfect retrieval.
+    """
+    if num_mutations == 0:
+        return 1.0
+    if num_mutations == length:
+        return math.prod([survival[n] ** count for (n, survival), count in classes.items()])
+
+    p = num_mutations / length
+    polynomials = [([math.comb(n, j) * survival[j] * p ** j * (1 - p) ** (n - j) for j in range(n + 1)], count) for (n, survival), count in classes.items()]
+    points = min(length + 1, int(24 * math.sqrt(num_mutations * (1 - p))) + 64)  # Folded coefficients are 12 standard deviations away
+
+    coefficient = 0.0
+    for k in range(points // 2 + 1):
+        omega = cmath.exp(2j * math.pi * k / points)
+        value = omega ** -num_mutations
+        for coefficients, count in polynomials:
+            point_value = sum([coefficient_j * omega ** j for j, coefficient_j in enumerate(coefficients)])
+            if point_value == 0:
+                value = 0
+                break
+            value *= cmath.exp(count * cmath.log(point_value))
+        weight = 1 if k == 0 or 2 * k == points else 2  # The values on conjugate roots are conjugate
+        coefficient += weight * value.real
+    coefficient /= points
+
+    binomial = math.exp(math.lgamma(length + 1) - math.lgamma(num_mutations + 1) - math.lgamma(length - num_mutations + 1) + num_mutations * math.log(p) + (length - num_mutations) * math.log(1 - p))
+    if coefficient < points * 1e-15:
+        return 0.0  # Below the rounding error of the sum
 
-    return huffman_instructions_dict
+    return min(coefficient / binomial, 1.0)
 
-def huffman_decode(encoded_data, huffman_codes):
+def analytic_retrieval(data, mutations_rate, sync=False):
     """
-    Decodes the encoded data using Huffman decoding.
+    Computes the approximate (aliasing below ~1e-15) probability of perfect retrieval of a sequence for a mutations
+    rate (substitutions only).
 
     Arguments:
-    - encoded_data: The encoded data to be decoded.
-    - huffman_codes: The Huffman codes used for decoding.
+    - data: The unmutated DNA sequence.
+    - mutations_rate: The rate of the substitutions.
+    - sync: Whether the sequence has synchronization markers (default: False).
 
     Returns:
-    - The decoded data as a string.
+    - The probability of perfect retrieval and the number of substitutions as a tuple.
+    """
+    num_mutations = round(int(len(data) * mutations_rate))  # The same number of substitutions as simulate_substitution
+
+    return retrieval_probability(sequence_codeword_classes(data, sync), len(data), num_mutations), num_mutations
+
+def max_mutations_rate(data, target, sync=False):
     """
-    inverse_codes = {value: key for key, value in huffman_codes.items()}  # Create a dictionary of inverse codes (codes as keys and characters as values)
-    current_code = ''  # Initialize an empty string to store the current code being processed
-    decoded_data = ''  # Initialize an empty string to store the decoded data
+    Finds the largest number of substitutions for which the probability of perfect retrieval is at least target.
 
-    for bit in encoded_data:
-        current_code += bit
-        if current_code in inverse_codes:
-            decoded_data += inverse_codes[current_code]  # Append the decoded character to the decoded data
-            current_code = ''  # Reset the current code
+    Arguments:
+    - data: The unmutated DNA sequence.
+    - target: The required probability of perfect retrieval.
+    - sync: Whether the sequence has synchronization markers (default: False).
+
+    Returns:
+    - The largest number of substitutions (0 if even a single substitution is too many) and the corresponding mutations rate as a tuple.
+    """
+    classes = sequence_codeword_classes(data, sync)
+    low, high = 0, len(data)  # The probability decreases with the number of substitutions
+    while low < high:
+        middle = (low + high + 1) // 2
+        if retrieval_probability(classes, len(data), middle) >= target:
+            low = middle
         else:
-            pass
+            high = middle - 1
+
+    return low, low / len(data)
+
+def run_seed(seed, sequence_key, mutations_rate, number_of_run):
+    """
+    Derives the seed of a single run from the seed of the sweep. Every run gets its own random number generator,
+    so a run is reproduced exactly whatever process, node or shard simulates it and in whatever order.
 
-    return decoded_data
+    Arguments:
+    - seed: The seed of the sweep.
+    - sequence_key: The SHA-256 digest of the unmutated sequence (the same on every node, whatever the file is called).
+    - mutations_rate: The rate of the substitutions.
+    - number_of_run: The number of the run.
 
-def read_file(file_name):
+    Returns:
+    - The seed of the run as an integer.
     """
-    Decodes the DNA encoded data in the given file using Huffman coding.
-    HuffGen decodes the first 7 DNA bases (first marker) to get the number of digits of the Huffman dictionary length (second marker).
-    Then, after decoding the length of the encoded dictionary, it decodes the dictionary and uses the Huffman codes
-    found in the dictionary to decode the encoded text.
-    The decoding of the first marker, the second marker and Huffman dictionary is based on the fixed length ASCII codes.
-    While the encoded data is mapped by the variable length Huffman codes.
+    digest = hashlib.sha256('{}:{}:{!r}:{}'.format(seed, sequence_key, mutations_rate, number_of_run).encode('utf-8')).digest()
+
+    return int.from_bytes(digest[:8], 'big')
+
+def parse_shard(text):
+    """
+    Parses the --shard option (i/N, the i-th of N shards).
 
     Arguments:
-    - file_name: The file name that contains the encoded data in nucleotides.
-    - output_filename: The name of the desired output file. (default: data_decoded.txt)
+    - text: The value of the option.
 
     Returns:
-    - The decoded data saved in a text file.
+    - The shard number and the number of shards as a tuple.
+    """
+    match = re.fullmatch(r'(\d+)/(\d+)', text.strip())
+    if match is None or not 1 <= int(match.group(1)) <= int(match.group(2)):
+        raise argparse.ArgumentTypeError('expected i/N with 1 <= i <= N, got {}'.format(text))
 
+    return int(match.group(1)), int(match.group(2))
+
+def shard_runs(n_sims, shard=(1, 1)):
     """
-    with open(file_name, 'r', encoding='utf-8') as f:
-        lines = f.readlines()
-    encoded_data = ''
+    Returns the run numbers of a shard: the n_sims runs are split into N contiguous ranges of (nearly) equal size,
+    so the shards of a sweep never overlap and together hold every run exactly once.
 
-    for line in lines:
-        encoded_data += line
+    Arguments:
+    - n_sims: The number of runs of the whole sweep.
+    - shard: The shard number and the number of shards (default: (1, 1), all of the runs).
 
-    return encoded_data
+    Returns:
+    - The run numbers as a range.
+    """
+    index, count = shard
 
-def bit_switch(bit):
-    if bit == 1:
-        return 0
-    elif bit == 0:
-        return 1
-    
-def hamming_correct(string):
-    bits = [int(i) for i in string]
+    return range((index - 1) * n_sims // count + 1, index * n_sims // count + 1)
 
-    if len(bits) == 7:
-        parity_indices = [(0, 1, 3), (0, 2, 3), (1, 2, 3)]
-        parities = [bits[i] ^ bits[j] ^ bits[k] for i, j, k in parity_indices]
-        
-        p1 = parities[0] == bits[4]
-        p2 = parities[1] == bits[5]
-        p3 = parities[2] == bits[6]
+def wilson_interval(successes, n, z=1.96):
+    """
+    Computes the Wilson score confidence interval of a binomial proportion.
 
-        error = False
+    Arguments:
+    - successes: The number of perfect retrievals.
+    - n: The number of runs.
+    - z: The quantile of the standard normal distribution (default: 1.96 for a 95 % interval).
 
-        if p1 == False and p2 == False and p3 == True:
-            bits[0] = bit_switch(bits[0])
-            error = True
+    Returns:
+    - The lower and upper bounds of the interval as a tuple.
+    """
+    if n == 0:
+        return 0.0, 1.0
 
-        elif p1 == False and p2 == True and p3 == False:
-            bits[1] = bit_switch(bits[1])
-            error = True
+    p = successes / n
+    center = (p + z ** 2 / (2 * n)) / (1 + z ** 2 / n)
+    margin = z * math.sqrt(p * (1 - p) / n + z ** 2 / (4 * n ** 2)) / (1 + z ** 2 / n)
 
-        elif p1 == True and p2 == False and p3 == False:
-            bits[2] = bit_switch(bits[2])
-            error = True 
+    return max(0.0, center - margin), min(1.0, center + margin)
 
-        elif p1 == False and p2 == False and p3 == False:
-            bits[3] = bit_switch(bits[3])
-            error = True
+def clean_reference(data, huffman, type, codebook_dir=CODEBOOK_DIR, checksum=False, sync=False):
+    """
+    Decodes the unmutated sequence once to obtain the reference that the mutated runs are compared with.
 
-        elif p1 == False and p2 == True and p3 == True:
-            bits[4] = bit_switch(bits[4])
-            error = True
+    Arguments:
+    - data: The unmutated DNA sequence.
+    - huffman: Whether the sequence was compressed using Huffman coding.
+    - type: The format of the encoded file.
+    - codebook_dir: The directory of the persistent codebook cache (default: CODEBOOK_DIR).
+    - checksum: Whether perfect retrieval is decided by the block checksums (default: False).
+    - sync: Whether the sequence has synchronization markers (default: False).
 
-        elif p1 == True and p2 == False and p3 == True:
-            bits[5] = bit_switch(bits[5])
+    Returns:
+    - The MD5 hash of the decoded data, or None if the block checksums are used instead.
+    """
+    if checksum == True:
+        if len(run_checksums(data, sync)[0]) != 0:
+            raise SystemExit("The unmutated sequence failed the checksum verification. Was it encoded with -checksum?")
+        return None
 
-        elif p1 == True and p2 == True and p3 == False:
-            bits[6] = bit_switch(bits[6])
-            error = True
+    try:
+        return run_code(data, huffman, type, codebook_dir, sync)[0]
+    except LookupError as error:
+        raise SystemExit(str(error))  # The shared codebook of the sequence is missing, so no run could succeed
 
-        elif p1 == True and p2 == True and p3 == True:
-            error = False
-            pass
-    
-    elif len(bits) == 6:
-        parity_indices = [(0, 1), (1, 2), (0, 2)]
-        parities = [bits[i] ^ bits[j] for i, j in parity_indices]
-
-        p1 = parities[0] == bits[3]
-        p2 = parities[1] == bits[4]
-        p3 = parities[2] == bits[5]
-
-        if p1 == False and p2 == True and p3 == False:
-            bits[0] = bit_switch(bits[0])
-            error = True
-
-        elif p1 == False and p2 == False and p3 == True:
-            bits[1] = bit_switch(bits[1])
-            error = True
-
-        elif p1 == False and p2 == False and p3 == True:
-            bits[2] = bit_switch(bits[2])
-            error = True 
-
-        elif p1 == False and p2 == True and p3 == True:
-            bits[3] = bit_switch(bits[3])
-            error = True
-
-        elif p1 == True and p2 == False and p3 == True:
-            bits[4] = bit_switch(bits[4])
-            error = True
-
-        elif p1 == True and p2 == True and p3 == False:
-            bits[5] = bit_switch(bits[5])
-            error = True
-
-        elif p1 == True and p2 == True and p3 == True:
-            error = False
-            pass
-
-    elif len(bits) == 5:
-        x1 = bit_switch(bits[0])
-        x2 = bit_switch(bits[1])
-        x3 = bits[0] ^ bits[1]
-
-        p1 = x1 == bits[2]
-        p2 = x2 == bits[3]
-        p3 = x3 == bits[4]
-
-        if p1 == False and p2 == True and p3 == False:
-            bits[0] = bit_switch(bits[0])
-            error = True
-
-        elif p1 == True and p2 == False and p3 == False:
-            bits[1] = bit_switch(bits[1])
-            error = True
-
-        elif p1 == False and p2 == True and p3 == True:
-            bits[2] = bit_switch(bits[2])
-            error = True 
-
-        elif p1 == True and p2 == False and p3 == True:
-            bits[3] = bit_switch(bits[3])
-            error = True
-
-        elif p1 == True and p2 == True and p3 == False:
-            bits[4] = bit_switch(bits[4])
-            error = True
-
-        elif p1 == True and p2 == True and p3 == True:
-            error = False
-            pass
-
-    elif len(bits) == 3:
-        if bits[0] != max(set(bits), key = bits.count):
-            bits[0] = max(set(bits), key = bits.count)
-            error = True
+def run_simulations(data, reference, mutations_rate, n_sims, huffman, type, codebook_dir=CODEBOOK_DIR, checksum=False, verbose=False, ci_width=None, min_runs=MIN_ADAPTIVE_RUNS, insertion_rate=0, deletion_rate=0, sync=False, seed=None, shard=(1, 1)):
+    """
+    Runs the simulation n_sims times for a single sequence and mutations rate. If ci_width is given, the runs
+    stop early as soon as the 95 % confidence interval of the perfect retrieval rate is narrower than ci_width,
+    with n_sims as the maximum budget. If seed is given, every run draws its mutations from its own generator
+    seeded by run_seed, and only the runs of the given shard are simulated.
+
+    Arguments:
+    - data: The unmutated DNA sequence.
+    - reference: The reference returned by clean_reference for the sequence.
+    - mutations_rate: The rate of the substitutions.
+    - n_sims: The number of runs.
+    - huffman: Whether the sequence was compressed using Huffman coding.
+    - type: The format of the encoded file.
+    - codebook_dir: The directory of the persistent codebook cache (default: CODEBOOK_DIR).
+    - checksum: Whether perfect retrieval is decided by the block checksums (default: False).
+    - verbose: Whether the status of every run is printed (default: False).
+    - ci_width: The target width of the confidence interval for the early stopping (default: None, no early stopping).
+    - min_runs: The number of runs before the early stopping is considered (default: MIN_ADAPTIVE_RUNS).
+    - insertion_rate: The rate of the single base insertions (default: 0).
+    - deletion_rate: The rate of the single base deletions (default: 0).
+    - sync: Whether the sequence has synchronization markers (default: False).
+    - seed: The seed of the sweep (default: None, the global random state is used).
+    - shard: The shard number and the number of shards (default: (1, 1), all of the runs).
+
+    Returns:
+    - A list of (run number, number of mutations, corrected errors, perfect retrieval (0/1), failed blocks) tuples.
+    """
+    runs = []
+    successes = 0
+    rng = random
+    if seed is not None:
+        sequence_key = hashlib.sha256(data.encode('utf-8')).hexdigest()
+    run_numbers = shard_runs(n_sims, shard)
+    for number_of_run in run_numbers:
+        if seed is not None:
+            rng = random.Random(run_seed(seed, sequence_key, mutations_rate, number_of_run))
+        mutated_data, num_mutations = simulate_substitution(data, mutations_rate, rng)
+        if insertion_rate != 0 or deletion_rate != 0:
+            mutated_data, num_indels = simulate_indels(mutated_data, insertion_rate, deletion_rate, rng)
+            num_mutations += num_indels
+        if checksum == True:
+            failed_blocks, errors_count = run_checksums(mutated_data, sync)
+            check = int(len(failed_blocks) == 0)
+            failed_blocks = len(failed_blocks)
         else:
-            error = False
-            pass
+            try:
+                mutated_md5sum, errors_count = run_code(mutated_data, huffman, type, codebook_dir, sync)
+            except (ValueError, LookupError):
+                mutated_md5sum, errors_count = None, 0  # Uncorrectable codewords (indels without resynchronization), headers or codebook references
+            check = int(reference == mutated_md5sum)
+            failed_blocks = 'NA'
+        runs.append((number_of_run, num_mutations, errors_count, check, failed_blocks))
+        successes += check
+
+        if verbose == True:
+            status = "\033[1;32mFull Decryption\033[0m" if check == 1 else "\033[1;31mIncomplete Decryption\033[0m"
+            print('Run: {}, Progress: {} %, status: {}'.format(number_of_run, round(len(runs)/len(run_numbers) * 100), status))
+
+        if ci_width is not None and len(runs) >= min_runs:
+            lower, upper = wilson_interval(successes, len(runs))
+            if upper - lower < ci_width:
+                break  # The perfect retrieval rate is settled within the target width
+
+    return runs
+
+def cell_status(input_file, mutations_rate, runs, analytic=None):
+    """
+    Formats the perfect retrieval rate and its 95 % confidence interval for one (input file, mutations rate) cell,
+    followed by the analytic probability (if given) as a spot check of the estimator.
+    """
+    successes = sum([run[3] for run in runs])
+    lower, upper = wilson_interval(successes, len(runs))
+    status = 'File: {}, Mutations Rate: {}, Perfect Retrieval: {}/{} (95 % CI: {}-{} %)'.format(input_file, mutations_rate, successes, len(runs), round(lower * 100, 2), round(upper * 100, 2))
+    if analytic is not None:
+        status += ', Analytic: {} %'.format(round(analytic * 100, 2))
 
-    corrected_string = ''.join([str(i) for i in bits])
-    
-    return corrected_string, error
-
-def correct_string(string):
-
-    corrected_string = ''
-    errors_count = 0
-
-    for i in range(0, len(string), 7):
-        codeword_dna = string[i:i+7]
-        codeword_binary = dna_to_binary(codeword_dna)
-        corrected_codeword_binary, error = hamming_correct(codeword_binary)
-        corrected_string += corrected_codeword_binary
-
-        if error == True:
-            errors_count += 1
-            
-    return corrected_string, errors_count
-
-def remove_hamming_bits(data):
-
-    data_without_parity = ''
-    parity_count = 0
-
-    for i in range(0, len(data), 7):
-        binary_string = data[i:i+7]
-        length = len(binary_string)
-
-        if length == 7:
-            data_without_parity += data[i:i+4]
-            parity_count += 3
-        elif length == 6:
-            data_without_parity += data[i:i+3]
-            parity_count += 3
-        elif length == 5:
-            data_without_parity += data[i:i+2]
-            parity_count += 3
-        elif length == 3:
-            data_without_parity += data[i:i+1]
-            parity_count += 2
-            
-
-    return data_without_parity, parity_count
-
-def binary_to_image_bytes(binary_data):
-    image_bytes = b''
-    for i in range(0, len(binary_data), 8):
-        eight_bits = binary_data[i:i+8]
-        integer = int(eight_bits, 2)
-        bytes = integer.to_bytes(1, byteorder='big')
-        image_bytes += bytes
-    
-    return image_bytes
+    return status
 
-########################## Single Base Substitutions Simulation Functions ##########################
+SWEEP_SEQUENCES = {}  # Input file -> (sequence, clean reference), shared with the worker processes of a sweep
 
-def simulate_substitution(sequence, mutation_rate):
-    sequence = list(sequence)
-    seq_length = len(sequence)
-    num_mutations = round(int(seq_length * mutation_rate))
+def start_sweep_worker(sequences):
+    """
+    Initializes a worker process of a sweep with the sequences and their clean references. They are passed once
+    per worker rather than inherited, so the workers also have them when they are started with spawn or forkserver
+    (the default outside of Linux, and on Linux from Python 3.14) instead of fork.
 
-    mutation_positions = random.sample(range(seq_length), num_mutations)
+    Arguments:
+    - sequences: A dictionary of the (sequence, clean reference) of each input file.
+    """
+    SWEEP_SEQUENCES.update(sequences)
 
-    for position in mutation_positions:
-        current_nucleotide = sequence[position]
-        possible_nucleotides = ['A', 'C', 'G', 'T']
-        possible_nucleotides.remove(current_nucleotide)
-        new_nucleotide = random.choice(possible_nucleotides)
-        sequence[position] = new_nucleotide
+def run_sweep_cell(cell):
+    """
+    Runs the simulations of one (input file, mutations rate) cell of a sweep in a worker process.
 
-    mutated_sequence = ''.join(sequence)
-    return mutated_sequence, num_mutations
+    Arguments:
+    - cell: A tuple of the input file, the mutations rate and the remaining arguments of run_simulations.
 
-def run_code(data, huffman, type):
+    Returns:
+    - The list of runs returned by run_simulations.
+    """
+    input_file, mutations_rate, n_sims, huffman, type, codebook_dir, checksum, ci_width, insertion_rate, deletion_rate, sync, seed, shard = cell
+    data, reference = SWEEP_SEQUENCES[input_file]
 
-    corrected_data, errors_count = correct_string(data)
-    data_without_parity = remove_hamming_bits(corrected_data)[0]
+    return run_simulations(data, reference, mutations_rate, n_sims, huffman, type, codebook_dir, checksum, ci_width=ci_width, insertion_rate=insertion_rate, deletion_rate=deletion_rate, sync=sync, seed=seed, shard=shard)
 
-    if huffman == True:
-        header_len = decode_header(dna_to_binary(data_without_parity[:8]))  # Decode the marker length from the encoded data string
-        instructions_length = decode_header(dna_to_binary(data_without_parity[8: (header_len + 1) * 8]))  # Decode the length of the instructions from the encoded data string
-        huffman_instructions_string_binary = utf8_bin_decode(dna_to_binary(data_without_parity[(header_len + 1) * 8: ((header_len + 1) * 8 + instructions_length)]))  # Decode the Huffman instructions from the encoded data string
-        huffman_dict = construct_huffman_dict(huffman_instructions_string_binary)  # Construct the Huffman dictionary from the Huffman instructions
-        decoded_data = huffman_decode(dna_to_binary(data_without_parity[(header_len + 1) * 8 + instructions_length:]), huffman_dict)  # Decode the data using Huffman decoding
+def write_summary(cells, input_files, mutations_rates, summary_file_name):
+    """
+    Writes the perfect retrieval rate (%) of every mutations rate (rows) and input file (columns) of a sweep,
+    in the same layout as the simulator_data_*.csv tables.
 
-    elif type == 'png' or type == 'jpg' or type == 'gz' or type == 'txt.gz':
-        for i in range(0, len(decoded_data), 3):
-            integer = int(decoded_data[i:i+3])
-            decoded_bytes = integer.to_bytes(1, byteorder='big')
-            decoded_data += str(decoded_bytes)
+    Arguments:
+    - cells: A dictionary of the (perfect retrievals, runs) counts of each (input file, mutations rate) cell.
+    - input_files: The input files of the sweep.
+    - mutations_rates: The mutations rates of the sweep.
+    - summary_file_name: The name of the summary CSV file.
 
-    elif huffman == False:
-        if type == 'txt':
-            decoded_data = utf8_bin_decode(data_without_parity)
-        
-        elif type == 'png' or type == 'jpg' or type == 'gz' or type == 'txt.gz': 
-            decoded_data = binary_to_image_bytes(data_without_parity)
-    
-    md5sum = hashlib.md5(decoded_data.encode('utf-8')).hexdigest()
-    return md5sum, errors_count
+    Returns:
+    - None
+    """
+    with open(summary_file_name, 'w') as f:
+        f.write('Mutations Rate (%),' + ','.join([os.path.splitext(os.path.basename(input_file))[0] for input_file in input_files]) + '\n')
+        for mutations_rate in mutations_rates:
+            rates = []
+            for input_file in input_files:
+                successes, runs_count = cells.get((input_file, mutations_rate), (0, 0))
+                rates.append(str(round(successes / runs_count * 100, 3)) if runs_count != 0 else '')
+            f.write(str(mutations_rate) + ',' + ','.join(rates) + '\n')
+
+#################################### Results Store Functions ####################################
+
+def open_results_store(file_name):
+    """
+    Opens (or creates) the SQLite results store. Every sweep gets a row in the sweeps table with its settings,
+    and every run a row in the runs table, so sweeps of any size can be summarized with SQL instead of by
+    post-processing CSV reports.
 
-parser = argparse.ArgumentParser(description='Single Base Substitution Mutations Simulator')
+    Arguments:
+    - file_name: The name of the SQLite file.
+
+    Returns:
+    - The connection to the store.
+    """
+    connection = sqlite3.connect(file_name)
+    connection.execute('PRAGMA journal_mode=WAL')  # Readers (e.g. summarize) do not block a running sweep
+    connection.execute('PRAGMA synchronous=NORMAL')
+    connection.execute('CREATE TABLE IF NOT EXISTS sweeps (id INTEGER PRIMARY KEY, started TEXT, type TEXT, huffman INTEGER, checksum INTEGER, sync INTEGER, insertion_rate REAL, deletion_rate REAL, n_sims INTEGER, ci_width REAL, source TEXT, seed TEXT, shard TEXT)')
+    columns = [row[1] for row in connection.execute('PRAGMA table_info(sweeps)')]
+    for column in ('seed', 'shard'):
+        if column not in columns:
+            connection.execute('ALTER TABLE sweeps ADD COLUMN {} TEXT'.format(column))  # Stores created before seeded sweeps
+    connection.execute('CREATE TABLE IF NOT EXISTS runs (sweep INTEGER, input_file TEXT, mutations_rate REAL, run INTEGER, mutations INTEGER, corrected_errors INTEGER, perfect INTEGER, failed_blocks INTEGER)')
+    connection.execute('CREATE INDEX IF NOT EXISTS runs_cell ON runs (sweep, input_file, mutations_rate)')
+    connection.commit()
+
+    return connection
+
+def start_sweep(connection, started, args):
+    """
+    Records the settings of a sweep in the results store.
+
+    Arguments:
+    - connection: The connection to the store.
+    - started: The ID (date and time) of the sweep.
+    - args: The parsed arguments of the simulator.
 
-parser.add_argument('-f', '--input_file', required=True, metavar='', type=str, help='The name of the input file you want to run the simulator on.')
-parser.add_argument('-m', '--mutations_rate', required=True, metavar='', type=float, help='The rate of the mutations you want to introduce to the sequence')
+    Returns:
+    - The ID of the sweep in the store.
+    """
+    cursor = connection.execute('INSERT INTO sweeps (started, type, huffman, checksum, sync, insertion_rate, deletion_rate, n_sims, ci_width, source, seed, shard) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                                (started, args.type, int(args.Huffman), int(args.Checksum), int(args.Sync), args.insertion_rate, args.deletion_rate, args.n_sims, args.ci_width, None, str(args.seed), '{}/{}'.format(*args.shard)))
+    connection.commit()
+
+    return cursor.lastrowid
+
+def store_runs(connection, sweep_id, input_file, mutations_rate, runs, batch_runs=RESULTS_FLUSH_RUNS):
+    """
+    Inserts the runs of one (input file, mutations rate) cell into the results store, batch_runs runs per
+    transaction.
+
+    Arguments:
+    - connection: The connection to the store.
+    - sweep_id: The ID of the sweep in the store.
+    - input_file: The input file of the cell.
+    - mutations_rate: The mutations rate of the cell.
+    - runs: The list of runs returned by run_simulations.
+    - batch_runs: The number of runs inserted per transaction (default: RESULTS_FLUSH_RUNS).
+
+    Returns:
+    - None
+    """
+    rows = [(sweep_id, input_file, mutations_rate, number_of_run, num_mutations, errors_count, check, None if failed_blocks == 'NA' else failed_blocks)
+            for number_of_run, num_mutations, errors_count, check, failed_blocks in runs]
+    for i in range(0, len(rows), batch_runs):
+        with connection:  # One transaction per batch
+            connection.executemany('INSERT INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?)', rows[i:i + batch_runs])
+
+def import_report(connection, file_name):
+    """
+    Imports a per-run CSV report (Mutations_simulator_report.csv, including the reports in the Analysis folder) into
+    the results store. Each ID of the report becomes a sweep, and columns missing from older reports are left empty.
+    Truncated or malformed lines are skipped.
+
+    Arguments:
+    - connection: The connection to the store.
+    - file_name: The name of the CSV report.
+
+    Returns:
+    - The number of imported runs and the number of skipped lines as a tuple.
+    """
+    import csv
+
+    sweeps = {}
+    rows = []
+    skipped = 0
+    with open(file_name, newline='') as f, connection:  # The whole report is imported in one transaction
+        for row in csv.DictReader(f):
+            try:
+                corrected_errors = row.get('Corrected Errors')
+                failed_blocks = row.get('Failed Blocks')
+                run = (row['Input File'], float(row['Mutations Rate (%)']), int(row['Run Number']), int(row['Number of Mutations']),
+                       int(corrected_errors) if corrected_errors else None, int(row['Perfect Retrieval(0/1)']), int(failed_blocks) if failed_blocks not in (None, '', 'NA') else None)
+            except (KeyError, TypeError, ValueError):
+                skipped += 1
+                continue
+            if row['ID'] not in sweeps:
+                cursor = connection.execute('INSERT INTO sweeps (started, source) VALUES (?, ?)', (row['ID'], file_name))
+                sweeps[row['ID']] = cursor.lastrowid
+            rows.append((sweeps[row['ID']], *run))
+        connection.executemany('INSERT INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?)', rows)
+
+    return len(rows), skipped
+
+def merge_store(connection, file_name):
+    """
+    Merges the sweeps and runs of another results store (e.g. the store of a shard simulated on another node)
+    into the store. The runs are copied as they are, so a sweep split with --shard and merged back gives the same
+    rows as the same sweep simulated on a single node. Sweeps that were already merged are skipped.
+
+    Arguments:
+    - connection: The connection to the store.
+    - file_name: The name of the SQLite file to merge.
+
+    Returns:
+    - The number of merged sweeps, the number of merged runs and the number of skipped sweeps as a tuple.
+    """
+    columns = 'started, type, huffman, checksum, sync, insertion_rate, deletion_rate, n_sims, ci_width, source, seed, shard'
+    open_results_store(file_name).close()  # Adds the seed and shard columns to stores created before seeded sweeps
+    connection.execute('ATTACH DATABASE ? AS shard_store', (file_name,))
+    merged, runs_count, skipped = 0, 0, 0
+    try:
+        with connection:  # The whole store is merged in one transaction
+            for sweep in connection.execute('SELECT id, {} FROM shard_store.sweeps ORDER BY id'.format(columns)).fetchall():
+                old_id, settings = sweep[0], list(sweep[1:])
+                settings[9] = settings[9] or file_name  # The source of a merged sweep is the store it came from
+                duplicate = connection.execute('SELECT 1 FROM sweeps WHERE started IS ? AND seed IS ? AND shard IS ? AND type IS ? AND n_sims IS ?',
+                                               (settings[0], settings[10], settings[11], settings[1], settings[7])).fetchone()
+                if duplicate is not None:
+                    skipped += 1
+                    continue
+                cursor = connection.execute('INSERT INTO sweeps ({}) VALUES ({})'.format(columns, ', '.join(['?'] * len(settings))), settings)
+                cursor = connection.execute('INSERT INTO runs SELECT ?, input_file, mutations_rate, run, mutations, corrected_errors, perfect, failed_blocks FROM shard_store.runs WHERE sweep = ?', (cursor.lastrowid, old_id))
+                merged += 1
+                runs_count += cursor.rowcount
+    finally:
+        connection.execute('DETACH DATABASE shard_store')
+
+    return merged, runs_count, skipped
+
+def count_overlapping_runs(connection):
+    """
+    Counts the runs that were simulated more than once with the same seed (for example overlapping shards, or a
+    shard merged under two different IDs). Such runs are identical, so they would be counted twice in the summary.
+
+    Arguments:
+    - connection: The connection to the store.
+
+    Returns:
+    - The number of repeated runs.
+    """
+    query = ('SELECT COALESCE(SUM(copies - 1), 0) FROM (SELECT COUNT(*) AS copies FROM runs JOIN sweeps ON sweeps.id = runs.sweep WHERE sweeps.seed IS NOT NULL '
+             'GROUP BY sweeps.seed, runs.input_file, runs.mutations_rate, COALESCE(sweeps.insertion_rate, 0), COALESCE(sweeps.deletion_rate, 0), runs.run HAVING COUNT(*) > 1)')
+
+    return connection.execute(query).fetchone()[0]
+
+def summarize_store(connection, sweeps=None):
+    """
+    Aggregates the runs of the results store per input file and mutations rate (and per insertion and deletion
+    rate), with the 95 % Wilson confidence interval of the perfect retrieval rate.
+
+    Arguments:
+    - connection: The connection to the store.
+    - sweeps: The IDs of the sweeps to summarize, or None for all of them (default: None).
+
+    Returns:
+    - A list of (input file, mutations rate, insertion rate, deletion rate, runs, perfect retrievals, mean
+      mutations, mean corrected errors, lower bound, upper bound) tuples.
+    """
+    query = ('SELECT runs.input_file, runs.mutations_rate, COALESCE(sweeps.insertion_rate, 0), COALESCE(sweeps.deletion_rate, 0), '
+             'COUNT(*), SUM(runs.perfect), AVG(runs.mutations), AVG(runs.corrected_errors) '
+             'FROM runs JOIN sweeps ON sweeps.id = runs.sweep')
+    parameters = []
+    if sweeps:
+        query += ' WHERE runs.sweep IN ({})'.format(', '.join(['?'] * len(sweeps)))
+        parameters = list(sweeps)
+    query += ' GROUP BY 1, 2, 3, 4 ORDER BY 1, 2 DESC, 3, 4'
+
+    summary = []
+    for input_file, mutations_rate, insertion_rate, deletion_rate, runs_count, successes, mean_mutations, mean_errors in connection.execute(query, parameters):
+        lower, upper = wilson_interval(successes, runs_count)
+        summary.append((input_file, mutations_rate, insertion_rate, deletion_rate, runs_count, successes, mean_mutations, mean_errors, lower, upper))
+
+    return summary
+
+parser = argparse.ArgumentParser(description='Single Base Substitution Mutations Simulator', usage='%(prog)s -f FILE [FILE ...] -t TYPE -m RATE [RATE ...] [options]\n       %(prog)s summarize [options]\n       %(prog)s estimate [options]')
+
+parser.add_argument('-f', '--input_file', required=True, nargs='+', metavar='', type=str, help='The name of the input file(s) you want to run the simulator on.')
+parser.add_argument('-m', '--mutations_rate', required=True, nargs='+', metavar='', type=float, help='The rate(s) of the mutations you want to introduce to the sequence')
 parser.add_argument('-huffman', '--Huffman', required=False, action='store_true', help='To be called if the input file is compressed using Huffman algorithm.')
 parser.add_argument('-t', '--type', required=True, choices=['jpg', 'jpeg', 'png', 'txt', 'gz', 'txt.gz'], metavar='', help='The format of the file you are decoding.')
-parser.add_argument('-n', '--n_sims', required=True, type=int, metavar='')
-
-args = parser.parse_args()
-if __name__ == '__main__':
-    
-    with open(args.input_file, 'r', encoding='utf-8', newline='\r\n') as f:
-        data = f.read()
+parser.add_argument('-n', '--n_sims', required=True, type=int, metavar='', help='The number of runs (the maximum number of runs in the adaptive mode).')
+parser.add_argument('-ci', '--ci_width', required=False, type=float, default=None, metavar='', help='Adaptive mode: stop as soon as the 95 %% confidence interval of the perfect retrieval rate is narrower than this width (e.g. 0.1).')
+parser.add_argument('-cb', '--codebook_dir', required=False, type=str, default=CODEBOOK_DIR, metavar='', help='The directory of the persistent codebook cache (needed if the sequence references a shared codebook).')
+parser.add_argument('-checksum', '--Checksum', required=False, action='store_true', help='To be called if the input file was encoded with block checksums. Perfect retrieval is then decided by the checksums without decoding the payload.')
+parser.add_argument('-ins', '--insertion_rate', required=False, type=float, default=0, metavar='', help='The rate of the single base insertions you want to introduce to the sequence.')
+parser.add_argument('-del', '--deletion_rate', required=False, type=float, default=0, metavar='', help='The rate of the single base deletions you want to introduce to the sequence.')
+parser.add_argument('-sync', '--Sync', required=False, action='store_true', help='To be called if the input file was encoded with synchronization markers.')
+parser.add_argument('-j', '--jobs', required=False, type=int, default=1, metavar='', help='The number of worker processes the (input file, mutations rate) grid is run on.')
+parser.add_argument('-s', '--summary', required=False, type=str, default='Mutations_simulator_summary.csv', metavar='', help='The name of the CSV file the perfect retrieval rates of the grid are saved in.')
+parser.add_argument('-db', '--database', required=False, type=str, default=RESULTS_DB, metavar='', help='The SQLite results store the runs are saved in.')
+parser.add_argument('-csv', '--CSV', required=False, action='store_true', help='To be called if the runs should also be appended to the per-run CSV report Mutations_simulator_report.csv.')
+parser.add_argument('--seed', required=False, type=int, default=None, metavar='', help='The seed of the sweep, from which the seed of every run is derived (default: a random seed, printed and saved in the results store).')
+parser.add_argument('--shard', required=False, type=parse_shard, default=(1, 1), metavar='', help='Simulate only the i-th of N equal ranges of the runs (i/N, e.g. 2/8), to split a sweep across nodes. The stores of the shards are merged with summarize -m.')
+
+estimate_parser = argparse.ArgumentParser(description='Computes the approximate (aliasing below ~1e-15) probability of perfect retrieval under single base substitutions, without simulation', usage='%(prog)s -f FILE [FILE ...] -m RATE [RATE ...] [options]')
+
+estimate_parser.add_argument('-f', '--input_file', required=True, nargs='+', metavar='', type=str, help='The name of the encoded file(s) you want to estimate the perfect retrieval of.')
+estimate_parser.add_argument('-m', '--mutations_rate', required=True, nargs='+', metavar='', type=float, help='The rate(s) of the substitutions.')
+estimate_parser.add_argument('-sync', '--Sync', required=False, action='store_true', help='To be called if the input file was encoded with synchronization markers.')
+estimate_parser.add_argument('-target', '--target', required=False, type=float, default=None, metavar='', help='Also report the highest mutations rate at which the probability of perfect retrieval is at least this value (e.g. 0.99).')
+estimate_parser.add_argument('-o', '--output', required=False, type=str, default=None, metavar='', help='The CSV file the probabilities (%%) are saved in, with a row per mutations rate and a column per input file.')
+
+summarize_parser = argparse.ArgumentParser(description='Summarizes the runs of the simulator results store', usage='%(prog)s [options]')
+
+summarize_parser.add_argument('-db', '--database', required=False, type=str, default=RESULTS_DB, metavar='', help='The SQLite results store to summarize.')
+summarize_parser.add_argument('-i', '--import_csv', required=False, nargs='+', default=[], metavar='', help='Per-run CSV reports (e.g. the reports in the Analysis folder) to import into the store first.')
+summarize_parser.add_argument('-m', '--merge', required=False, nargs='+', default=[], metavar='', help='Results stores (e.g. of the shards of a sweep) to merge into the store first.')
+summarize_parser.add_argument('--sweep', required=False, nargs='+', type=int, default=None, metavar='', help='The IDs of the sweeps to summarize (default: all of them).')
+summarize_parser.add_argument('-o', '--output', required=False, type=str, default=None, metavar='', help='The CSV file the summary with the confidence intervals is saved in.')
+summarize_parser.add_argument('-p', '--pivot', required=False, type=str, default=None, metavar='', help='The CSV file the perfect retrieval rates (%%) are saved in, with a row per mutations rate and a column per input file.')
+
+
+def summarize(argv=None):
+    args = summarize_parser.parse_args(argv)
+
+    connection = open_results_store(args.database)
+    for file_name in args.import_csv:
+        imported, skipped = import_report(connection, file_name)
+        print("> \033[1;32m{}\033[0m runs were imported from the file: \033[93m{}\033[0m{}".format(imported, file_name, ' ({} malformed lines skipped)'.format(skipped) if skipped != 0 else ''))
+    for file_name in args.merge:
+        merged, runs_count, skipped = merge_store(connection, file_name)
+        print("> \033[1;32m{}\033[0m sweeps ({} runs) were merged from the store: \033[93m{}\033[0m{}".format(merged, runs_count, file_name, ' ({} already merged sweeps skipped)'.format(skipped) if skipped != 0 else ''))
+    summary = summarize_store(connection, args.sweep)
+    sweeps_count = connection.execute('SELECT COUNT(*) FROM sweeps').fetchone()[0]
+    overlapping_runs = count_overlapping_runs(connection)
+    connection.close()
+
+    print("\n\033[1;34m################################ Simulator Results Summary ################################\033[0m")
+    print("\033[1;35m# Results Store:\033[0m \033[93m{}\033[0m".format(args.database))
+    print("\033[1;35m# Sweeps:\033[0m \033[93m{}\033[0m\n".format(', '.join([str(sweep) for sweep in args.sweep]) if args.sweep else 'all ({})'.format(sweeps_count)))
+    for input_file, mutations_rate, insertion_rate, deletion_rate, runs_count, successes, mean_mutations, mean_errors, lower, upper in summary:
+        indels = ', Indels: {}/{}'.format(insertion_rate, deletion_rate) if insertion_rate != 0 or deletion_rate != 0 else ''
+        print('File: {}, Mutations Rate: {}{}, Perfect Retrieval: {}/{} = {} % (95 % CI: {}-{} %)'.format(input_file, mutations_rate, indels, successes, runs_count, round(successes / runs_count * 100, 3), round(lower * 100, 2), round(upper * 100, 2)))
+    if overlapping_runs != 0:
+        print("\n\033[1;31m> Warning:\033[0m {} runs were simulated more than once with the same seed (overlapping shards?) and are counted more than once.".format(overlapping_runs))
+
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            f.write('Input File,Mutations Rate (%),Insertion Rate,Deletion Rate,Runs,Perfect Retrievals,Perfect Retrieval (%),CI Lower (%),CI Upper (%),Mean Mutations,Mean Corrected Errors\n')
+            for input_file, mutations_rate, insertion_rate, deletion_rate, runs_count, successes, mean_mutations, mean_errors, lower, upper in summary:
+                f.write(','.join([input_file, str(mutations_rate), str(insertion_rate), str(deletion_rate), str(runs_count), str(successes), str(round(successes / runs_count * 100, 3)),
+                                  str(round(lower * 100, 3)), str(round(upper * 100, 3)), str(round(mean_mutations, 3)), '' if mean_errors is None else str(round(mean_errors, 3))]) + '\n')
+        print("\n> The summary with the confidence intervals was saved in the file: \033[93m{}\033[0m".format(args.output))
+
+    if args.pivot is not None:
+        cells = {}
+        for input_file, mutations_rate, insertion_rate, deletion_rate, runs_count, successes, *rest in summary:
+            previous = cells.get((input_file, mutations_rate), (0, 0))
+            cells[(input_file, mutations_rate)] = (previous[0] + successes, previous[1] + runs_count)
+        input_files = list(dict.fromkeys([input_file for input_file, mutations_rate in cells]))
+        mutations_rates = sorted(set([mutations_rate for input_file, mutations_rate in cells]), reverse=True)
+        write_summary(cells, input_files, mutations_rates, args.pivot)
+        print("> The perfect retrieval rates (%) of each mutations rate and input file were saved in the file: \033[93m{}\033[0m".format(args.pivot))
+
+
+def estimate(argv=None):
+    args = estimate_parser.parse_args(argv)
+
+    print("\n\033[1;34m################################ Analytic Retrieval Estimator ################################\033[0m")
+    print("\033[1;35m# Input File Name:\033[0m \033[93m{}\033[0m".format(', '.join(args.input_file)))
+    print("\033[1;35m# Mutations Rate:\033[0m \033[93m{} %\033[0m".format(', '.join([str(mutations_rate * 100) for mutations_rate in args.mutations_rate])))
+    print("\033[1;35m# Synchronization Markers:\033[0m \033[93m{}\033[0m\n".format(args.Sync))
+
+    cells = {}
+    for input_file in args.input_file:
+        with open(input_file, 'r', encoding='utf-8', newline='\r\n') as f:
+            data = f.read()
+        for mutations_rate in args.mutations_rate:
+            probability, num_mutations = analytic_retrieval(data, mutations_rate, args.Sync)
+            cells[(input_file, mutations_rate)] = (probability, 1)  # write_summary prints successes / runs in %
+            print('File: {}, Length: {} DNA bases, Mutations Rate: {}, Substitutions: {}, Perfect Retrieval: {} %'.format(input_file, len(data), mutations_rate, num_mutations, round(probability * 100, 4)))
+        if args.target is not None:
+            num_mutations, mutations_rate = max_mutations_rate(data, args.target, args.Sync)
+            print('\033[1;32m> {}: at most {} substitutions (mutations rate {}) for a perfect retrieval probability of at least {} %\033[0m'.format(input_file, num_mutations, round(mutations_rate, 8), args.target * 100))
+
+    if args.output is not None:
+        write_summary(cells, args.input_file, args.mutations_rate, args.output)
+        print("\n> The probabilities (%) of each mutations rate and input file were saved in the file: \033[93m{}\033[0m".format(args.output))
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    if len(argv) != 0 and argv[0] == 'summarize':
+        summarize_parser.prog = '{} summarize'.format(parser.prog)
+        summarize(argv[1:])
+        return
+    if len(argv) != 0 and argv[0] == 'estimate':
+        estimate_parser.prog = '{} estimate'.format(parser.prog)
+        estimate(argv[1:])
+        return
+
+    args = parser.parse_args(argv)
+    if args.shard != (1, 1) and args.ci_width is not None:
+        parser.error('--shard cannot be combined with -ci (the adaptive mode decides when to stop from all of the previous runs)')
+    if args.seed is None:
+        args.seed = random.SystemRandom().randrange(2 ** 63)  # Saved with the sweep, so the sweep can be reproduced
+
+    for input_file in args.input_file:
+        with open(input_file, 'r', encoding='utf-8', newline='\r\n') as f:
+            data = f.read()
+        SWEEP_SEQUENCES[input_file] = (data, None)
 
     current_time = datetime.datetime.now()
     formatted_time = current_time.strftime("%Y%m%d%H%M%S")
 
     print("\n\033[1;34m################################ Single Base Substitutions Simulator ################################\033[0m")
-    print("\033[1;35m# Input File Name:\033[0m \033[93m{}\033[0m".format(args.input_file))
-    print("\033[1;35m# Input Sequence Length:\033[0m \033[93m{} DNA bases\033[0m".format(len(data)))
-    print("\033[1;35m# Mutations Rate:\033[0m \033[93m{} %\033[0m".format(args.mutations_rate *100))
-    print("\033[1;35m# Number of Mutations:\033[0m \033[93m{}\033[0m".format(round(len(data) * args.mutations_rate)))
+    print("\033[1;35m# Input File Name:\033[0m \033[93m{}\033[0m".format(', '.join(args.input_file)))
+    print("\033[1;35m# Input Sequence Length:\033[0m \033[93m{} DNA bases\033[0m".format(', '.join([str(len(data)) for data, reference in SWEEP_SEQUENCES.values()])))
+    print("\033[1;35m# Mutations Rate:\033[0m \033[93m{} %\033[0m".format(', '.join([str(mutations_rate * 100) for mutations_rate in args.mutations_rate])))
+    print("\033[1;35m# Insertions Rate:\033[0m \033[93m{} %\033[0m".format(args.insertion_rate * 100))
+    print("\033[1;35m# Deletions Rate:\033[0m \033[93m{} %\033[0m".format(args.deletion_rate * 100))
+    print("\033[1;35m# Synchronization Markers:\033[0m \033[93m{}\033[0m".format(args.Sync))
     print("\033[1;35m# Number of Runs:\033[0m \033[93m{}\033[0m".format(args.n_sims))
+    print("\033[1;35m# Seed:\033[0m \033[93m{}\033[0m".format(args.seed))
+    if args.shard != (1, 1):
+        runs_range = shard_runs(args.n_sims, args.shard)
+        print("\033[1;35m# Shard:\033[0m \033[93m{}/{} (runs {}-{})\033[0m".format(args.shard[0], args.shard[1], runs_range.start, runs_range.stop - 1))
     print("\033[1;35m# Huffman:\033[0m \033[93m{}\033[0m".format(args.Huffman))
-    print("\033[1;35m# Error Correction Method:\033[0m \033[93mHamming\033[0m\n")
-    
-    unmutated_md5sum = run_code(data, args.Huffman, args.type)[0]
-    number_of_run = 0
-    for i in range(0, args.n_sims, 1):
-        mutated_data, num_mutations = simulate_substitution(data, args.mutations_rate)
-        mutated_md5sum, errors_count = run_code(mutated_data, args.Huffman, args.type)
-        number_of_run += 1
-
-        if unmutated_md5sum == mutated_md5sum:
-            check = 1
-            status = "\033[1;32mFull Decryption\033[0m"
-        else: 
-            check = 0
-            status = "\033[1;31mIncomplete Decryption\033[0m"
-
-        print('Run: {}, Progress: {} %, status: {}'.format(number_of_run, round(number_of_run/args.n_sims * 100), status))
-        if os.path.exists('./Mutations_simulator_report.csv'):
-            pass
-        else:
-            with open('Mutations_simulator_report.csv', 'w') as f:
-                f.write('ID,Input File,Run Number,Mutations Rate (%),Number of Mutations,Corrected Errors,Perfect Retrieval(0/1)\n')
+    print("\033[1;35m# Error Correction Method:\033[0m \033[93mHamming\033[0m")
+    print("\033[1;35m# Block Checksums:\033[0m \033[93m{}\033[0m\n".format(args.Checksum))
+
+    for input_file, (data, reference) in SWEEP_SEQUENCES.items():
+        SWEEP_SEQUENCES[input_file] = (data, clean_reference(data, args.Huffman, args.type, args.codebook_dir, args.Checksum, args.Sync))  # Decoded once and shared by all the mutations rates
+
+    connection = open_results_store(args.database)
+    sweep_id = start_sweep(connection, formatted_time, args)
+
+    cells = [(input_file, mutations_rate) for mutations_rate in args.mutations_rate for input_file in args.input_file]
+    analytic = {}
+    if args.insertion_rate == 0 and args.deletion_rate == 0:  # The estimator models substitutions only
+        for input_file, mutations_rate in cells:
+            analytic[(input_file, mutations_rate)] = analytic_retrieval(SWEEP_SEQUENCES[input_file][0], mutations_rate, args.Sync)[0]
+    if args.jobs > 1:
+        import multiprocessing
+
+        with multiprocessing.Pool(args.jobs, initializer=start_sweep_worker, initargs=(SWEEP_SEQUENCES,)) as pool:
+            cell_runs = pool.imap(run_sweep_cell, [(input_file, mutations_rate, args.n_sims, args.Huffman, args.type, args.codebook_dir, args.Checksum, args.ci_width, args.insertion_rate, args.deletion_rate, args.Sync, args.seed, args.shard) for input_file, mutations_rate in cells])
+            results = {}
+            for cell, runs in zip(cells, cell_runs):
+                results[cell] = runs
+                store_runs(connection, sweep_id, cell[0], cell[1], runs)  # Flushed as soon as the cell is done
+                print(cell_status(cell[0], cell[1], runs, analytic.get(cell)))
+    else:
+        results = {}
+        for input_file, mutations_rate in cells:
+            if len(cells) > 1:
+                print('\033[1;35m> File: {}, Mutations Rate: {}\033[0m'.format(input_file, mutations_rate))
+            data, reference = SWEEP_SEQUENCES[input_file]
+            results[(input_file, mutations_rate)] = run_simulations(data, reference, mutations_rate, args.n_sims, args.Huffman, args.type, args.codebook_dir, args.Checksum, verbose=True, ci_width=args.ci_width, insertion_rate=args.insertion_rate, deletion_rate=args.deletion_rate, sync=args.Sync, seed=args.seed, shard=args.shard)
+            store_runs(connection, sweep_id, input_file, mutations_rate, results[(input_file, mutations_rate)])
+            print(cell_status(input_file, mutations_rate, results[(input_file, mutations_rate)], analytic.get((input_file, mutations_rate))))
+
+    connection.close()
+
+    if args.CSV == True:
+        with open_csv_report('Mutations_simulator_report.csv', 'ID,Input File,Run Number,Mutations Rate (%),Number of Mutations,Corrected Errors,Perfect Retrieval(0/1),Failed Blocks') as f:
+            for (input_file, mutations_rate), runs in results.items():
+                for number_of_run, num_mutations, errors_count, check, failed_blocks in runs:
+                    f.write(formatted_time + ',' + input_file + ',' + str(number_of_run) + ',' + str(mutations_rate) + ',' + str(num_mutations) + ',' + str(errors_count) + ',' + str(check) + ',' + str(failed_blocks) + '\n')
+
+    write_summary({cell: (sum([run[3] for run in runs]), len(runs)) for cell, runs in results.items()}, args.input_file, args.mutations_rate, args.summary)
 
-        with open('Mutations_simulator_report.csv', 'a') as f:
-            f.write(formatted_time + ',' + args.input_file + ',' + str(number_of_run) + ',' + str(args.mutations_rate) + ',' + str(num_mutations) + ',' + str(errors_count) + ',' + str(check) + '\n')
-    
     print("\n> The SBS simulator was executed successfully.")
-    print("> Data regarding the procedure was documented and stored within the file: \033[93mMutations_simulator_report.csv\033[0m")
+    print("> The runs were saved in the results store \033[93m{}\033[0m (sweep \033[93m{}\033[0m), which can be summarized with the summarize command.".format(args.database, sweep_id))
+    if args.CSV == True:
+        print("> Data regarding the procedure was documented and stored within the file: \033[93mMutations_simulator_report.csv\033[0m")
+    print("> The perfect retrieval rates (%) of each mutations rate and input file were saved in the file: \033[93m{}\033[0m".format(args.summary))
+
 
-else:
-    pass
\ No newline at end of file
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+import random
+
+import DNAcodeX_decoder as decoder
+from DNAcodeX_encoder import encode_data
+from dnacodex_core import CHECKSUM_BLOCK_BITS, CHECKSUM_TAG
+
+BLOCK_BASES = (CHECKSUM_BLOCK_BITS + 32) // 4 * 7
+TAG_BASES = len(CHECKSUM_TAG) * 14
+
+
+def random_bytes(size=3000, seed=1):
+    rng = random.Random(seed)
+
+    return bytes(rng.randrange(256) for _ in range(size))
+
+def damage_block(sequence, block):
+    """
+    Substitutes two bases of one codeword of the block, which Hamming miscorrects.
+    """
+    position = TAG_BASES + block * BLOCK_BASES + 700
+    swap = {'A': 'C', 'C': 'A', 'G': 'T', 'T': 'G'}
+
+    return sequence[:position] + swap[sequence[position]] + swap[sequence[position + 1]] + sequence[position + 2:]
+
+
+def test_checksummed_sequence_is_detected_without_the_flag():
+    data = random_bytes()
+    sequence = encode_data(data, type='png', checksum=True)
+
+    decoded, statistics = decoder.decode_data(sequence, type='png')
+
+    assert decoded == data
+    assert statistics['failed_blocks'] == 0
+
+def test_untagged_sequence_is_verified_with_the_flag():
+    data = random_bytes()
+    sequence = encode_data(data, type='png', checksum=True)[TAG_BASES:]  # As encoded before the tag was added
+
+    assert decoder.decode_data(sequence, type='png', checksum=True)[0] == data
+
+def test_pipelined_chunks_report_the_same_failed_block(tmp_path):
+    data = random_bytes()
+    sequence = damage_block(encode_data(data, type='png', checksum=True), 3)
+    (tmp_path / 'sequence.txt').write_text(sequence)
+
+    decoded, statistics = decoder.decode_data(sequence, type='png')
+    assert statistics['failed_blocks'] == 1
+
+    chunks = decoder.read_sequence_chunks(str(tmp_path / 'sequence.txt'), {}, chunk_bases=2 * BLOCK_BASES, start=TAG_BASES)
+    results = [decoder.decode_chunk(chunk, checksum=True, type='png', start=TAG_BASES) for chunk in chunks]
+
+    assert b''.join([result[0] for result in results]) == decoded
+    assert sum([result[5] for result in results], []) == [3]
@@ -0,0 +1,109 @@
+import gzip
+import random
+
+import pytest
+
+import DNAcodeX_decoder as decoder
+from DNAcodeX_encoder import encode_data
+from dnacodex_core import check_codeword_layout, correct_codewords
+
+
+def encoded_sequence(size=600, seed=1):
+    rng = random.Random(seed)
+
+    return encode_data(bytes(rng.randrange(256) for _ in range(size)), type='png')
+
+def write_pool(path, sequence, end, read_length=100, step=50):
+    """
+    Writes a FASTA pool of overlapping reads that cover sequence[:end].
+    """
+    with open(path, 'w') as f:
+        for start in range(0, end, step):
+            f.write('>read pos={}\n{}\n'.format(start, sequence[start:min(start + read_length, end)]))
+
+    return path
+
+
+def test_full_pool_gives_the_sequence(tmp_path):
+    sequence = encoded_sequence()
+    pool = write_pool(tmp_path / 'pool.fasta', sequence, len(sequence))
+
+    consensus, reads_count, uncovered = decoder.consensus_from_reads(str(pool))
+
+    assert consensus == sequence
+    assert uncovered == 0
+
+def test_numpy_and_python_votes_give_the_same_consensus():
+    numpy = pytest.importorskip('numpy')
+    batch = [('a pos=0', 'ACGTAC', None), ('b pos=4', 'ACNN', None), ('c pos=10', 'NNN', None)]  # Trailing bases without votes
+    length = 13
+
+    python_counts = decoder.accumulate_votes([[], [], [], []], batch, False)
+    numpy_counts = decoder.accumulate_votes(numpy.zeros(0), batch, False, numpy)
+
+    assert decoder.consensus_from_votes(python_counts, length) == decoder.consensus_from_votes(numpy_counts, length, numpy)
+    assert decoder.consensus_from_votes(numpy_counts, length, numpy) == ('ACGTACNNNNNNN', 7)
+
+def test_pool_that_misses_the_tail_is_padded_to_a_valid_codeword(tmp_path):
+    sequence = encoded_sequence()
+    end = len(sequence) - 6  # Leaves a trailing codeword of 1 base
+    pool = write_pool(tmp_path / 'pool.fasta', sequence, end)
+
+    consensus = decoder.consensus_from_reads(str(pool))[0]
+    assert len(consensus) == end
+    with pytest.raises(ValueError, match='trailing codeword of 1 bases at position {}'.format(end - 1)):
+        check_codeword_layout(len(consensus))
+
+    padded, padding = decoder.pad_codeword_layout(consensus)
+    check_codeword_layout(len(padded))
+    assert padding == 2
+
+    covered_bits = (end // 7) * 4
+    assert correct_codewords(padded)[0][:covered_bits] == correct_codewords(sequence)[0][:covered_bits]
+
+def test_decoder_reads_pool_that_misses_the_tail(tmp_path, monkeypatch, capsys):
+    sequence = encoded_sequence()
+    write_pool(tmp_path / 'pool.fasta', sequence, len(sequence) - 6)
+    monkeypatch.chdir(tmp_path)
+
+    decoder.main(['-f', 'pool.fasta', '-t', 'png', '-o', 'decoded', '-reads'])
+
+    assert 'not covered by any read' in capsys.readouterr().out
+    assert (tmp_path / 'decoded.png').stat().st_size > 0
+
+def test_majority_wins_and_gaps_are_erased(tmp_path):
+    pool = tmp_path / 'pool.fasta'
+    pool.write_text('>a pos=0\nACGTAC\n>b pos=0\nACGTAC\n>c pos=0\nTTTTTT\n>d pos=9\nGGA\n')
+
+    assert decoder.consensus_from_reads(str(pool)) == ('ACGTACNNNGGA', 4, 3)
+
+def test_quality_weighted_votes(tmp_path):
+    pool = tmp_path / 'pool.fastq'
+    pool.write_text('@a pos=0\nAAAA\n+\n####\n@b pos=0\nAAAA\n+\n####\n@c pos=0\nCCCC\n+\nIIII\n')  # Q2 twice against Q40 once
+
+    assert decoder.consensus_from_reads(str(pool))[0] == 'AAAA'
+    assert decoder.consensus_from_reads(str(pool), quality_weighted=True)[0] == 'CCCC'
+
+def test_python_votes_match_the_consensus_of_the_pool(tmp_path):
+    sequence = encoded_sequence()
+    pool = write_pool(tmp_path / 'pool.fasta', sequence, len(sequence), read_length=90, step=70)
+
+    counts = decoder.accumulate_votes([[], [], [], []], list(decoder.read_pool(str(pool))), False)
+    assert decoder.consensus_from_votes(counts, len(sequence)) == decoder.consensus_from_reads(str(pool))[::2]
+
+def test_batches_and_gzip_give_the_same_consensus(tmp_path):
+    sequence = encoded_sequence()
+    pool = write_pool(tmp_path / 'pool.fasta', sequence, len(sequence))
+    with gzip.open(tmp_path / 'pool.fasta.gz', 'wt') as f:
+        f.write(pool.read_text())
+
+    assert decoder.consensus_from_reads(str(tmp_path / 'pool.fasta.gz'), batch_reads=3) == decoder.consensus_from_reads(str(pool))
+
+@pytest.mark.parametrize('tail', [1, 2, 4])
+def test_invalid_trailing_codewords_are_rejected(tail):
+    with pytest.raises(ValueError, match='position {}'.format(70)):
+        check_codeword_layout(70 + tail)
+
+@pytest.mark.parametrize('tail', [0, 3, 5, 6])
+def test_trailing_codewords_of_the_encoder_are_accepted(tail):
+    check_codeword_layout(70 + tail)
@@ -0,0 +1,85 @@
+import itertools
+import math
+import random
+
+import pytest
+
+from DNAcodeX_encoder import add_sync_markers, hamming_map_to_dna
+from dnacodex_core import SYNC_MARKER, UncorrectableCodeword, correct_codewords, dna_to_binary
+from mutations_simulator import (
+    analytic_retrieval,
+    codeword_survival,
+    retrieval_probability,
+    sequence_codeword_classes,
+)
+
+SUBSTITUTIONS = {'A': 'CGT', 'C': 'AGT', 'G': 'ACT', 'T': 'ACG'}
+
+
+def brute_force_probability(sequence, num_mutations):
+    """
+    Substitutes every set of num_mutations distinct bases with every combination of other bases, as
+    simulate_substitution does, and counts the outcomes that still decode to the same data bits.
+    """
+    reference = correct_codewords(sequence)[0]
+    survived = 0
+    outcomes = 0
+    for positions in itertools.combinations(range(len(sequence)), num_mutations):
+        for substitutes in itertools.product(*[SUBSTITUTIONS[sequence[i]] for i in positions]):
+            mutated = list(sequence)
+            for i, base in zip(positions, substitutes):
+                mutated[i] = base
+            outcomes += 1
+            try:
+                survived += correct_codewords(''.join(mutated))[0] == reference
+            except UncorrectableCodeword:
+                pass
+
+    return survived / outcomes
+
+
+@pytest.mark.parametrize('bits', ['1011', '101', '10', '1'])  # Codewords of 7, 6, 5 and 3 bases
+def test_codeword_survival_without_substitutions_is_one(bits):
+    codeword = hamming_map_to_dna(bits)[0]
+    survival = codeword_survival(dna_to_binary(codeword))
+
+    assert len(survival) == len(codeword) + 1
+    assert survival[0] == 1.0
+    assert all(0.0 <= probability <= 1.0 + 1e-12 for probability in survival)
+
+def test_no_mutations_gives_perfect_retrieval():
+    sequence = hamming_map_to_dna('1100101011110000')[0]
+
+    assert analytic_retrieval(sequence, 0) == (1.0, 0)
+
+@pytest.mark.parametrize('bits', ['10110011101', '1011001110', '1011001'])  # Trailing codewords of 6, 5 and 3 bases
+@pytest.mark.parametrize('num_mutations', [1, 2, 3])
+def test_retrieval_probability_matches_brute_force(bits, num_mutations):
+    sequence = hamming_map_to_dna(bits)[0]
+    classes = sequence_codeword_classes(sequence)
+
+    assert retrieval_probability(classes, len(sequence), num_mutations) == pytest.approx(brute_force_probability(sequence, num_mutations), abs=1e-9)
+
+def test_every_base_substituted_matches_brute_force():
+    sequence = hamming_map_to_dna('10110')[0]  # One codeword of 7 bases and one of 3 bases
+
+    assert retrieval_probability(sequence_codeword_classes(sequence), len(sequence), len(sequence)) == pytest.approx(brute_force_probability(sequence, len(sequence)), abs=1e-12)
+
+def test_long_sequence_matches_the_product_of_independent_codewords():
+    # With one substitution, perfect retrieval only depends on the codeword that was hit
+    rng = random.Random(3)
+    sequence = hamming_map_to_dna(''.join(rng.choice('01') for _ in range(40000)))[0]
+    classes = sequence_codeword_classes(sequence)
+
+    expected = sum([count * n * survival[1] for (n, survival), count in classes.items()]) / len(sequence)
+    assert retrieval_probability(classes, len(sequence), 1) == pytest.approx(expected, rel=1e-9)
+
+def test_substituted_markers_never_fail():
+    sequence, markers_count = add_sync_markers(hamming_map_to_dna('100' * 1001)[0])  # A trailing codeword of 6 bases
+    classes = sequence_codeword_classes(sequence, sync=True)
+
+    assert classes[(1, (1.0, 1.0))] == markers_count * len(SYNC_MARKER)
+    assert sum([n * count for (n, survival), count in classes.items()]) == len(sequence)
+    expected = sum([count * n * survival[1] for (n, survival), count in classes.items()]) / len(sequence)
+    assert expected < 1.0
+    assert math.isclose(retrieval_probability(classes, len(sequence), 1), expected, rel_tol=1e-9)
@@ -0,0 +1,80 @@
+import collections
+import math
+import random
+
+import pytest
+
+from dnacodex_core import compress_payload, compression_codec, decompress_payload, rans_decode, rans_encode
+
+
+def skewed_bytes(size, seed=1):
+    rng = random.Random(seed)
+
+    return bytes(rng.choices(range(256), weights=[2 ** -(i % 16) for i in range(256)], k=size))
+
+SAMPLES = {
+    'empty': b'',
+    'single byte': b'a',
+    'single symbol': b'a' * 5000,
+    'two symbols': b'ab' * 3000,
+    'all bytes': bytes(range(256)) * 20,
+    'random': bytes(random.Random(2).randrange(256) for _ in range(70000)),
+    'skewed': skewed_bytes(70000),
+    'utf-8': 'Ἐν ἀρχῇ ἦν ὁ λόγος, 太初有道, In the beginning was the Word. '.encode('utf-8') * 300,
+}
+
+
+def numpy_or_none(name):
+    return pytest.importorskip('numpy') if name == 'numpy' else None
+
+
+@pytest.mark.parametrize('backend', ['python', 'numpy'])
+@pytest.mark.parametrize('sample', SAMPLES)
+def test_round_trip(sample, backend):
+    numpy = numpy_or_none(backend)
+    data = SAMPLES[sample]
+
+    assert rans_decode(rans_encode(data, numpy=numpy), numpy=numpy) == data
+
+@pytest.mark.parametrize('lanes', [1, 3, 256])
+def test_round_trip_with_explicit_lanes(lanes):
+    data = SAMPLES['skewed'][:10000]
+
+    assert rans_decode(rans_encode(data, lanes=lanes)) == data
+
+def test_python_and_numpy_streams_are_interchangeable():
+    numpy = pytest.importorskip('numpy')
+    data = SAMPLES['skewed']
+
+    encoded = rans_encode(data)
+    assert rans_encode(data, numpy=numpy) == encoded
+    assert rans_decode(encoded, numpy=numpy) == data
+
+def test_skewed_data_is_compressed_close_to_its_entropy():
+    data = SAMPLES['skewed']
+    counts = collections.Counter(data)
+    entropy_bytes = -sum([count * math.log2(count / len(data)) for count in counts.values()]) / 8
+
+    assert len(rans_encode(data)) < entropy_bytes * 1.02 + 1024  # The model takes a few hundred bytes
+
+def test_tagged_payload_round_trip():
+    data = SAMPLES['utf-8']
+    payload = compress_payload(data, 'rans')
+
+    assert compression_codec(payload) == 'rans'
+    assert decompress_payload(payload) == (data, 'rans')
+
+@pytest.mark.parametrize('backend', ['python', 'numpy'])
+def test_damaged_stream_is_rejected(backend):
+    numpy = numpy_or_none(backend)
+    encoded = bytearray(rans_encode(SAMPLES['random'][:5000]))
+    encoded[len(encoded) // 2] ^= 0x10
+
+    with pytest.raises(ValueError):
+        rans_decode(bytes(encoded), numpy=numpy)
+
+def test_truncated_stream_is_rejected():
+    encoded = rans_encode(SAMPLES['random'][:5000])
+
+    with pytest.raises(ValueError):
+        rans_decode(encoded[:len(encoded) // 2])
@@ -0,0 +1,90 @@
+import itertools
+import random
+
+import pytest
+
+from DNAcodeX_encoder import add_hamming_to_string, bytes_to_dna, file_to_binary, hamming_map_to_dna, map_to_dna
+from dnacodex_core import (
+    UncorrectableCodeword,
+    build_correction_table,
+    correct_codewords,
+    dna_to_binary,
+    hamming_correct,
+    remove_hamming_bits,
+)
+
+SUBSTITUTIONS = {'A': 'CGT', 'C': 'AGT', 'G': 'ACT', 'T': 'ACG'}
+
+
+def random_bits(length, seed=1):
+    rng = random.Random(seed)
+
+    return ''.join(rng.choice('01') for _ in range(length))
+
+def correct_per_codeword(sequence):
+    """
+    The reference path of the correction table: hamming_correct and remove_hamming_bits on each codeword.
+    """
+    return ''.join(remove_hamming_bits(hamming_correct(dna_to_binary(sequence[i:i+7]))[0])[0] for i in range(0, len(sequence), 7))
+
+
+@pytest.mark.parametrize('length', list(range(17)) + [803])
+def test_encoding_table_matches_the_reference_encoder(length):
+    bits = random_bits(length)
+
+    assert hamming_map_to_dna(bits) == (map_to_dna(add_hamming_to_string(bits)[0]), add_hamming_to_string(bits)[1])
+
+def test_bytes_to_dna_matches_the_binary_string_encoder():
+    data = bytes(range(256)) + b'DNAcodeX'
+
+    assert bytes_to_dna(data) == hamming_map_to_dna(file_to_binary(data))
+
+def test_correction_table_matches_hamming_correct():
+    table = build_correction_table()
+
+    assert len(table) == 20288
+    for codeword_dna, (data, corrected, codeword_binary, error) in table.items():
+        assert codeword_binary == dna_to_binary(codeword_dna)
+        assert (corrected, error) == hamming_correct(codeword_binary)
+        assert data == remove_hamming_bits(corrected)[0]
+
+def test_correct_codewords_matches_the_reference_on_mutated_sequences():
+    rng = random.Random(2)
+    sequence = list(hamming_map_to_dna(random_bits(4000))[0])
+    for i in rng.sample(range(len(sequence)), 300):
+        sequence[i] = rng.choice(SUBSTITUTIONS[sequence[i]])
+    sequence = ''.join(sequence)
+
+    assert correct_codewords(sequence)[0] == correct_per_codeword(sequence)
+
+@pytest.mark.parametrize('length', range(41))
+def test_correct_codewords_round_trip(length):
+    bits = random_bits(length, seed=length)
+    sequence, parity_count = hamming_map_to_dna(bits)
+
+    assert correct_codewords(sequence)[:3] == (bits, 0, parity_count)
+
+@pytest.mark.parametrize('data_length', [4, 2, 1])  # Codewords of 7, 5 and 3 bases
+def test_single_substitutions_are_corrected(data_length):
+    for bits in itertools.product('01', repeat=data_length):
+        bits = ''.join(bits)
+        sequence = hamming_map_to_dna(bits)[0]
+        for i, base in enumerate(sequence):
+            for substitute in SUBSTITUTIONS[base]:
+                assert correct_codewords(sequence[:i] + substitute + sequence[i+1:])[0] == bits
+
+def test_two_erasures_are_recovered():
+    for bits in itertools.product('01', repeat=4):
+        bits = ''.join(bits)
+        sequence = hamming_map_to_dna(bits)[0]
+        for i, j in itertools.combinations(range(7), 2):
+            erased = list(sequence)
+            erased[i] = erased[j] = 'N'
+            data_bits, errors_count, parity_count, corrected_sequences, erasures_count = correct_codewords(''.join(erased))
+            assert (data_bits, erasures_count) == (bits, 1)
+
+def test_codeword_without_a_rule_names_its_position():
+    codeword = next(''.join(bases) for bases in itertools.product('ACGT', repeat=6) if ''.join(bases) not in build_correction_table())
+
+    with pytest.raises(UncorrectableCodeword, match='at position 14'):
+        correct_codewords(hamming_map_to_dna('10110010')[0] + codeword)